@@ -1,8 +1,47 @@
 import json
-from typing import List, Dict
+import re
+from decimal import Decimal
+from typing import List, Optional, Sequence
 from config.settings import KEYS_FILE, PROXY_FILE
+from network.signer import get_signer
 
-def load_keys_and_proxies() -> List[Dict[str, str]]:
+class Account:
+    """Аккаунт: ключи, прокси и состояние ротации.
+
+    Слоты вместо dict — тысячи аккаунтов без лишней памяти; хост прокси и
+    подготовленный HMAC считаются один раз при загрузке.
+    """
+    __slots__ = ("name", "api_key", "api_secret", "proxies", "proxy_host", "signer",
+                 "balance", "cooldown_until", "failures")
+
+    def __init__(self, name: str, api_key: str, api_secret: str, proxies: Sequence[str] = ()):
+        self.name = name
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.proxies = tuple(proxies)       # URL прокси; первый — основной, остальные — запасные
+        self.proxy_host = self.proxies[0].split("@")[-1] if self.proxies else "direct"
+        self.signer = get_signer(api_secret)
+        # Состояние ротации (runner.account_registry)
+        self.balance: Optional[Decimal] = None
+        self.cooldown_until = 0.0
+        self.failures = 0
+
+    @property
+    def proxy(self) -> Optional[str]:
+        return self.proxies[0] if self.proxies else None
+
+    def __reduce__(self):
+        # Для передачи в процесс-шард: HMAC и состояние ротации создаются там заново
+        return Account, (self.name, self.api_key, self.api_secret, self.proxies)
+
+    def __repr__(self) -> str:
+        return f"Account({self.name}, {self.proxy_host})"
+
+def parse_proxy(entry: str) -> str:
+    host, port, user, pwd = entry.split(":")
+    return f"http://{user}:{pwd}@{host}:{port}"
+
+def load_keys_and_proxies() -> List[Account]:
     with open(KEYS_FILE, "r", encoding="utf-8") as f:
         keys = json.load(f)
     with open(PROXY_FILE, "r", encoding="utf-8") as f:
@@ -15,15 +54,17 @@ def load_keys_and_proxies() -> List[Dict[str, str]]:
     for i, k in enumerate(keys):
         if "api_key" not in k or "api_secret" not in k:
             raise ValueError(f"[CONFIG] Key entry #{i} missing api_key/api_secret")
+        # В строке может быть несколько прокси через пробел или запятую: первый — основной,
+        # остальные — запасные (выбор и переключение — network.proxy_pool)
         try:
-            host, port, user, pwd = proxies[i].split(":")
-            proxy_url = f"http://{user}:{pwd}@{host}:{port}"
+            account_proxies = [parse_proxy(p) for p in re.split(r"[\s,;]+", proxies[i])]
         except Exception as e:
             raise ValueError(f"[CONFIG] Invalid proxy format at line {i+1}: {proxies[i]} → {e}")
-        accounts.append({
-            "api_key": k["api_key"],
-            "api_secret": k["api_secret"],
-            "proxy": {"http": proxy_url, "https": proxy_url}
-        })
+        accounts.append(Account(
+            name=k.get("name") or f"Account{i+1}",
+            api_key=k["api_key"],
+            api_secret=k["api_secret"],
+            proxies=account_proxies
+        ))
 
     return accounts
\ No newline at end of file
@@ -1,10 +1,13 @@
+import os
 from decimal import Decimal
 from typing import Tuple
 
 # === API и файлы ===
-BASE_URL = "https://fapi.asterdex.com"
+BASE_URL = os.getenv("ASTER_BASE_URL", "https://fapi.asterdex.com")    # env — для локального симулятора
 KEYS_FILE = "config/keys.json"       
 PROXY_FILE = "config/proxies.txt"  
+EXCHANGE_INFO_CACHE_FILE = "cache/exchange_info.json"
+EXCHANGE_INFO_TTL_S = 6 * 3600      # срок жизни кэша exchangeInfo, сек
 
 # === Торговый символ ===
 SYMBOLS = ["BTCUSDT","ETHUSDT"]   # Торгуемые пары
@@ -20,4 +23,109 @@ HOLD_TIME_RANGE: Tuple[int, int] = (30, 110)        # в секундах
 # === Пауза между циклами ===
 BETWEEN_CYCLES_RANGE: Tuple[int, int] = (30, 200)     # в секундах
 
+# === Параллельные циклы ===
+SCHEDULER_ENABLED = True            # True — несколько циклов одновременно, False — по одному
+MAX_CONCURRENT_CYCLES = 10          # общий лимит одновременных циклов (не больше аккаунтов / 3)
+MAX_CYCLES_PER_SYMBOL = 5           # лимит одновременных циклов на одну пару
 
+# === HTTP-сессии (keep-alive) ===
+HTTP_POOL_CONNECTIONS = 2           # число хостов в пуле одной сессии
+HTTP_POOL_MAXSIZE = 4               # соединений на аккаунт (ордер + опрос статуса)
+HTTP_PUBLIC_POOL_MAXSIZE = 20       # соединений для публичных запросов (общие на все циклы)
+HTTP_MAX_RETRIES = 2                # повторы GET при ошибке соединения / 502-504
+HTTP_RETRY_BACKOFF = 0.2            # базовая задержка между повторами, сек
+
+# === WebSocket / user-data stream ===
+WS_BASE_URL = os.getenv("ASTER_WS_BASE_URL", "wss://fstream.asterdex.com")
+USER_STREAM_ENABLED = True          # исполнения ордеров из user-data stream вместо опроса REST
+USER_STREAM_KEEPALIVE_S = 1800      # продление listenKey, сек
+WS_PING_INTERVAL = 20               # ping WebSocket, сек
+WS_RECONNECT_DELAY = 1.0            # начальная задержка переподключения, сек
+WS_MAX_RECONNECT_DELAY = 30.0       # максимальная задержка переподключения, сек
+MARK_PRICE_STREAM_ENABLED = True    # mark price из WebSocket вместо REST-запроса на каждый цикл
+MARK_PRICE_TTL_S = 5.0              # старше — цена считается устаревшей, берётся из REST
+ORDER_STATE_TTL_S = 300             # сколько хранить ордер из user-data stream после финального статуса, сек
+ORDER_STATE_MAX = 10000             # предел таблицы ордеров: сверх него вытесняются самые старые
+
+# === Статистика ===
+STATS_EXPORT_INTERVAL_S = 300       # как часто выгружать stats.xlsx из журнала, сек
+FILLS_DIR = "fills"                 # колоночная история исполнений (цена, комиссия, cycle_id): python -m tools.fill_report
+
+# === Журнал циклов (восстановление после перезапуска) ===
+CYCLE_JOURNAL_DIR = "journal"       # journal/cycles-bot.jsonl (у шардов — cycles-shardN.jsonl)
+CYCLE_JOURNAL_FSYNC = False         # True — fsync после каждой записи (переживает и сбой ОС, но медленнее)
+CYCLE_JOURNAL_MAX_BYTES = 5 * 1024 * 1024   # больше — файл переписывается только из незавершённых циклов, байт
+CYCLE_RESUME_MIN_HOLD_S = 2         # меньше оставшегося удержания — цикл при запуске закрывается сразу, сек
+
+# === Проверка аккаунтов при запуске ===
+BOOTSTRAP_CONCURRENCY = 10          # одновременно проверяемых аккаунтов (лимиты биржи)
+MIN_AVAILABLE_BALANCE_USDT = Decimal("5")   # меньше — аккаунт не участвует в циклах
+
+# === Локальный учёт маржи и позиций (проверки до отправки ордера) ===
+MARGIN_LEDGER_ENABLED = True        # False — ордера уходят без проверок, отказы — только от биржи
+MARGIN_LEDGER_BUFFER = Decimal("0.05")  # запас к требуемой марже на комиссии и движение цены (доля)
+
+# === Дневной план объёма (только с SCHEDULER_ENABLED) ===
+PLANNER_ENABLED = False             # True — циклы по плану к дневной цели вместо случайных пауз
+DAILY_VOLUME_TARGET_USDT = Decimal("5000")  # цель объёма на аккаунт за сутки (UTC), USDT
+DAILY_FEE_BUDGET_USDT = Decimal("2.5")      # предел комиссий на аккаунт за сутки, USDT
+TAKER_FEE_RATE = Decimal("0.0004")  # комиссия market-ордера: для бюджета, пока реальная не пришла из user-data stream
+PLANNER_REPLAN_INTERVAL_S = 900     # пересчёт несыгранной части плана, сек
+PLANNER_REPLAN_DRIFT = 0.1          # пересчитать раньше, если факт разошёлся с планом больше чем на эту долю
+
+# === Ротация аккаунтов ===
+ACCOUNT_ROTATION_JITTER = 1.0       # перемешивание очереди аккаунтов, в кругах: 0 — строгая очередь, тройки повторяются
+ACCOUNT_COOLDOWN_S = 60             # пауза аккаунта после неудачной ноги, сек (удваивается при ошибках подряд)
+ACCOUNT_MAX_COOLDOWN_S = 1800       # максимальная пауза, сек
+
+# === Лимиты запросов биржи ===
+IP_WEIGHT_LIMIT_1M = 2400           # вес запросов в минуту на IP (прокси)
+ORDER_LIMIT_1M = 1200               # ордеров в минуту на аккаунт
+ORDER_LIMIT_10S = 300               # ордеров за 10 секунд на аккаунт
+RATE_LIMIT_MAX_RETRIES = 3          # повторов после 429/418
+RATE_LIMIT_MAX_WAIT_S = 120         # дольше Retry-After не ждём — ошибка
+RATE_LIMIT_DEFAULT_RETRY_AFTER_S = 5    # если биржа не прислала Retry-After
+TIME_SYNC_INTERVAL_S = 300          # как часто сверять часы с /fapi/v1/time, сек
+
+# === Ордера: хеджирование запроса ===
+ORDER_HEDGE_ENABLED = False         # повтор ордера через запасной прокси аккаунта, если ответа нет дольше квантиля
+ORDER_HEDGE_QUANTILE = 0.95         # квантиль задержки POST /fapi/v1/order, после которого уходит второй запрос
+ORDER_HEDGE_MIN_SAMPLES = 50        # меньше замеров — ждём ORDER_HEDGE_DEFAULT_DELAY_S
+ORDER_HEDGE_DEFAULT_DELAY_S = 1.0   # задержка до второго запроса, пока статистики мало, сек
+ORDER_HEDGE_MIN_DELAY_S = 0.05      # не раньше, сек
+ORDER_HEDGE_RECV_WINDOW_MS = 1000   # recvWindow первого запроса: после него биржа его уже не примет, мс
+ORDER_HEDGE_CLOCK_MARGIN_S = 0.2    # запас на погрешность часов сверх recvWindow, сек
+
+# === Шардирование (несколько процессов) ===
+SHARD_WORKERS = 0                   # 0/1 — всё в одном процессе; N — координатор и N процессов (лимиты циклов выше — на шард)
+SHARD_REPORT_INTERVAL_S = 10        # как часто шард присылает метрики и состояние, сек
+SHARD_SHUTDOWN_TIMEOUT_S = 120      # сколько ждать закрытия позиций шардами при остановке, сек
+
+# === Пул прокси (несколько на аккаунт в строке proxies.txt) ===
+PROXY_PROBE_INTERVAL_S = 30         # как часто пинговать каждый прокси, сек
+PROXY_PROBE_TIMEOUT_S = 5           # таймаут проверочного пинга, сек
+PROXY_RTT_ALPHA = 0.2               # вес нового замера в скользящих RTT и доле ошибок
+PROXY_ERROR_PENALTY = 5.0           # оценка прокси: RTT * (1 + штраф * доля ошибок)
+PROXY_SWITCH_RATIO = 1.5            # запасной прокси берётся, только если лучше более приоритетного во столько раз
+PROXY_EJECT_FAILURES = 3            # сетевых ошибок подряд до исключения прокси из ротации
+PROXY_EJECT_S = 30                  # первое исключение, сек (удваивается при повторных)
+PROXY_MAX_EJECT_S = 600             # максимальное исключение, сек
+PROXY_MAX_FAILOVERS = 2             # переотправок запроса через другой прокси после сетевой ошибки
+
+# === Логи ===
+LOG_LEVEL = "INFO"                  # DEBUG / INFO / WARNING; записи ниже уровня даже не форматируются
+LOG_DIR = "logs"                    # JSON-строки: logs/bot.jsonl (у шардов — logs/shardN.jsonl)
+LOG_FILE_MAX_BYTES = 50 * 1024 * 1024   # размер файла лога до ротации, байт
+LOG_FILE_BACKUPS = 5                # сколько старых файлов лога хранить
+LOG_CONSOLE_ENABLED = True          # цветной вывод в консоль (в файл пишется всегда)
+LOG_CONSOLE_MAX_PER_S = 20          # строк INFO в секунду на консоль, остальные — только в файл (0 — без ограничения)
+
+# === Кассета REST (запись и воспроизведение сессии) ===
+CASSETTE_MODE = os.getenv("ASTER_CASSETTE_MODE", "")   # record — писать запросы и ответы, replay — отвечать из кассеты без сети
+CASSETTE_FILE = os.getenv("ASTER_CASSETTE", "cassettes/session.jsonl.gz")
+CASSETTE_SPEED = float(os.getenv("ASTER_CASSETTE_SPEED", "1"))  # replay: 1 — задержки как в записи, N — в N раз быстрее, 0 — без задержек
+
+# === Метрики (Prometheus) ===
+METRICS_ENABLED = True              # http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
@@ -1,9 +1,24 @@
 import random
 import time
 from config.accounts import load_keys_and_proxies
-from config.settings import SYMBOLS, DEFAULT_LEVERAGE
-from trading.core import load_symbol_filters, symbol_filters, set_leverage
+from config.settings import (
+    SYMBOLS, DEFAULT_LEVERAGE, SCHEDULER_ENABLED, USER_STREAM_ENABLED, MARK_PRICE_STREAM_ENABLED,
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT, SHARD_WORKERS, PLANNER_ENABLED
+)
+from trading.core import load_all_symbol_filters, symbol_filters
 from runner.cycle_runner import run_cycle
+from runner.scheduler import run_scheduler
+from runner.bootstrap import bootstrap_accounts
+from runner.account_registry import AccountRegistry
+from runner.cycle_journal import cycle_journal, recover_cycles
+from runner.sharded import run_sharded
+from network.user_stream import start_user_streams, stop_user_streams
+from network.price_feed import start_mark_price_feed, stop_mark_price_feed
+from network.time_sync import start_clock_sync, stop_clock_sync
+from network.proxy_pool import start_proxy_prober, stop_proxy_prober
+from network.cassette import cassette
+from utils.stats_journal import stats_journal
+from utils.metrics import start_metrics_server, stop_metrics_server
 
 def main():
     print("=== AsterDex Trader ===")
@@ -23,32 +38,74 @@ def main():
     print(f"[INIT] Loaded {len(accounts)} accounts.")
     time.sleep(1)
 
-    for symbol in SYMBOLS:
-        load_symbol_filters(symbol)
+    symbols = SYMBOLS if isinstance(SYMBOLS, list) else [SYMBOLS]
+    # Кассета покрывает только REST одного процесса: потоки, проверка прокси и шарды в этом режиме выключены
+    rest_only = bool(cassette.mode)
+    if rest_only:
+        print(f"[INIT] Cassette {cassette.mode}: {cassette.path} (REST only, single process)")
+    if SHARD_WORKERS > 1 and not rest_only:
+        run_sharded(accounts, symbols, SHARD_WORKERS)
+        return
+
+    if METRICS_ENABLED:
+        start_metrics_server(METRICS_HOST, METRICS_PORT)
+        print(f"[INIT] Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    if not rest_only:
+        start_proxy_prober(accounts)
+    start_clock_sync()
+
+    load_all_symbol_filters(symbols)
+    for symbol in symbols:
         f = symbol_filters.get(symbol)
         if f:
             print(f"[INIT] Filters for {symbol}: step={f['LOT_STEP']}, minQty={f['MIN_QTY']}")
         else:
             print(f"[WARN] No filters loaded for {symbol}")
-        time.sleep(0.5)
 
-    for symbol in SYMBOLS:
-        for acct in accounts:
-            name = acct.get("name", "???")
-            try:
-                set_leverage(acct, symbol, DEFAULT_LEVERAGE)
-            except Exception as e:
-                print(f"[LEVERAGE] Failed for {name} | {symbol}: {e}")
-            time.sleep(0.2)
+    # Незавершённые циклы прошлого запуска: закрыть сейчас или досидеть удержание в планировщике
+    resumed = recover_cycles(accounts, resume=SCHEDULER_ENABLED)
+    busy = {a for plan, _ in resumed for a in plan["accounts"]}
+
+    rows = bootstrap_accounts(accounts, symbols, DEFAULT_LEVERAGE)
+    # Занятые восстановленным циклом — в ротации, даже если маржа в позиции опустила свободный баланс
+    accounts = [r["account"] for r in rows if r["ready"] or r["account"] in busy]
+    print(f"[INIT] {len(accounts)}/{len(rows)} accounts ready.")
+    if len(accounts) < 3:
+        print(f"[ERROR] Need at least {3} ready accounts. Found: {len(accounts)}")
+        return
+
+    stats_journal.start()
+
+    if MARK_PRICE_STREAM_ENABLED and not rest_only:
+        start_mark_price_feed(symbols)
 
+    if USER_STREAM_ENABLED and not rest_only:
+        start_user_streams(accounts)
+        print(f"[INIT] User-data streams started for {len(accounts)} accounts.")
+
+    registry = AccountRegistry(accounts, busy=busy)
+    if PLANNER_ENABLED and not SCHEDULER_ENABLED:
+        print("[WARN] PLANNER_ENABLED works only with SCHEDULER_ENABLED — cycles follow random pauses")
     print("[INFO] Press Ctrl+C to stop.\n")
 
     try:
-        while True:
-            symbol = random.choice(SYMBOLS) if isinstance(SYMBOLS, list) else SYMBOLS
-            run_cycle(accounts, symbol)
+        if SCHEDULER_ENABLED:
+            run_scheduler(registry, symbols, resumed)
+        else:
+            while True:
+                symbol = random.choice(symbols)
+                run_cycle(registry, symbol)
     except KeyboardInterrupt:
         print("\n[STOP] Interrupted by user. Exiting gracefully.")
+    finally:
+        stop_user_streams()
+        stop_mark_price_feed()
+        stats_journal.stop()
+        cycle_journal.stop()
+        stop_clock_sync()
+        stop_proxy_prober()
+        stop_metrics_server()
+        cassette.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
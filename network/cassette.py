@@ -0,0 +1,154 @@
+"""Кассета REST: запись запросов и ответов сессии и воспроизведение без сети.
+
+Запись (CASSETTE_MODE=record): каждый запрос `network.client.send` — метод, путь,
+параметры без `signature`/`timestamp`, имя аккаунта вместо ключа, статус, нужные
+лимитеру заголовки, тело, задержка и время от начала — строкой JSON в gzip-файл.
+Сетевые ошибки пишутся тоже и при воспроизведении поднимаются тем же исключением.
+
+Воспроизведение (CASSETTE_MODE=replay): ответ берётся из кассеты по ключу
+(метод, путь, аккаунт, symbol/side/reduceOnly) в порядке записи, с задержкой
+записанной / CASSETTE_SPEED. GET, которого в записи больше не осталось, получает
+последний ответ на тот же эндпоинт этого аккаунта (цены, статус); лишний POST — CassetteMiss.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config.settings import BASE_URL, CASSETTE_MODE, CASSETTE_FILE, CASSETTE_SPEED
+from utils.logger import logger
+
+# Параметры, которые меняются от запуска к запуску или секретны
+VOLATILE_PARAMS = ("signature", "timestamp")
+KEPT_HEADERS = ("Retry-After", "X-MBX-USED-WEIGHT-1M", "X-MBX-ORDER-COUNT-10S", "X-MBX-ORDER-COUNT-1M")
+REDACTED_FIELDS = ("listenKey",)
+
+class CassetteMiss(RuntimeError):
+    """В кассете нет ответа на этот запрос."""
+
+def _match_key(method: str, path: str, account: Optional[str], params: dict) -> Tuple:
+    return (method, path, account, params.get("symbol"), params.get("side"), params.get("reduceOnly"))
+
+def _redact_body(text: str) -> str:
+    if not any(f in text for f in REDACTED_FIELDS):
+        return text
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(body, dict):
+        for f in REDACTED_FIELDS:
+            if f in body:
+                body[f] = "redacted"
+    return json.dumps(body)
+
+class Cassette:
+    def __init__(self, mode: str = CASSETTE_MODE, path: str = CASSETTE_FILE, speed: float = CASSETTE_SPEED):
+        self.configure(mode, path, speed)
+
+    def configure(self, mode: str, path: str, speed: float = 1.0):
+        """mode: "" — выключено, "record" или "replay"."""
+        if mode not in ("", "record", "replay"):
+            raise ValueError(f"[CASSETTE] Unknown mode: {mode!r}")
+        self.mode = mode
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._file = None
+        self._started = None
+        self._queues: Optional[Dict[Tuple, Deque[dict]]] = None
+        self._last: Dict[Tuple, dict] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "reused": 0, "missed": 0}
+
+    # === Запись ===
+    def record(self, method: str, path: str, account: Optional[str], params: Optional[dict],
+               response: Optional[requests.Response] = None, elapsed: float = 0.0, error: Optional[Exception] = None):
+        entry = {
+            "m": method,
+            "p": path,
+            "a": account,
+            "q": {k: str(v) for k, v in (params or {}).items() if k not in VOLATILE_PARAMS},
+            "e": round(elapsed, 6)
+        }
+        if error is not None:
+            entry["err"] = type(error).__name__
+        else:
+            entry["s"] = response.status_code
+            entry["h"] = {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers}
+            entry["b"] = _redact_body(response.text)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = gzip.open(self.path, "wt", encoding="utf-8")
+                self._started = time.monotonic()
+                self._file.write(json.dumps({"version": 1, "created": time.time()}) + "\n")
+            entry["t"] = round(time.monotonic() - self._started, 6)
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.stats["recorded"] += 1
+
+    # === Воспроизведение ===
+    def _load(self):
+        queues: Dict[Tuple, Deque[dict]] = {}
+        count = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for i, line in enumerate(f):
+                    if i == 0:
+                        continue    # заголовок
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break       # запись оборвалась
+                    queues.setdefault(_match_key(entry["m"], entry["p"], entry["a"], entry["q"]), deque()).append(entry)
+                    count += 1
+            except EOFError:
+                pass                # процесс записи не закрыл файл
+        self._queues = queues
+        logger.info("[CASSETTE] Loaded %s responses from %s", count, self.path)
+
+    def replay(self, method: str, path: str, account: Optional[str], params: Optional[dict]) -> requests.Response:
+        params = params or {}
+        with self._lock:
+            if self._queues is None:
+                self._load()
+            queue = self._queues.get(_match_key(method, path, account, params))
+            if queue:
+                entry = queue.popleft()
+                self._last[(method, path, account)] = entry
+                self.stats["replayed"] += 1
+            elif method == "GET" and (method, path, account) in self._last:
+                entry = self._last[(method, path, account)]
+                self.stats["reused"] += 1
+            else:
+                self.stats["missed"] += 1
+                raise CassetteMiss(f"[CASSETTE] No recorded response for {method} {path} ({account}, {params.get('symbol')})")
+
+        if self.speed > 0 and entry["e"]:
+            time.sleep(entry["e"] / self.speed)
+        if "err" in entry:
+            raise getattr(requests.exceptions, entry["err"], requests.ConnectionError)(f"[CASSETTE] recorded {entry['err']}")
+        r = requests.Response()
+        r.status_code = entry["s"]
+        r.headers = CaseInsensitiveDict(entry.get("h") or {})
+        r._content = entry["b"].encode()
+        r.encoding = "utf-8"
+        r.request = requests.Request(method, f"{BASE_URL}{path}").prepare()
+        return r
+
+    def remaining(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in (self._queues or {}).values())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+cassette = Cassette()
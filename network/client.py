@@ -1,46 +1,227 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from typing import Optional
 import requests
-from config.settings import BASE_URL
-from utils.time_utils import now_ms
-from network.signer import sign
+from config.settings import (
+    BASE_URL, RATE_LIMIT_MAX_RETRIES, PROXY_MAX_FAILOVERS,
+    ORDER_HEDGE_QUANTILE, ORDER_HEDGE_MIN_SAMPLES, ORDER_HEDGE_DEFAULT_DELAY_S, ORDER_HEDGE_MIN_DELAY_S,
+    ORDER_HEDGE_RECV_WINDOW_MS, ORDER_HEDGE_CLOCK_MARGIN_S
+)
+from utils.time_utils import server_now_ms
+from config.accounts import Account
+from network.session_pool import get_session
+from network.rate_limiter import rate_limiter, IpBanned
+from network.proxy_pool import proxy_manager, proxy_host
+from network.cassette import cassette
+from utils.metrics import REQUEST_SECONDS, REQUEST_ERRORS, PROXY_FAILOVERS, ORDER_HEDGES
 
 REQUEST_TIMEOUT = 10.0
+DUPLICATE_ORDER_CODE = -4116    # newClientOrderId уже использован
+UNKNOWN_ORDER_CODE = -2013      # Order does not exist
+HEDGE_POOL_SIZE = 64
+
+class ApiError(RuntimeError):
+    """Ответ биржи с ошибкой: HTTP-статус и код биржи (например, -2019)."""
+    def __init__(self, message: str, status: int, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
 def raise_with_body(r: requests.Response, path: str):
     try:
         msg = r.json()
     except Exception:
         msg = r.text
-    raise RuntimeError(f"HTTP {r.status_code} {r.request.method} {path}: {msg}")
+    code = msg.get("code") if isinstance(msg, dict) else None
+    raise ApiError(f"HTTP {r.status_code} {r.request.method} {path}: {msg}", r.status_code, code)
 
-def public_get(path: str, params: dict = None) -> dict:
-    url = f"{BASE_URL}{path}"
-    r = requests.get(url, params=params or {}, timeout=REQUEST_TIMEOUT)
-    if not r.ok:
-        raise_with_body(r, path)
-    return r.json()
-
-def private_post(path: str, account: dict, params: dict) -> dict:
-    params = dict(params)
-    params.setdefault("recvWindow", 5000)
-    params.setdefault("timestamp", now_ms())
-    params["signature"] = sign(params, account["api_secret"])
-    headers = {
-        "X-MBX-APIKEY": account["api_key"],
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    url = f"{BASE_URL}{path}"
-    r = requests.post(url, headers=headers, data=params, timeout=REQUEST_TIMEOUT, proxies=account["proxy"])
-    if not r.ok:
-        raise_with_body(r, path)
-    return r.json()
-
-def private_get(path: str, account: dict, params: dict = None) -> dict:
-    params = dict(params or {})
-    params.setdefault("recvWindow", 5000)
-    params.setdefault("timestamp", now_ms())
-    params["signature"] = sign(params, account["api_secret"])
-    headers = {"X-MBX-APIKEY": account["api_key"]}
+def can_failover(method: str, e: requests.RequestException) -> bool:
+    """GET можно переотправить через другой прокси при любой сетевой ошибке. Остальное —
+    только если запрос точно не дошёл до биржи (прокси отказал / не удалось соединиться),
+    иначе ордер может открыться дважды."""
+    return method == "GET" or isinstance(e, (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout))
+
+def _error_code(r: requests.Response):
+    try:
+        return r.json().get("code")
+    except Exception:
+        return None
+
+def send(method: str, path: str, account: Optional[Account] = None, params: dict = None,
+         signed: bool = False, with_key: bool = False, proxy: Optional[str] = None,
+         retries: int = RATE_LIMIT_MAX_RETRIES) -> dict:
+    """Единая точка REST: выбор прокси (или заданный `proxy`), лимиты, подпись, повтор после
+    429/418 с учётом Retry-After, переключение на другой прокси аккаунта при сетевой ошибке.
+    `timestamp` в `params` подписывается как есть (hedged_post, без повторов: `retries=0`)."""
     url = f"{BASE_URL}{path}"
-    r = requests.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT, proxies=account["proxy"])
-    if not r.ok:
-        raise_with_body(r, path)
-    return r.json()
\ No newline at end of file
+    proxy_url = proxy or proxy_manager.pick(account)
+    account_key = account.api_key if account is not None else None
+    endpoint = f"{method} {path}"
+    account_name = account.name if account is not None else None
+    account_label = account_name or "public"
+    headers = {"X-MBX-APIKEY": account.api_key} if (signed or with_key) else None
+    resynced = False
+    tried = []
+
+    for attempt in range(retries + 1):
+        data = None
+        query = params
+        if signed:
+            # Подписываем заново на каждой попытке: после паузы старый timestamp вне recvWindow
+            payload = dict(params or {})
+            payload.setdefault("recvWindow", 5000)
+            payload["timestamp"] = payload.get("timestamp") or server_now_ms()
+            query = account.signer.signed_query(payload)
+            if method == "POST":
+                data, query = query, None
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        # Каждый прокси — отдельный IP со своим бюджетом веса
+        key = proxy_url or "direct"
+        try:
+            rate_limiter.acquire(key, account_key, method, path)
+        except IpBanned:
+            # Запрос не отправлен — безопасно для любого метода: другой прокси аккаунта
+            tried.append(proxy_url)
+            fallback = proxy_manager.pick(account, exclude=tried) if proxy_url else None
+            if fallback and len(tried) <= PROXY_MAX_FAILOVERS and attempt < retries:
+                PROXY_FAILOVERS.inc(proxy=proxy_host(proxy_url))
+                proxy_url = fallback
+                continue
+            raise
+        started = time.perf_counter()
+        try:
+            if cassette.mode == "replay":
+                r = cassette.replay(method, path, account_name, params)
+            else:
+                r = get_session(account, proxy_url).request(method, url, headers=headers, params=query, data=data, timeout=REQUEST_TIMEOUT)
+                if cassette.mode == "record":
+                    cassette.record(method, path, account_name, params, r, time.perf_counter() - started)
+        except requests.RequestException as e:
+            if cassette.mode == "record":
+                cassette.record(method, path, account_name, params, elapsed=time.perf_counter() - started, error=e)
+            REQUEST_ERRORS.inc(endpoint=endpoint, code=type(e).__name__)
+            proxy_manager.report(proxy_url, False)
+            tried.append(proxy_url)
+            fallback = proxy_manager.pick(account, exclude=tried) if proxy_url else None
+            if (fallback and len(tried) <= PROXY_MAX_FAILOVERS and attempt < retries
+                    and can_failover(method, e)):
+                PROXY_FAILOVERS.inc(proxy=proxy_host(proxy_url))
+                proxy_url = fallback
+                continue
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, account=account_label, proxy=proxy_host(key))
+        proxy_manager.report(proxy_url, True, elapsed)
+        if not r.ok:
+            REQUEST_ERRORS.inc(endpoint=endpoint, code=_error_code(r) or r.status_code)
+
+        retry_after = rate_limiter.on_response(key, account_key, r.status_code, r.headers)
+        if retry_after and attempt < retries:
+            # acquire() дождётся снятия короткой блокировки, при долгой — уйдёт на другой прокси
+            continue
+        if signed and not resynced and attempt < retries and r.status_code == 400 and _error_code(r) == -1021:
+            # Timestamp вне recvWindow: часы уехали — синхронизируемся и повторяем один раз
+            from network.time_sync import sync_clock  # time_sync сам импортирует client
+            resynced = True
+            sync_clock()
+            continue
+        if not r.ok:
+            raise_with_body(r, path)
+        return r.json()
+
+def public_get(path: str, params: dict = None, account: Optional[Account] = None) -> dict:
+    """Публичный запрос; с `account` — через сессию и прокси этого аккаунта."""
+    return send("GET", path, account, params)
+
+def private_post(path: str, account: Account, params: dict) -> dict:
+    return send("POST", path, account, params, signed=True)
+
+def private_get(path: str, account: Account, params: dict = None) -> dict:
+    return send("GET", path, account, params, signed=True)
+
+# === Хеджированный запрос ордера ===
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_lock = threading.Lock()
+
+def _hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="hedge")
+        return _hedge_pool
+
+def hedge_delay(path: str) -> float:
+    """Сколько ждать первый ответ: квантиль наблюдаемой задержки эндпоинта по всем аккаунтам и прокси."""
+    q = REQUEST_SECONDS.quantile(ORDER_HEDGE_QUANTILE, min_count=ORDER_HEDGE_MIN_SAMPLES, endpoint=f"POST {path}")
+    return max(ORDER_HEDGE_MIN_DELAY_S, q if q is not None else ORDER_HEDGE_DEFAULT_DELAY_S)
+
+def hedged_post(path: str, account: Account, params: dict) -> dict:
+    """Подписанный POST ордера с newClientOrderId в `params`.
+
+    Биржа отклоняет повтор newClientOrderId только среди открытых ордеров, а MARKET
+    исполняется сразу: копия, отправленная, пока первый запрос ещё может дойти, откроет
+    позицию второй раз. Поэтому первый запрос подписан коротким recvWindow
+    (ORDER_HEDGE_RECV_WINDOW_MS) и уходит без повторов. Если ответа нет дольше
+    `hedge_delay`, ждём конца его окна — дальше биржа его не примет — и ищем ордер по
+    origClientOrderId через другой прокси аккаунта: найден — это и есть ответ; нет —
+    туда же уходит копия. Берётся первый успешный ответ.
+    """
+    pool = _hedge_executor()
+    primary = proxy_manager.pick(account)
+    stamped = dict(params, recvWindow=ORDER_HEDGE_RECV_WINDOW_MS, timestamp=server_now_ms())
+    expires_at = stamped["timestamp"] + ORDER_HEDGE_RECV_WINDOW_MS
+    first = pool.submit(send, "POST", path, account, stamped, True, False, primary, 0)
+    try:
+        return first.result(timeout=hedge_delay(path))
+    except FutureTimeout:
+        pass
+    backup = proxy_manager.pick(account, exclude=[primary])
+    if not backup or backup == primary:
+        return first.result()
+    try:
+        return first.result(timeout=max(0.0, (expires_at - server_now_ms()) / 1000) + ORDER_HEDGE_CLOCK_MARGIN_S)
+    except FutureTimeout:
+        pass
+
+    lookup = {"symbol": params["symbol"], "origClientOrderId": params["newClientOrderId"]}
+    try:
+        existing = send("GET", "/fapi/v1/order", account, lookup, True, False, backup)
+    except ApiError as e:
+        if e.code != UNKNOWN_ORDER_CODE:
+            return first.result()
+    except requests.RequestException:
+        return first.result()
+    else:
+        ORDER_HEDGES.inc(result="found")
+        return existing
+
+    ORDER_HEDGES.inc(result="sent")
+    second = pool.submit(send, "POST", path, account, params, True, False, backup)
+    errors = []
+    for fut in as_completed((first, second)):
+        try:
+            result = fut.result()
+        except Exception as e:
+            errors.append(e)
+            continue
+        ORDER_HEDGES.inc(result="primary" if fut is first else "hedge")
+        return result
+    raise next((e for e in errors if getattr(e, "code", None) == DUPLICATE_ORDER_CODE), errors[0])
+
+def api_key_request(method: str, path: str, account: Account, params: dict = None) -> dict:
+    """Запрос только с X-MBX-APIKEY, без подписи (listenKey)."""
+    return send(method, path, account, params, with_key=True)
+
+# === Async-варианты для конкурентных путей (тот же пул сессий, запрос в пуле потоков) ===
+async def async_public_get(path: str, params: dict = None, account: Optional[Account] = None) -> dict:
+    return await asyncio.to_thread(public_get, path, params, account)
+
+async def async_private_post(path: str, account: Account, params: dict) -> dict:
+    return await asyncio.to_thread(private_post, path, account, params)
+
+async def async_private_get(path: str, account: Account, params: dict = None) -> dict:
+    return await asyncio.to_thread(private_get, path, account, params)
@@ -0,0 +1,52 @@
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import WS_BASE_URL, MARK_PRICE_TTL_S
+from network.ws_stream import WSStream
+
+# symbol → (mark price, время получения); пишут WS-поток и REST-fallback
+_prices: Dict[str, Tuple[Decimal, float]] = {}
+_lock = threading.Lock()
+
+def remember_mark_price(symbol: str, price: Decimal):
+    with _lock:
+        _prices[symbol] = (price, time.time())
+
+def cached_mark_price(symbol: str, max_age: float = MARK_PRICE_TTL_S) -> Optional[Decimal]:
+    entry = _prices.get(symbol)
+    if entry is None or time.time() - entry[1] > max_age:
+        return None
+    return entry[0]
+
+class MarkPriceFeed(WSStream):
+    """Combined stream `<symbol>@markPrice@1s` для всех торгуемых пар."""
+
+    def __init__(self, symbols: List[str], ws_base_url: str = WS_BASE_URL):
+        super().__init__(name="mark-price")
+        self.symbols = list(symbols)
+        self.ws_base_url = ws_base_url.rstrip("/")
+
+    def build_url(self) -> str:
+        streams = "/".join(f"{s.lower()}@markPrice@1s" for s in self.symbols)
+        return f"{self.ws_base_url}/stream?streams={streams}"
+
+    def handle(self, data: dict):
+        payload = data.get("data", data)
+        if payload.get("e") == "markPriceUpdate":
+            remember_mark_price(payload["s"], Decimal(str(payload["p"])))
+
+mark_price_feed: Optional[MarkPriceFeed] = None
+
+def start_mark_price_feed(symbols: List[str]):
+    global mark_price_feed
+    if mark_price_feed is None:
+        mark_price_feed = MarkPriceFeed(symbols)
+        mark_price_feed.start()
+
+def stop_mark_price_feed():
+    global mark_price_feed
+    if mark_price_feed is not None:
+        mark_price_feed.stop()
+        mark_price_feed = None
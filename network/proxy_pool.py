@@ -0,0 +1,174 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from config.accounts import Account
+from config.settings import (
+    BASE_URL, PROXY_PROBE_INTERVAL_S, PROXY_PROBE_TIMEOUT_S, PROXY_RTT_ALPHA, PROXY_ERROR_PENALTY,
+    PROXY_SWITCH_RATIO, PROXY_EJECT_FAILURES, PROXY_EJECT_S, PROXY_MAX_EJECT_S
+)
+from network.rate_limiter import rate_limiter
+from network.session_pool import get_session
+from utils.logger import logger
+from utils.metrics import PROXY_HEALTHY, PROXY_RTT_SECONDS
+
+# Оценка прокси без замеров: хуже любого нормального RTT, но лучше исключённого
+UNKNOWN_RTT_S = 1.0
+
+def proxy_host(proxy_url: Optional[str]) -> str:
+    """host:port без логина и пароля — для логов и меток метрик."""
+    return proxy_url.split("@")[-1] if proxy_url else "direct"
+
+
+class ProxyHealth:
+    """Скользящие RTT и доля ошибок одного прокси; исключение после серии ошибок."""
+    __slots__ = ("url", "host", "rtt", "error_rate", "failures", "ejections", "ejected_until")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.host = proxy_host(url)
+        self.rtt: Optional[float] = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def score(self) -> float:
+        rtt = UNKNOWN_RTT_S if self.rtt is None else self.rtt
+        return rtt * (1 + PROXY_ERROR_PENALTY * self.error_rate)
+
+class ProxyManager:
+    """Выбор прокси для запроса по оценке RTT/ошибок и автоматическое исключение/возврат."""
+
+    def __init__(self):
+        self._health: Dict[str, ProxyHealth] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, url: str) -> ProxyHealth:
+        health = self._health.get(url)
+        if health is None:
+            with self._lock:
+                health = self._health.setdefault(url, ProxyHealth(url))
+        return health
+
+    def pick(self, account: Optional[Account], exclude: Iterable[str] = ()) -> Optional[str]:
+        """Лучший здоровый прокси аккаунта; None — без прокси (или не из чего выбрать после exclude).
+
+        Порядок из proxies.txt — приоритет: прокси ниже по списку выбирается, только
+        если он лучше всех выше в PROXY_SWITCH_RATIO раз (без «дребезга» между близкими).
+        """
+        if account is None:
+            return None
+        urls = [u for u in account.proxies if u not in exclude]
+        if not urls:
+            return None
+        now = time.monotonic()
+        candidates = [self._get(u) for u in urls]
+        healthy = [h for h in candidates if not h.ejected(now)]
+        if not healthy:
+            # Все исключены — берём тот, что вернётся в ротацию раньше
+            return min(candidates, key=lambda h: h.ejected_until).url
+        best = min(h.score() for h in healthy)
+        for h in healthy:
+            if h.score() <= best * PROXY_SWITCH_RATIO:
+                return h.url
+        return healthy[0].url
+
+    def report(self, proxy_url: Optional[str], ok: bool, rtt: Optional[float] = None):
+        """Результат запроса через прокси: ok=False — сетевая ошибка (не ответ биржи с ошибкой)."""
+        if not proxy_url:
+            return
+        health = self._get(proxy_url)
+        restored = False
+        eject_s = 0.0
+        with self._lock:
+            now = time.monotonic()
+            if ok:
+                if rtt is not None:
+                    health.rtt = rtt if health.rtt is None else health.rtt + PROXY_RTT_ALPHA * (rtt - health.rtt)
+                health.error_rate *= 1 - PROXY_RTT_ALPHA
+                health.failures = 0
+                if health.ejected_until:
+                    health.ejected_until = 0.0
+                    restored = True
+                elif health.error_rate < 0.05:
+                    health.ejections = 0
+            else:
+                health.error_rate += PROXY_RTT_ALPHA * (1 - health.error_rate)
+                health.failures += 1
+                if health.failures >= PROXY_EJECT_FAILURES and not health.ejected(now):
+                    eject_s = min(PROXY_EJECT_S * 2 ** health.ejections, PROXY_MAX_EJECT_S)
+                    health.ejected_until = now + eject_s
+                    health.ejections += 1
+
+        if health.rtt is not None:
+            PROXY_RTT_SECONDS.set(health.rtt, proxy=health.host)
+        PROXY_HEALTHY.set(0 if health.ejected(time.monotonic()) else 1, proxy=health.host)
+        if eject_s:
+            logger.warning("[PROXY] %s: %s failures in a row, ejected for %.0fs", health.host, health.failures, eject_s)
+        elif restored:
+            logger.info("[PROXY] %s: back in rotation (rtt %.0f ms)", health.host, health.rtt * 1000)
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "proxy": h.host,
+                "rtt_ms": None if h.rtt is None else round(h.rtt * 1000, 1),
+                "error_rate": round(h.error_rate, 3),
+                "ejected": h.ejected(now)
+            } for h in self._health.values()]
+
+proxy_manager = ProxyManager()
+
+class ProxyProber(threading.Thread):
+    """Периодический /fapi/v1/ping через каждый прокси, включая исключённые (для возврата)."""
+
+    def __init__(self, urls: List[str], interval_s: float = PROXY_PROBE_INTERVAL_S):
+        super().__init__(name="proxy-prober", daemon=True)
+        self.urls = urls
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=min(32, max(1, len(urls))), thread_name_prefix="proxy-probe")
+
+    def probe(self, url: str):
+        rate_limiter.acquire(url, None, "GET", "/fapi/v1/ping")
+        started = time.perf_counter()
+        try:
+            get_session(None, url).get(f"{BASE_URL}/fapi/v1/ping", timeout=PROXY_PROBE_TIMEOUT_S)
+        except requests.RequestException:
+            proxy_manager.report(url, False)
+        else:
+            proxy_manager.report(url, True, time.perf_counter() - started)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            list(self._pool.map(self.probe, self.urls))
+            self._stop_event.wait(self.interval_s)
+        self._pool.shutdown(wait=False)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout)
+
+proxy_prober = None
+
+def start_proxy_prober(accounts: List[Account]):
+    global proxy_prober
+    urls = sorted({u for acct in accounts for u in acct.proxies})
+    if proxy_prober is None and urls:
+        proxy_prober = ProxyProber(urls)
+        proxy_prober.start()
+
+def stop_proxy_prober():
+    global proxy_prober
+    if proxy_prober is not None:
+        proxy_prober.stop()
+        proxy_prober = None
@@ -0,0 +1,114 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config.settings import (
+    IP_WEIGHT_LIMIT_1M, ORDER_LIMIT_1M, ORDER_LIMIT_10S,
+    RATE_LIMIT_DEFAULT_RETRY_AFTER_S, RATE_LIMIT_MAX_WAIT_S
+)
+
+# Вес запросов (как в документации биржи); остальные — 1
+ENDPOINT_WEIGHTS: Dict[Tuple[str, str], int] = {
+    ("GET", "/fapi/v1/exchangeInfo"): 1,
+    ("GET", "/fapi/v1/premiumIndex"): 1,
+    ("GET", "/fapi/v1/order"): 1,
+    ("POST", "/fapi/v1/order"): 1,
+    ("POST", "/fapi/v1/leverage"): 1,
+    ("GET", "/fapi/v2/balance"): 5,
+    ("GET", "/fapi/v2/account"): 5,
+    ("GET", "/fapi/v2/positionRisk"): 5,
+}
+ORDER_ENDPOINTS = {("POST", "/fapi/v1/order")}
+
+class IpBanned(RuntimeError):
+    """IP (прокси) заблокирован биржей дольше RATE_LIMIT_MAX_WAIT_S: запрос не отправлялся."""
+    def __init__(self, ip_key: str, wait_s: float):
+        super().__init__(f"{ip_key} is rate-limited for another {wait_s:.0f}s")
+        self.ip_key = ip_key
+        self.wait_s = wait_s
+
+class TokenBucket:
+    """Скользящий бюджет `capacity` единиц за `window_s` секунд."""
+
+    def __init__(self, capacity: int, window_s: float):
+        self.capacity = capacity
+        self.rate = capacity / window_s
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost: int, now: float) -> float:
+        """Списывает `cost` (в долг, если нужно) и возвращает, сколько ждать до отправки."""
+        self._refill(now)
+        self.tokens -= cost
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def sync_used(self, used: int, now: float):
+        # Счётчик биржи точнее локального: никогда не считаем, что осталось больше
+        self._refill(now)
+        self.tokens = min(self.tokens, float(self.capacity - used))
+
+class RateLimiter:
+    """Бюджеты веса на IP (прокси) и количества ордеров на аккаунт.
+
+    Синхронизируется по заголовкам X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-*;
+    429/418 блокируют IP до истечения Retry-After. Блокировку не дольше
+    RATE_LIMIT_MAX_WAIT_S `acquire` пережидает, дольше — сразу IpBanned.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ip: Dict[str, TokenBucket] = {}
+        self._orders_1m: Dict[str, TokenBucket] = {}
+        self._orders_10s: Dict[str, TokenBucket] = {}
+        self._banned_until: Dict[str, float] = {}
+
+    def _bucket(self, table: Dict[str, TokenBucket], key: str, capacity: int, window_s: float) -> TokenBucket:
+        bucket = table.get(key)
+        if bucket is None:
+            bucket = table[key] = TokenBucket(capacity, window_s)
+        return bucket
+
+    def acquire(self, ip_key: str, account_key: Optional[str], method: str, path: str):
+        weight = ENDPOINT_WEIGHTS.get((method, path), 1)
+        is_order = (method, path) in ORDER_ENDPOINTS
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._banned_until.get(ip_key, 0.0) - now)
+            if wait > RATE_LIMIT_MAX_WAIT_S:
+                raise IpBanned(ip_key, wait)
+            wait = max(wait, self._bucket(self._ip, ip_key, IP_WEIGHT_LIMIT_1M, 60).reserve(weight, now))
+            if is_order and account_key:
+                wait = max(wait, self._bucket(self._orders_1m, account_key, ORDER_LIMIT_1M, 60).reserve(1, now))
+                wait = max(wait, self._bucket(self._orders_10s, account_key, ORDER_LIMIT_10S, 10).reserve(1, now))
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_response(self, ip_key: str, account_key: Optional[str], status: int, headers) -> float:
+        """Обновляет бюджеты по заголовкам; для 429/418 возвращает паузу перед повтором."""
+        with self._lock:
+            now = time.monotonic()
+            used = headers.get("X-MBX-USED-WEIGHT-1M")
+            if used:
+                self._bucket(self._ip, ip_key, IP_WEIGHT_LIMIT_1M, 60).sync_used(int(used), now)
+            if account_key:
+                orders_1m = headers.get("X-MBX-ORDER-COUNT-1M")
+                orders_10s = headers.get("X-MBX-ORDER-COUNT-10S")
+                if orders_1m:
+                    self._bucket(self._orders_1m, account_key, ORDER_LIMIT_1M, 60).sync_used(int(orders_1m), now)
+                if orders_10s:
+                    self._bucket(self._orders_10s, account_key, ORDER_LIMIT_10S, 10).sync_used(int(orders_10s), now)
+
+            if status not in (429, 418):
+                return 0.0
+            try:
+                retry_after = float(headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                retry_after = RATE_LIMIT_DEFAULT_RETRY_AFTER_S
+            self._banned_until[ip_key] = max(self._banned_until.get(ip_key, 0.0), now + retry_after)
+            return retry_after
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,62 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.accounts import Account
+from config.settings import (
+    HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_PUBLIC_POOL_MAXSIZE,
+    HTTP_MAX_RETRIES, HTTP_RETRY_BACKOFF
+)
+
+# Ключ пула: (api_key, proxy_url) — у аккаунта своя сессия на каждый его прокси.
+# Публичные запросы идут без прокси под ключом ("", None), проверки прокси — ("", proxy_url)
+_sessions: Dict[Tuple[str, Optional[str]], requests.Session] = {}
+_lock = threading.Lock()
+
+def _build_session(proxy_url: Optional[str], pool_maxsize: int) -> requests.Session:
+    # Повторяем только ошибки соединения и 502/503/504 на GET: POST (ордера) не
+    # переотправляется, иначе можно открыть позицию дважды
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=0,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if proxy_url:
+        session.proxies = {"http": proxy_url, "https": proxy_url}
+    return session
+
+def get_session(account: Optional[Account] = None, proxy_url: Optional[str] = None) -> requests.Session:
+    """Сессия аккаунта через конкретный прокси (выбирает network.proxy_pool)."""
+    if account is None:
+        key = ("", proxy_url)
+        pool_maxsize = HTTP_PUBLIC_POOL_MAXSIZE
+    else:
+        key = (account.api_key, proxy_url)
+        pool_maxsize = HTTP_POOL_MAXSIZE
+
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _build_session(key[1], pool_maxsize)
+                _sessions[key] = session
+    return session
+
+def close_all():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -1,7 +1,35 @@
 import hmac
 import hashlib
+import threading
+from typing import Dict
 from urllib.parse import urlencode
 
+class Signer:
+    """HMAC-SHA256 с заранее подготовленным ключом; на запрос — только copy() + update()."""
+    __slots__ = ("_mac",)
+
+    def __init__(self, secret: str):
+        self._mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+    def sign_query(self, query: str) -> str:
+        mac = self._mac.copy()
+        mac.update(query.encode())
+        return mac.hexdigest()
+
+    def signed_query(self, params: dict) -> str:
+        """Строка запроса, собранная один раз и для подписи, и для тела/URL."""
+        query = urlencode(params, doseq=True)
+        return f"{query}&signature={self.sign_query(query)}"
+
+_signers: Dict[str, Signer] = {}
+_lock = threading.Lock()
+
+def get_signer(secret: str) -> Signer:
+    signer = _signers.get(secret)
+    if signer is None:
+        with _lock:
+            signer = _signers.setdefault(secret, Signer(secret))
+    return signer
+
 def sign(params: dict, secret: str) -> str:
-    query = urlencode(params, doseq=True)
-    return hmac.new(secret.encode(), query.encode(), hashlib.sha256).hexdigest()
\ No newline at end of file
+    return get_signer(secret).sign_query(urlencode(params, doseq=True))
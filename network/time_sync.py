@@ -0,0 +1,52 @@
+import threading
+
+from config.settings import TIME_SYNC_INTERVAL_S
+from network.client import public_get
+from utils.time_utils import now_ms, set_server_offset, server_offset_ms
+from utils.logger import logger
+
+def sync_clock() -> int:
+    """Оценивает смещение часов по /fapi/v1/time (середина RTT) и применяет его."""
+    t0 = now_ms()
+    server_time = int(public_get("/fapi/v1/time")["serverTime"])
+    t1 = now_ms()
+    offset = server_time - (t0 + t1) // 2
+    set_server_offset(offset)
+    return offset
+
+class ClockSync(threading.Thread):
+    def __init__(self, interval_s: float = TIME_SYNC_INTERVAL_S):
+        super().__init__(name="clock-sync", daemon=True)
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            try:
+                sync_clock()
+            except Exception as e:
+                logger.warning("[TIME] Clock sync failed: %s → %s", type(e).__name__, e)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout)
+
+clock_sync = None
+
+def start_clock_sync():
+    global clock_sync
+    try:
+        offset = sync_clock()
+        logger.info("[TIME] Server clock offset: %s ms", offset)
+    except Exception as e:
+        logger.warning("[TIME] Initial clock sync failed, using local clock (%s ms): %s", server_offset_ms(), e)
+    if clock_sync is None:
+        clock_sync = ClockSync()
+        clock_sync.start()
+
+def stop_clock_sync():
+    global clock_sync
+    if clock_sync is not None:
+        clock_sync.stop()
+        clock_sync = None
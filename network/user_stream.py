@@ -0,0 +1,84 @@
+import threading
+from typing import Dict, List, Optional
+
+from config.accounts import Account
+from config.settings import WS_BASE_URL, USER_STREAM_KEEPALIVE_S
+from network.client import api_key_request
+from network.proxy_pool import proxy_manager
+from network.ws_stream import WSStream
+from trading.order_state import order_states
+from utils.logger import logger
+
+LISTEN_KEY_PATH = "/fapi/v1/listenKey"
+
+class UserDataStream(WSStream):
+    """User-data stream аккаунта: listenKey, keepalive, переподключение.
+
+    События ORDER_TRADE_UPDATE попадают в `order_states`.
+    """
+
+    def __init__(self, account: Account, ws_base_url: str = WS_BASE_URL):
+        super().__init__(name=f"user-stream:{account.name}")
+        self.account = account
+        self.ws_base_url = ws_base_url.rstrip("/")
+        self.listen_key: Optional[str] = None
+        self._keepalive = threading.Thread(target=self._keepalive_loop, name=f"{self.name}:keepalive", daemon=True)
+
+    def start(self):
+        super().start()
+        self._keepalive.start()
+
+    def current_proxy_url(self) -> Optional[str]:
+        # При переподключении — лучший на данный момент прокси аккаунта
+        return proxy_manager.pick(self.account)
+
+    def build_url(self) -> str:
+        # POST возвращает действующий ключ или создаёт новый
+        self.listen_key = api_key_request("POST", LISTEN_KEY_PATH, self.account)["listenKey"]
+        return f"{self.ws_base_url}/ws/{self.listen_key}"
+
+    def handle(self, data: dict):
+        event = data.get("e")
+        if event == "ORDER_TRADE_UPDATE":
+            order_states.apply_update(self.account.api_key, data["o"])
+        elif event == "listenKeyExpired":
+            logger.warning("[WS] %s: listenKey expired, reconnecting", self.name)
+            self.reconnect()
+
+    def _keepalive_loop(self):
+        while not self._stop_event.wait(USER_STREAM_KEEPALIVE_S):
+            if not self.listen_key:
+                continue
+            try:
+                api_key_request("PUT", LISTEN_KEY_PATH, self.account)
+            except Exception as e:
+                logger.warning("[WS] %s: keepalive failed: %s → %s", self.name, type(e).__name__, e)
+                self.reconnect()
+
+    def stop(self):
+        super().stop()
+        if self.listen_key:
+            try:
+                api_key_request("DELETE", LISTEN_KEY_PATH, self.account)
+            except Exception:
+                pass
+
+# api_key → поток; wait_for_fill проверяет здоровье потока перед ожиданием события
+user_streams: Dict[str, UserDataStream] = {}
+
+def start_user_streams(accounts: List[Account]):
+    for acct in accounts:
+        if acct.api_key in user_streams:
+            continue
+        stream = UserDataStream(acct)
+        user_streams[acct.api_key] = stream
+        stream.start()
+
+def stop_user_streams():
+    for stream in user_streams.values():
+        stream.stop()
+    user_streams.clear()
+
+def stream_healthy(account: Account) -> bool:
+    stream = user_streams.get(account.api_key)
+    return bool(stream and stream.healthy)
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import websocket
+
+from config.settings import WS_PING_INTERVAL, WS_RECONNECT_DELAY, WS_MAX_RECONNECT_DELAY
+from utils.logger import logger
+
+class WSStream(threading.Thread):
+    """Фоновое WebSocket-подключение с переподключением и экспоненциальной задержкой.
+
+    Наследники задают `build_url()` и `handle(data)`; `healthy` — сокет открыт
+    и поток не остановлен.
+    """
+
+    def __init__(self, name: str, proxy: Optional[dict] = None):
+        super().__init__(name=name, daemon=True)
+        self.proxy_url = (proxy or {}).get("https") or (proxy or {}).get("http")
+        self._stop_event = threading.Event()
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._connected = False
+        self.last_message_at = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self._connected and not self._stop_event.is_set()
+
+    def build_url(self) -> str:
+        raise NotImplementedError
+
+    def handle(self, data: dict):
+        raise NotImplementedError
+
+    def on_disconnect(self):
+        pass
+
+    def current_proxy_url(self) -> Optional[str]:
+        """Прокси для очередного подключения; наследники могут выбирать его заново."""
+        return self.proxy_url
+
+    def _proxy_kwargs(self) -> dict:
+        proxy_url = self.current_proxy_url()
+        if not proxy_url:
+            return {}
+        p = urlsplit(proxy_url)
+        kwargs = {"proxy_type": "http", "http_proxy_host": p.hostname, "http_proxy_port": p.port}
+        if p.username:
+            kwargs["http_proxy_auth"] = (p.username, p.password or "")
+        return kwargs
+
+    def _on_open(self, ws):
+        self._connected = True
+        logger.info("[WS] %s: connected", self.name)
+
+    def _on_message(self, ws, message: str):
+        self.last_message_at = time.time()
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return
+        try:
+            self.handle(data)
+        except Exception as e:
+            logger.warning("[WS] %s: handler failed: %s → %s", self.name, type(e).__name__, e)
+
+    def _on_error(self, ws, error):
+        if not self._stop_event.is_set():
+            logger.warning("[WS] %s: %s → %s", self.name, type(error).__name__, error)
+
+    def run(self):
+        delay = WS_RECONNECT_DELAY
+        while not self._stop_event.is_set():
+            started = time.time()
+            try:
+                self._ws = websocket.WebSocketApp(
+                    self.build_url(),
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error
+                )
+                self._ws.run_forever(ping_interval=WS_PING_INTERVAL, ping_timeout=WS_PING_INTERVAL / 2,
+                                     **self._proxy_kwargs())
+            except Exception as e:
+                logger.warning("[WS] %s: connect failed: %s → %s", self.name, type(e).__name__, e)
+            finally:
+                self._connected = False
+                self.on_disconnect()
+
+            if self._stop_event.is_set():
+                break
+            # Сброс задержки, если соединение продержалось дольше минуты
+            if time.time() - started > 60:
+                delay = WS_RECONNECT_DELAY
+            logger.warning("[WS] %s: disconnected, reconnecting in %.1fs", self.name, delay)
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, WS_MAX_RECONNECT_DELAY)
+
+    def reconnect(self):
+        if self._ws:
+            self._ws.close()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._ws:
+            self._ws.close()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout)
@@ -0,0 +1,164 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config.accounts import Account
+from config.settings import ACCOUNT_ROTATION_JITTER, ACCOUNT_COOLDOWN_S, ACCOUNT_MAX_COOLDOWN_S
+from trading.ledger import margin_ledger, min_free_margin
+from utils.logger import logger
+
+class AccountRegistry:
+    """Индекс выбора аккаунтов для циклов: давно не торговавшие — первыми.
+
+    Каждый аккаунт в одном из состояний: в очереди, в цикле, на паузе после
+    ошибки (heap по окончанию паузы) или отложен: свободной маржи (acct.balance,
+    ведёт trading.ledger) не хватит на крупную ногу цикла; изменения баланса
+    приходят из учёта в `update_balance`. Очередь — heap по «номеру круга»: вернувшийся
+    аккаунт встаёт в конец со случайным сдвигом до ACCOUNT_ROTATION_JITTER круга,
+    поэтому объём распределяется поровну, а тройки не повторяются. Аккаунт,
+    взятый из очереди по плану (не с вершины heap), только снимается с учёта —
+    его запись в heap пропускается при извлечении, heap перестраивается, когда
+    таких записей больше живых. Выбор и возврат — O(log n) (амортизированно).
+    """
+
+    def __init__(self, accounts: Iterable[Account], busy: Iterable[Account] = ()):
+        """`busy` — аккаунты, уже занятые в цикле (восстановленном после перезапуска): в очередь они встанут по `release`."""
+        self.accounts: List[Account] = list(accounts)
+        self._seq = itertools.count()
+        self._ready: List[Tuple[float, int, Account]] = []
+        self._queued: Dict[Account, Tuple[float, int, Account]] = {}    # аккаунт → его живая запись в _ready
+        self._stale = 0
+        self._cooling: List[Tuple[float, int, Account]] = []
+        self._parked: Set[Account] = set()
+        self._lock = threading.Lock()
+        self._round = 0.0   # ключ последнего выданного аккаунта
+        self.min_balance = min_free_margin()
+        margin_ledger.subscribe(self.update_balance)
+        busy = set(busy)
+        for acct in self.accounts:
+            if acct not in busy:
+                self._push_ready(acct)
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def _push_ready(self, acct: Account):
+        key = self._round + 1 + random.uniform(0, ACCOUNT_ROTATION_JITTER)
+        self._push_entry((key, next(self._seq), acct))
+
+    def _push_entry(self, entry: Tuple[float, int, Account]):
+        heapq.heappush(self._ready, entry)
+        self._queued[entry[2]] = entry
+
+    def _pop_ready(self) -> Optional[Tuple[float, int, Account]]:
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            if self._queued.get(entry[2]) is entry:
+                del self._queued[entry[2]]
+                return entry
+            self._stale -= 1
+        return None
+
+    def _take(self, acct: Account) -> Optional[Tuple[float, int, Account]]:
+        """Снять аккаунт с очереди не с вершины heap; None — его в очереди нет."""
+        entry = self._queued.pop(acct, None)
+        if entry is not None:
+            self._stale += 1
+            if self._stale > len(self._queued):
+                self._ready = list(self._queued.values())
+                heapq.heapify(self._ready)
+                self._stale = 0
+        return entry
+
+    def _low_balance(self, acct: Account) -> bool:
+        return acct.balance is not None and acct.balance < self.min_balance
+
+    def _promote_cooled(self, now: float):
+        while self._cooling and self._cooling[0][0] <= now:
+            _, _, acct = heapq.heappop(self._cooling)
+            self._push_ready(acct)
+
+    def acquire(self, n: int) -> Optional[List[Account]]:
+        """n разных аккаунтов, дольше всех не торговавших; None — столько свободных нет."""
+        with self._lock:
+            self._promote_cooled(time.monotonic())
+            taken = []
+            while len(taken) < n and (entry := self._pop_ready()) is not None:
+                if self._low_balance(entry[2]):
+                    self._parked.add(entry[2])
+                    continue
+                taken.append(entry)
+            if len(taken) < n:
+                for entry in taken:
+                    self._push_entry(entry)
+                return None
+            self._round = max(self._round, taken[-1][0])
+            return [entry[2] for entry in taken]
+
+    def acquire_planned(self, planned: List[Account]) -> Optional[List[Account]]:
+        """Аккаунты цикла из дневного плана (trading.planner) в том же порядке; занятые,
+        на паузе или отложенные заменяются следующими по очереди. None — свободных не хватает."""
+        with self._lock:
+            self._promote_cooled(time.monotonic())
+            picked = {}
+            for acct in planned:
+                entry = self._take(acct)
+                if entry is None:
+                    continue
+                if self._low_balance(acct):
+                    self._parked.add(acct)
+                    continue
+                picked[acct] = entry
+            extra = []
+            while len(picked) + len(extra) < len(planned) and (entry := self._pop_ready()) is not None:
+                if self._low_balance(entry[2]):
+                    self._parked.add(entry[2])
+                    continue
+                extra.append(entry)
+            taken = list(picked.values()) + extra
+            if len(taken) < len(planned):
+                for entry in taken:
+                    self._push_entry(entry)
+                return None
+            self._round = max(self._round, max(e[0] for e in taken))
+            substitutes = iter(e[2] for e in extra)
+            return [acct if acct in picked else next(substitutes) for acct in planned]
+
+    def release(self, accounts: Iterable[Account], failed: Iterable[Account] = ()):
+        """Возврат после цикла; аккаунты из `failed` уходят на паузу (растёт с каждой ошибкой подряд)."""
+        failed = set(failed)
+        with self._lock:
+            now = time.monotonic()
+            for acct in accounts:
+                if acct in failed:
+                    acct.failures += 1
+                    pause = min(ACCOUNT_COOLDOWN_S * 2 ** (acct.failures - 1), ACCOUNT_MAX_COOLDOWN_S)
+                    acct.cooldown_until = now + pause
+                    heapq.heappush(self._cooling, (acct.cooldown_until, next(self._seq), acct))
+                    logger.warning("[ACCOUNTS] %s: cooling down for %.0fs after a failed leg", acct.name, pause)
+                else:
+                    acct.failures = 0
+                    self._push_ready(acct)
+
+    def update_balance(self, acct: Account, balance: Decimal):
+        """Новый доступный баланс; отложенный аккаунт возвращается в очередь, когда баланса снова хватает."""
+        with self._lock:
+            acct.balance = balance
+            if acct in self._parked and not self._low_balance(acct):
+                self._parked.discard(acct)
+                self._push_ready(acct)
+
+    def next_ready_in(self) -> Optional[float]:
+        """Сколько ждать до конца ближайшей паузы; None — на паузе никого."""
+        with self._lock:
+            if not self._cooling:
+                return None
+            return max(0.0, self._cooling[0][0] - time.monotonic())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ready": len(self._queued), "cooling": len(self._cooling), "parked": len(self._parked)}
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import List
+
+import requests
+
+from config.accounts import Account
+from config.settings import BOOTSTRAP_CONCURRENCY, MIN_AVAILABLE_BALANCE_USDT
+from network.client import async_public_get, async_private_get, async_private_post
+from trading.ledger import margin_ledger
+
+async def check_account(acct: Account, symbols: List[str], leverage: int, sem: asyncio.Semaphore) -> dict:
+    """Прокси, ключ, баланс и плечо одного аккаунта. Плечо ставится только если отличается."""
+    row = {
+        "account": acct,
+        "name": acct.name,
+        "proxy_ok": False,
+        "api_ok": False,
+        "balance": None,
+        "positions": {},
+        "leverage_ok": False,
+        "error": "",
+        "ready": False
+    }
+    async with sem:
+        try:
+            await async_public_get("/fapi/v1/ping", account=acct)
+            row["proxy_ok"] = True
+
+            balances = await async_private_get("/fapi/v2/balance", acct)
+            row["api_ok"] = True
+            usdt = next((b for b in balances if b.get("asset") == "USDT"), {})
+            row["balance"] = acct.balance = Decimal(str(usdt.get("availableBalance", "0")))
+
+            positions = await async_private_get("/fapi/v2/positionRisk", acct)
+            current = {p["symbol"]: int(p.get("leverage", 0)) for p in positions}
+            row["positions"] = {
+                p["symbol"]: Decimal(str(p.get("positionAmt", "0")))
+                for p in positions if Decimal(str(p.get("positionAmt", "0"))) != 0
+            }
+            margin_ledger.seed(acct, balances, positions)
+            for symbol in symbols:
+                if current.get(symbol) != leverage:
+                    await async_private_post("/fapi/v1/leverage", acct, {
+                        "symbol": symbol,
+                        "leverage": leverage,
+                        "recvWindow": 10000
+                    })
+                    margin_ledger.set_leverage(acct, symbol, leverage)
+            row["leverage_ok"] = True
+        except requests.RequestException as e:
+            row["error"] = f"{'proxy' if not row['proxy_ok'] else 'network'}: {type(e).__name__}"
+        except Exception as e:
+            row["error"] = str(e)[:120]
+
+    row["ready"] = (
+        row["proxy_ok"] and row["api_ok"] and row["leverage_ok"]
+        and row["balance"] is not None and row["balance"] >= MIN_AVAILABLE_BALANCE_USDT
+    )
+    if row["leverage_ok"] and not row["ready"] and not row["error"]:
+        row["error"] = f"balance {row['balance']} < {MIN_AVAILABLE_BALANCE_USDT} USDT"
+    return row
+
+async def _bootstrap(accounts: List[Account], symbols: List[str], leverage: int) -> List[dict]:
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BOOTSTRAP_CONCURRENCY))
+    sem = asyncio.Semaphore(BOOTSTRAP_CONCURRENCY)
+    return await asyncio.gather(*(check_account(acct, symbols, leverage, sem) for acct in accounts))
+
+def print_readiness(rows: List[dict]):
+    print(f"{'NAME':<20} {'PROXY':<28} {'API':<4} {'BALANCE':>12} {'LEV':<4} {'READY':<6} ERROR")
+    for r in rows:
+        balance = f"{r['balance']:.2f}" if r["balance"] is not None else "-"
+        proxy = f"{'ok' if r['proxy_ok'] else 'FAIL'} {r['account'].proxy_host}"
+        print(f"{r['name']:<20} {proxy:<28} {'ok' if r['api_ok'] else 'FAIL':<4} "
+              f"{balance:>12} {'ok' if r['leverage_ok'] else '-':<4} {'yes' if r['ready'] else 'NO':<6} {r['error']}")
+
+def bootstrap_accounts(accounts: List[Account], symbols: List[str], leverage: int) -> List[dict]:
+    """Параллельная проверка всех аккаунтов; возвращает таблицу готовности."""
+    rows = asyncio.run(_bootstrap(accounts, symbols, leverage))
+    print_readiness(rows)
+    return rows
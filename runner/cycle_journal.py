@@ -0,0 +1,266 @@
+"""Журнал циклов: append-only запись намерения, ордеров и времени закрытия ног.
+
+Процесс, упавший или остановленный посреди удержания, оставляет в журнале
+незавершённые циклы. При запуске `recover_cycles` читает журналы, параллельно
+запрашивает баланс и positionRisk только у аккаунтов этих циклов (ими же
+заполняется trading.ledger) и либо закрывает ноги сразу — не больше их объёма
+по журналу, — либо возвращает цикл планировщику для закрытия в срок.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from config.accounts import Account
+from config.settings import (
+    CYCLE_JOURNAL_DIR, CYCLE_JOURNAL_FSYNC, CYCLE_JOURNAL_MAX_BYTES, CYCLE_RESUME_MIN_HOLD_S, BOOTSTRAP_CONCURRENCY
+)
+from utils.logger import logger, log_context
+
+class CycleJournal:
+    """События цикла: start → open (на ногу) → hold → close (на ногу) → done.
+
+    Запись синхронная (flush после каждой строки), чтобы пережить падение процесса.
+    В памяти — только незавершённые циклы: когда файл разрастается, он
+    переписывается из них.
+    """
+
+    def __init__(self, directory: str = CYCLE_JOURNAL_DIR):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._file = None
+        self._active: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+
+    def start(self, process_tag: str = "bot", carry: List[dict] = ()):
+        """Открывает новый файл журнала процесса; `carry` — записи незавершённых циклов из прошлых журналов."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self.path = os.path.join(self.directory, f"cycles-{process_tag}.jsonl")
+            self._active = {}
+            for rec in carry:
+                self._active.setdefault(rec["cycle_id"], []).append(rec)
+            self._rewrite()
+
+    def _rewrite(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(rec) + "\n" for recs in self._active.values() for rec in recs))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, rec: dict):
+        if self._file is None:
+            return
+        line = json.dumps(rec) + "\n"
+        with self._lock:
+            if rec["ev"] == "done":
+                self._active.pop(rec["cycle_id"], None)
+            else:
+                self._active.setdefault(rec["cycle_id"], []).append(rec)
+            self._file.write(line)
+            self._file.flush()
+            if CYCLE_JOURNAL_FSYNC:
+                os.fsync(self._file.fileno())
+            if self._file.tell() > CYCLE_JOURNAL_MAX_BYTES:
+                self._rewrite()
+
+    def begin(self, plan: dict):
+        self._write({
+            "ev": "start", "cycle_id": plan["cycle_id"], "symbol": plan["symbol"], "ts": time.time(),
+            "hold_time": plan["hold_time"], "accounts": [a.name for a in plan["accounts"]]
+        })
+
+    def leg_opened(self, plan: dict, info: dict, order_id):
+        self._write({
+            "ev": "open", "cycle_id": plan["cycle_id"], "account": info["name"],
+            "side": info["open_side"], "qty": str(info["qty"]), "order_id": order_id
+        })
+
+    def hold(self, plan: dict):
+        self._write({"ev": "hold", "cycle_id": plan["cycle_id"], "close_at": plan["close_at"]})
+
+    def leg_closed(self, plan: dict, info: dict, order_id):
+        self._write({"ev": "close", "cycle_id": plan["cycle_id"], "account": info["name"], "order_id": order_id})
+
+    def finish(self, plan: dict):
+        self._write({"ev": "done", "cycle_id": plan["cycle_id"]})
+
+    def stop(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+cycle_journal = CycleJournal()
+
+# === Восстановление при запуске ===
+def _read_journals(directory: str) -> Tuple[List[str], Dict[str, List[dict]]]:
+    files = sorted(glob.glob(os.path.join(directory, "cycles-*.jsonl")))
+    cycles: Dict[str, List[dict]] = {}
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # недописанная строка на момент падения
+                if rec.get("ev") == "done":
+                    cycles.pop(rec["cycle_id"], None)
+                else:
+                    cycles.setdefault(rec["cycle_id"], []).append(rec)
+    # Цикл без start (хвост уже переписанного файла) восстановить нечем
+    return files, {cid: recs for cid, recs in cycles.items() if recs[0]["ev"] == "start"}
+
+def _fetch_positions(accounts: List[Account]) -> Dict[str, Optional[Dict[str, Decimal]]]:
+    """name → {symbol: positionAmt} (None — не удалось запросить). Заодно заполняет учёт маржи:
+    закрытия восстановления проходят его проверки и меняют его исполнениями."""
+    from network.client import private_get
+    from trading.ledger import margin_ledger
+
+    def fetch(acct: Account):
+        try:
+            positions = private_get("/fapi/v2/positionRisk", acct)
+            margin_ledger.seed(acct, private_get("/fapi/v2/balance", acct), positions)
+            return {p["symbol"]: Decimal(str(p.get("positionAmt", "0"))) for p in positions}
+        except Exception as e:
+            logger.error("[RECOVER] positionRisk failed for %s: %s → %s", acct.name, type(e).__name__, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BOOTSTRAP_CONCURRENCY, len(accounts)))) as pool:
+        return dict(zip((a.name for a in accounts), pool.map(fetch, accounts)))
+
+def _unrecorded_open(acct: Account, cycle_id: str, leg: int, symbol: str) -> Optional[Tuple[str, Decimal]]:
+    """Открытие ноги, которое не успело попасть в журнал: ордер ищется по client id попыток."""
+    from trading.core import client_order_id, find_order
+    from runner.cycle_runner import MAX_ATTEMPTS
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        order = find_order(acct, client_order_id(cycle_id, "o", leg, attempt), symbol)
+        if order and Decimal(str(order.get("executedQty") or "0")) > 0:
+            return order["side"], Decimal(str(order["executedQty"]))
+    return None
+
+def recover_cycles(accounts: List[Account], process_tag: str = "bot",
+                   resume: bool = True) -> List[Tuple[dict, List[dict]]]:
+    """Разбирает журналы прошлого запуска и открывает журнал этого процесса.
+
+    Незавершённые циклы с нетронутыми позициями и временем удержания в запасе
+    возвращаются как (plan, opens) — их закрывает планировщик в срок (`resume`).
+    Остальные закрываются сразу: нога — не больше объёма по журналу и фактической
+    позиции в её сторону. Позиция аккаунта по паре делится между циклами, так что
+    несколько циклов на ней не закроют больше, чем открыли, а чужая позиция не трогается.
+    """
+    from runner.cycle_runner import close_legs
+
+    started = time.perf_counter()
+    old_files, unfinished = _read_journals(cycle_journal.directory)
+    cycle_journal.start(process_tag, carry=[rec for recs in unfinished.values() for rec in recs])
+    for path in old_files:
+        if os.path.abspath(path) != os.path.abspath(cycle_journal.path):
+            os.remove(path)
+    if not unfinished:
+        return []
+
+    by_name = {a.name: a for a in accounts}
+    involved = {name for recs in unfinished.values() for name in recs[0]["accounts"]}
+    missing = involved - by_name.keys()
+    if missing:
+        logger.error("[RECOVER] Accounts from the journal are not configured: %s", ", ".join(sorted(missing)))
+    positions = _fetch_positions([by_name[n] for n in sorted(involved & by_name.keys())])
+    logger.warning("[RECOVER] %s unfinished cycles, %s accounts queried", len(unfinished), len(positions))
+
+    resumed, pending = [], []
+    # (аккаунт, пара) → фактическая позиция, ещё не отнесённая ни к одной ноге
+    unclaimed: Dict[Tuple[str, str], Decimal] = {}
+    now = time.time()
+    for cycle_id, recs in unfinished.items():
+        start = recs[0]
+        symbol = start["symbol"]
+        plan = {
+            "cycle_id": cycle_id,
+            "symbol": symbol,
+            "accounts": [by_name[n] for n in start["accounts"] if n in by_name],
+            "hold_time": start["hold_time"],
+            "close_at": next((r["close_at"] for r in recs if r["ev"] == "hold"), None)
+        }
+        opened = {r["account"]: r for r in recs if r["ev"] == "open"}
+        closed = {r["account"] for r in recs if r["ev"] == "close"}
+        if any(positions.get(n) is None for n in start["accounts"] if n in by_name):
+            logger.error("[RECOVER] %s: position state unknown, left in the journal", cycle_id)
+            continue
+
+        # Ожидаемая позиция по журналу против фактической
+        actual = {n: positions[n].get(symbol, Decimal("0")) for n in start["accounts"] if n in by_name}
+        expected = {
+            n: (Decimal(r["qty"]) if r["side"] == "BUY" else -Decimal(r["qty"])) if n in opened and n not in closed else Decimal("0")
+            for n, r in ((n, opened.get(n)) for n in actual)
+        }
+        intact = (len(opened) == len(start["accounts"]) and not closed and not missing.intersection(start["accounts"])
+                  and actual == expected)
+        if resume and intact and plan["close_at"] and plan["close_at"] - now > CYCLE_RESUME_MIN_HOLD_S:
+            opens = [{
+                "account": by_name[n], "leg": i, "qty": Decimal(r["qty"]), "open_side": r["side"],
+                "name": n, "notional": Decimal("0"), "fill_ms": None
+            } for i, (n, r) in enumerate(opened.items(), start=1)]
+            resumed.append((plan, opens))
+            for info in opens:
+                amt = info["qty"] if info["open_side"] == "BUY" else -info["qty"]
+                unclaimed[(info["name"], symbol)] = unclaimed.get((info["name"], symbol), actual[info["name"]]) - amt
+            logger.info("[RECOVER] %s: resuming %s, close in %.0fs", cycle_id, symbol, plan["close_at"] - now)
+            continue
+
+        # Ноги по журналу; открытие, не дошедшее до журнала, ищется на бирже
+        legs = []
+        try:
+            for i, n in enumerate(start["accounts"], start=1):
+                if n not in by_name or n in closed:
+                    continue
+                if n in opened:
+                    legs.append((i, n, opened[n]["side"], Decimal(opened[n]["qty"])))
+                elif actual[n] != 0 and (found := _unrecorded_open(by_name[n], cycle_id, i, symbol)):
+                    legs.append((i, n, *found))
+        except Exception as e:
+            logger.error("[RECOVER] %s: order lookup failed (%s → %s), left in the journal", cycle_id, type(e).__name__, e)
+            continue
+        pending.append((plan, legs, actual))
+
+    to_close = []
+    for plan, legs, actual in pending:
+        symbol = plan["symbol"]
+        opens = []
+        for i, n, side, qty in legs:
+            left = unclaimed.get((n, symbol), actual[n])
+            if left == 0 or (left > 0) != (side == "BUY"):
+                logger.warning("[RECOVER] %s: %s %s leg of %s %s — position is %s, skipped",
+                               plan["cycle_id"], n, side, qty, symbol, left)
+                continue
+            qty = min(qty, abs(left))
+            unclaimed[(n, symbol)] = left - (qty if side == "BUY" else -qty)
+            opens.append({
+                "account": by_name[n], "leg": i, "qty": qty, "open_side": side,
+                "name": n, "notional": Decimal("0"), "fill_ms": None
+            })
+        # Свой префикс client id: закрытие прошлого процесса с тем же id могло исполниться частично
+        plan["close_tag"] = "r"
+        to_close.append((plan, opens))
+
+    def close_now(item):
+        plan, opens = item
+        with log_context(cycle_id=plan["cycle_id"]):
+            logger.warning("[RECOVER] %s: closing %s open legs on %s", plan["cycle_id"], len(opens), plan["symbol"])
+        close_legs(plan, opens)
+
+    if to_close:
+        with ThreadPoolExecutor(max_workers=min(8, len(to_close))) as pool:
+            list(pool.map(close_now, to_close))
+    logger.info("[RECOVER] Done in %.1fs: %s closed, %s resumed", time.perf_counter() - started, len(to_close), len(resumed))
+    return resumed
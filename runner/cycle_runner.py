@@ -1,131 +1,334 @@
+import logging
 import time
 import random
-from typing import List, Dict
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Callable
 
-from config.settings import SYMBOLS, BASE_NOTIONAL_USDT, DEFAULT_LEVERAGE
+import requests
+
+from config.accounts import Account
+from config.settings import SYMBOLS, BASE_NOTIONAL_USDT, TOTAL_QTY_JITTER, DEFAULT_LEVERAGE, BETWEEN_CYCLES_RANGE
 from trading.core import (
-    choose_total_qty, sample_legs, random_hold_time, random_between_pause,
-    adjust_qty, format_float, place_market_order, wait_for_fill, get_mark_price
+    choose_total_qty, sample_legs, fit_legs, legs_notional_limit, random_hold_time, random_between_pause,
+    adjust_qty, format_float, submit_order, client_order_id, wait_for_fill, get_mark_price
+)
+from network.client import ApiError
+from trading.order_state import FINAL_STATUSES
+from trading.ledger import margin_ledger
+from trading.planner import day_planner
+from network.proxy_pool import proxy_manager, proxy_host
+from runner.account_registry import AccountRegistry
+from runner.cycle_journal import cycle_journal
+from utils.stats_journal import stats_journal
+from utils.logger import logger, log_context
+from utils.time_utils import now_ms
+from utils.metrics import (
+    ORDER_RETRIES, CYCLE_PHASE_SECONDS, TIME_TO_NEUTRAL_SECONDS, CYCLES_TOTAL, OPEN_NOTIONAL, PRETRADE_REJECTS
 )
-from utils.stats_excel import update_stats_excel
-from utils.logger import logger
 
 MAX_ATTEMPTS = 5
 MIN_NOTIONAL = 5
+# 429/418 обрабатывает лимитер в клиенте, здесь — только пауза между попытками
+RETRY_BACKOFF_S = 0.5
+# Отказы, которые повтор не исправит: не хватает маржи, reduceOnly нечего сокращать
+REJECTED_CODES = {-2019, -2022}
 
-def run_cycle(accounts: List[Dict[str, str]], symbol: str):
-    chosen = random.sample(accounts, 3)
-    random.shuffle(chosen)
+def error_code(e: Exception) -> str:
+    return str(getattr(e, "code", None) or type(e).__name__)
+
+def rejected(e: Exception) -> bool:
+    return isinstance(e, ApiError) and e.code in REJECTED_CODES
+
+def is_filled(order: Optional[dict]) -> bool:
+    return bool(order) and (order.get("status") or "").upper() == "FILLED"
+
+def outcome_unknown(e: Exception, status: Optional[str]) -> bool:
+    """Мог ли ордер неудачной попытки остаться на бирже: тогда следующая попытка
+    сначала ищет его по тому же client id, иначе — новый id."""
+    if status:
+        return status.upper() not in FINAL_STATUSES
+    if isinstance(e, ApiError):
+        return e.status >= 500     # 5xx: биржа не знает, исполнен ли запрос
+    return isinstance(e, requests.RequestException)
+
+def fill_time_ms(order: dict) -> int:
+    return int(order.get("updateTime") or now_ms())
+
+def leg_skew_ms(fill_times: List[Optional[int]]) -> Optional[int]:
+    """Time-to-neutral: разница между первым и последним исполнением ног."""
+    times = [t for t in fill_times if t]
+    if len(times) < 2:
+        return None
+    return max(times) - min(times)
+
+def report_skew(symbol: str, phase: str, skew_ms: Optional[int], filled: int, total: int):
+    if skew_ms is None:
+        if filled:
+            logger.warning("[NEUTRAL] %s %s: only %s/%s legs filled — book is not hedged", symbol, phase, filled, total)
+        return
+    TIME_TO_NEUTRAL_SECONDS.observe(skew_ms / 1000, phase=phase, symbol=symbol)
+    logger.info("[NEUTRAL] %s %s: time-to-neutral %s ms (%s/%s legs)", symbol, phase, skew_ms, filled, total)
+
+def failed_accounts(chosen: List[Account], opens: List[dict], fills: List[Optional[int]]) -> List[Account]:
+    """Аккаунты, у которых не открылась или не закрылась нога, — им пауза в ротации."""
+    opened = [info["account"] for info in opens]
+    return [a for a in chosen if a not in opened] + [info["account"] for info, fill in zip(opens, fills) if fill is None]
+
+def run_legs_parallel(fn: Callable, items: List[tuple]) -> list:
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(lambda args: fn(*args), items))
 
+def prepare_cycle(chosen: List[Account], symbol: str, planned: Optional[dict] = None) -> dict:
+    """`planned` — цикл из дневного плана (trading.planner): объём, доли ног и удержание берутся из него."""
     mark_price = get_mark_price(symbol)
-    total_qty = choose_total_qty(mark_price, DEFAULT_LEVERAGE)
-    legs = sample_legs()
-    hold_time = random_hold_time()
-
-    ts = time.strftime('%Y-%m-%d %H:%M:%S')
-    roles_text = ", ".join([f"{int(round(float(x['share']) * 100))}% {x['side']}" for x in legs])
-
-    logger.info("=" * 70)
-    logger.info(f"[CYCLE START] {ts}")
-    logger.info(f"[SETUP] Symbol: {symbol} | Mark: {format_float(mark_price)}")
-    logger.info(f"[SETUP] Leverage: {DEFAULT_LEVERAGE}x")
-    logger.info(f"[SETUP] Target notional: {BASE_NOTIONAL_USDT} USDT → Qty: {format_float(total_qty)} {symbol}")
-    logger.info(f"[SETUP] Legs: {roles_text} | Hold: {hold_time}s")
-    logger.info("=" * 70)
-
-    opens = []
-    for idx, (acct, leg) in enumerate(zip(chosen, legs), start=1):
-        name = acct.get("name", f"#{idx}")
-        raw_qty = total_qty * leg["share"]
-        adj_qty = adjust_qty(raw_qty, symbol)
-        side = leg["side"]
-        notional = adj_qty * mark_price
-        proxy_host = acct['proxy']['http'].split('@')[-1]
-
-        logger.info(f"[ORDER OPEN] {name}")
-        logger.info(f"  Proxy: {proxy_host}")
-        logger.info(f"  Action: {side}")
-        logger.info(f"  Raw Qty: {format_float(raw_qty)} → Adjusted: {format_float(adj_qty)} {symbol}")
-        logger.info(f"  Notional: {format_float(notional)} USDT")
-
-        if notional < MIN_NOTIONAL:
-            logger.error(f"[SKIP] Notional {format_float(notional)} < {MIN_NOTIONAL} USDT — skipping order")
-            continue
-
-        for attempt in range(1, MAX_ATTEMPTS + 1):
-            try:
-                resp = place_market_order(acct, side, adj_qty, symbol=symbol)
-                order_id = resp.get("orderId")
-
-                try:
-                    filled = wait_for_fill(acct, order_id, symbol=symbol)
-                    if not filled or filled.get("status", "").upper() != "FILLED":
-                        raise RuntimeError("Order not filled or response empty")
-                except Exception as e:
-                    raise RuntimeError(f"wait_for_fill failed: {type(e).__name__} → {e}")
-
-                try:
-                    update_stats_excel(name, symbol, adj_qty, side, mark_price)
-                except Exception as e:
-                    logger.warning(f"[WARN] Stats update failed for {name}: {type(e).__name__} → {e}")
-
-                logger.success(f"  → Order placed: orderId={order_id}, status=FILLED")
-                opens.append({
-                    "account": acct,
-                    "qty": adj_qty,
-                    "open_side": side,
-                    "name": name
-                })
-                break
+    # Ноги и объём — под свободную маржу аккаунтов из локального учёта
+    budgets = [margin_ledger.max_notional(acct, DEFAULT_LEVERAGE) for acct in chosen]
+    if planned is None:
+        legs = fit_legs(sample_legs(), budgets, BASE_NOTIONAL_USDT * DEFAULT_LEVERAGE * (1 + TOTAL_QTY_JITTER))
+        limit = legs_notional_limit(legs, budgets)
+        total_qty = choose_total_qty(mark_price, DEFAULT_LEVERAGE, limit)
+        hold_time = random_hold_time()
+    else:
+        legs = fit_legs(planned["legs"], budgets, planned["notional"])
+        limit = legs_notional_limit(legs, budgets)
+        notional = min(planned["notional"], limit) if limit is not None else planned["notional"]
+        total_qty = notional / mark_price
+        hold_time = planned["hold_time"]
+
+    cycle_id = uuid.uuid4().hex[:12]
+    if limit is not None and total_qty * mark_price >= limit:
+        logger.warning("[LEDGER] %s: cycle size capped at %s USDT by free margin of %s", symbol, format_float(limit),
+                       ", ".join(a.name for a in chosen), extra={"cycle_id": cycle_id})
+
+    if logger.isEnabledFor(logging.INFO):
+        ts = time.strftime('%Y-%m-%d %H:%M:%S')
+        roles_text = ", ".join([f"{int(round(float(x['share']) * 100))}% {x['side']}" for x in legs])
+        with log_context(cycle_id=cycle_id, symbol=symbol):
+            logger.info("=" * 70)
+            logger.info("[CYCLE START] %s | id=%s", ts, cycle_id)
+            logger.info("[SETUP] Symbol: %s | Mark: %s", symbol, format_float(mark_price))
+            logger.info("[SETUP] Leverage: %sx", DEFAULT_LEVERAGE)
+            logger.info("[SETUP] Target notional: %s USDT → Qty: %s %s", BASE_NOTIONAL_USDT, format_float(total_qty), symbol)
+            logger.info("[SETUP] Legs: %s | Hold: %ss", roles_text, hold_time)
+            logger.info("=" * 70)
+
+    return {
+        "cycle_id": cycle_id,
+        "symbol": symbol,
+        "accounts": chosen,
+        "mark_price": mark_price,
+        "total_qty": total_qty,
+        "legs": legs,
+        "hold_time": hold_time
+    }
+
+def open_leg(plan: dict, idx: int, acct: Account, leg: dict) -> Optional[dict]:
+    with log_context(cycle_id=plan["cycle_id"], account=acct.name, symbol=plan["symbol"]):
+        return _open_leg(plan, idx, acct, leg)
+
+def _open_leg(plan: dict, idx: int, acct: Account, leg: dict) -> Optional[dict]:
+    symbol = plan["symbol"]
+    mark_price = plan["mark_price"]
+    name = acct.name
+    raw_qty = plan["total_qty"] * leg["share"]
+    adj_qty = adjust_qty(raw_qty, symbol)
+    side = leg["side"]
+    notional = adj_qty * mark_price
+    proxy = proxy_host(proxy_manager.pick(acct))
 
+    logger.info("[ORDER OPEN] %s", name)
+    logger.info("  Proxy: %s", proxy)
+    logger.info("  Action: %s", side)
+    logger.info("  Raw Qty: %s → Adjusted: %s %s", format_float(raw_qty), format_float(adj_qty), symbol)
+    logger.info("  Notional: %s USDT", format_float(notional))
+
+    if notional < MIN_NOTIONAL:
+        logger.error("[SKIP] Notional %s < %s USDT — skipping order", format_float(notional), MIN_NOTIONAL)
+        return None
+    reason = margin_ledger.check_open(acct, symbol, adj_qty, mark_price, DEFAULT_LEVERAGE)
+    if reason:
+        PRETRADE_REJECTS.inc(phase="open")
+        logger.error("[LEDGER] Not sending open order: %s", reason)
+        return None
+
+    client_oid = client_order_id(plan["cycle_id"], "o", idx)
+    lookup = False
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        status = None
+        try:
+            resp = submit_order(acct, side, adj_qty, client_oid, symbol=symbol, lookup=lookup)
+            order_id = resp.get("orderId")
+            status = resp.get("status")
+
+            try:
+                filled = resp if is_filled(resp) else wait_for_fill(acct, order_id, symbol=symbol)
+                status = (filled or {}).get("status") or status
+                if not is_filled(filled):
+                    raise RuntimeError("Order not filled or response empty")
             except Exception as e:
-                logger.error(f"[ERROR] Attempt {attempt}/{MAX_ATTEMPTS} failed to place open order")
-                logger.error(f"  Name: {name} | Proxy: {proxy_host}")
-                logger.error(f"  Reason: {type(e).__name__} → {e}")
-                time.sleep(1.5 * attempt)
-        else:
-            logger.error(f"[ERROR] Giving up after {MAX_ATTEMPTS} failed attempts for {name}")
-
-    logger.info(f"[HOLD] Holding positions for {hold_time}s...")
-    time.sleep(hold_time)
-
-    for info in opens:
-        acct = info["account"]
-        name = info.get("name", "???")
-        qty = info["qty"]
-        open_side = info["open_side"]
-        close_side = "SELL" if open_side == "BUY" else "BUY"
-
-        logger.info(f"[ORDER CLOSE] {name} | Action: {close_side} {format_float(qty)} {symbol} (reduceOnly)")
-
-        for attempt in range(1, MAX_ATTEMPTS + 1):
+                raise RuntimeError(f"wait_for_fill failed: {type(e).__name__} → {e}")
+
             try:
-                resp = place_market_order(acct, close_side, qty, reduce_only=True, symbol=symbol)
-                order_id = resp.get("orderId")
+                stats_journal.record_fill(name, symbol, side, filled, mark_price, plan["cycle_id"], "open")
+            except Exception as e:
+                logger.warning("[WARN] Stats update failed for %s: %s → %s", name, type(e).__name__, e)
+            margin_ledger.apply_fill(acct, symbol, side, filled)
+            day_planner.record_fill(name, filled)
+
+            logger.success("  → Order placed: orderId=%s, status=FILLED", order_id, extra={"order_id": order_id})
+            OPEN_NOTIONAL.inc(float(notional), symbol=symbol, side=side)
+            info = {
+                "account": acct,
+                "leg": idx,
+                "qty": adj_qty,
+                "open_side": side,
+                "name": name,
+                "notional": notional,
+                "fill_ms": fill_time_ms(filled)
+            }
+            cycle_journal.leg_opened(plan, info, order_id)
+            return info
+
+        except Exception as e:
+            ORDER_RETRIES.inc(phase="open", code=error_code(e))
+            if rejected(e):
+                logger.error("[ERROR] Open order rejected for %s: %s → %s, not retrying", name, type(e).__name__, e)
+                margin_ledger.reconcile(acct)
+                return None
+            lookup = outcome_unknown(e, status)
+            if not lookup:
+                client_oid = client_order_id(plan["cycle_id"], "o", idx, attempt + 1)
+            logger.error("[ERROR] Attempt %s/%s failed to place open order", attempt, MAX_ATTEMPTS)
+            logger.error("  Name: %s | Proxy: %s", name, proxy)
+            logger.error("  Reason: %s → %s", type(e).__name__, e)
+            time.sleep(RETRY_BACKOFF_S * attempt)
+
+    logger.error("[ERROR] Giving up after %s failed attempts for %s", MAX_ATTEMPTS, name)
+    return None
+
+def open_legs(plan: dict) -> List[dict]:
+    started = time.perf_counter()
+    cycle_journal.begin(plan)
+    items = [(plan, idx, acct, leg) for idx, (acct, leg) in enumerate(zip(plan["accounts"], plan["legs"]), start=1)]
+    opens = [info for info in run_legs_parallel(open_leg, items) if info]
+    CYCLE_PHASE_SECONDS.observe(time.perf_counter() - started, phase="open", symbol=plan["symbol"])
+    # Удержание отсчитывается от конца открытия — после перезапуска цикл закроется в тот же срок
+    plan["close_at"] = time.time() + plan["hold_time"]
+    cycle_journal.hold(plan)
+
+    plan["open_skew_ms"] = leg_skew_ms([info["fill_ms"] for info in opens])
+    with log_context(cycle_id=plan["cycle_id"]):
+        report_skew(plan["symbol"], "open", plan["open_skew_ms"], len(opens), len(items))
+    return opens
 
-                try:
-                    filled = wait_for_fill(acct, order_id, symbol=symbol)
-                    if not filled or filled.get("status", "").upper() != "FILLED":
-                        raise RuntimeError("Order not filled or response empty")
-                except Exception as e:
-                    raise RuntimeError(f"wait_for_fill failed: {type(e).__name__} → {e}")
+def close_leg(plan: dict, info: dict) -> Optional[int]:
+    with log_context(cycle_id=plan["cycle_id"], account=info["name"], symbol=plan["symbol"]):
+        return _close_leg(plan, info)
 
-                try:
-                    update_stats_excel(name, symbol, qty, close_side, mark_price)
-                except Exception as e:
-                    logger.warning(f"[WARN] Stats update failed for {name}: {type(e).__name__} → {e}")
+def _close_leg(plan: dict, info: dict) -> Optional[int]:
+    symbol = plan["symbol"]
+    acct = info["account"]
+    name = info["name"]
+    qty = info["qty"]
+    open_side = info["open_side"]
+    close_side = "SELL" if open_side == "BUY" else "BUY"
 
-                logger.success(f"  → Close placed: orderId={order_id}, status=FILLED")
-                break
+    logger.info("[ORDER CLOSE] %s | Action: %s %s %s (reduceOnly)", name, close_side, format_float(qty), symbol)
+    reason = margin_ledger.check_reduce(acct, symbol, close_side, qty)
+    if reason:
+        PRETRADE_REJECTS.inc(phase="close")
+        logger.error("[LEDGER] Not sending close order: %s", reason)
+        return None
 
+    client_oid = client_order_id(plan["cycle_id"], plan.get("close_tag", "c"), info["leg"])
+    lookup = False
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        status = None
+        try:
+            resp = submit_order(acct, close_side, qty, client_oid, reduce_only=True, symbol=symbol, lookup=lookup)
+            order_id = resp.get("orderId")
+            status = resp.get("status")
+
+            try:
+                filled = resp if is_filled(resp) else wait_for_fill(acct, order_id, symbol=symbol)
+                status = (filled or {}).get("status") or status
+                if not is_filled(filled):
+                    raise RuntimeError("Order not filled or response empty")
+            except Exception as e:
+                raise RuntimeError(f"wait_for_fill failed: {type(e).__name__} → {e}")
+
+            try:
+                stats_journal.record_fill(name, symbol, close_side, filled, get_mark_price(symbol), plan["cycle_id"], "close")
             except Exception as e:
-                logger.error(f"[ERROR] Attempt {attempt}/{MAX_ATTEMPTS} failed to place close order")
-                logger.error(f"  Name: {name}")
-                logger.error(f"  Reason: {type(e).__name__} → {e}")
-                time.sleep(1.5 * attempt)
-        else:
-            logger.error(f"[ERROR] Giving up after {MAX_ATTEMPTS} failed close attempts for {name}")
+                logger.warning("[WARN] Stats update failed for %s: %s → %s", name, type(e).__name__, e)
+            margin_ledger.apply_fill(acct, symbol, close_side, filled)
+            day_planner.record_fill(name, filled)
+
+            logger.success("  → Close placed: orderId=%s, status=FILLED", order_id, extra={"order_id": order_id})
+            OPEN_NOTIONAL.inc(-float(info["notional"]), symbol=symbol, side=open_side)
+            cycle_journal.leg_closed(plan, info, order_id)
+            return fill_time_ms(filled)
+
+        except Exception as e:
+            ORDER_RETRIES.inc(phase="close", code=error_code(e))
+            if rejected(e):
+                logger.error("[ERROR] Close order rejected for %s: %s → %s, not retrying", name, type(e).__name__, e)
+                margin_ledger.reconcile(acct)
+                return None
+            lookup = outcome_unknown(e, status)
+            if not lookup:
+                client_oid = client_order_id(plan["cycle_id"], plan.get("close_tag", "c"), info["leg"], attempt + 1)
+            logger.error("[ERROR] Attempt %s/%s failed to place close order", attempt, MAX_ATTEMPTS)
+            logger.error("  Name: %s", name)
+            logger.error("  Reason: %s → %s", type(e).__name__, e)
+            time.sleep(RETRY_BACKOFF_S * attempt)
+
+    logger.error("[ERROR] Giving up after %s failed close attempts for %s", MAX_ATTEMPTS, name)
+    return None
+
+def close_legs(plan: dict, opens: List[dict]) -> List[Optional[int]]:
+    started = time.perf_counter()
+    fills = run_legs_parallel(close_leg, [(plan, info) for info in opens])
+    CYCLE_PHASE_SECONDS.observe(time.perf_counter() - started, phase="close", symbol=plan["symbol"])
+    if all(t is not None for t in fills):
+        cycle_journal.finish(plan)
+    else:
+        logger.error("[JOURNAL] %s: not all legs closed, the cycle stays in the journal for the next start", plan["cycle_id"])
+
+    plan["close_skew_ms"] = leg_skew_ms(fills)
+    with log_context(cycle_id=plan["cycle_id"]):
+        report_skew(plan["symbol"], "close", plan["close_skew_ms"], len([t for t in fills if t]), len(opens))
+    return fills
+
+def run_cycle(registry: AccountRegistry, symbol: str):
+    chosen = registry.acquire(3)
+    if chosen is None:
+        wait = registry.next_ready_in() or max(BETWEEN_CYCLES_RANGE)
+        logger.warning("[ACCOUNTS] Not enough available accounts (%s), waiting %.0fs", registry.stats(), wait)
+        time.sleep(wait)
+        return
+    random.shuffle(chosen)
+
+    failed = []
+    try:
+        plan = prepare_cycle(chosen, symbol)
+        opens = open_legs(plan)
+
+        hold_time = plan["hold_time"]
+        logger.info("[HOLD] Holding positions for %ss...", hold_time, extra={"cycle_id": plan["cycle_id"]})
+        time.sleep(hold_time)
+        CYCLE_PHASE_SECONDS.observe(hold_time, phase="hold", symbol=symbol)
+
+        fills = close_legs(plan, opens)
+        failed = failed_accounts(chosen, opens, fills)
+        CYCLES_TOTAL.inc(symbol=symbol)
+    finally:
+        registry.release(chosen, failed)
 
     pause = random_between_pause()
-    logger.info(f"[PAUSE] Cycle complete. Sleeping {pause}s before next cycle...")
+    logger.info("[PAUSE] Cycle complete. Sleeping %ss before next cycle...", pause)
     time.sleep(pause)
+    CYCLE_PHASE_SECONDS.observe(pause, phase="pause", symbol=symbol)
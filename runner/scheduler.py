@@ -0,0 +1,179 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from config.accounts import Account
+from config.settings import MAX_CONCURRENT_CYCLES, MAX_CYCLES_PER_SYMBOL, PLANNER_ENABLED
+from runner.account_registry import AccountRegistry
+from runner.cycle_runner import prepare_cycle, open_legs, close_legs, failed_accounts
+from trading.core import random_between_pause
+from trading.planner import day_planner
+from utils.logger import logger
+from utils.metrics import CYCLE_PHASE_SECONDS, CYCLES_TOTAL
+
+LEGS_PER_CYCLE = 3
+
+class CycleScheduler:
+    """Держит несколько циклов одновременно на непересекающихся тройках аккаунтов.
+
+    Аккаунт принадлежит максимум одному активному циклу (выдаёт AccountRegistry —
+    давно не торговавшие первыми), число циклов на пару ограничено `per_symbol`. Удержание и пауза — таймеры event loop, сетевые
+    вызовы уходят в пул потоков через `asyncio.to_thread`. С PLANNER_ENABLED циклы берутся
+    из дневного плана (trading.planner) по времени старта, без случайных пауз; пересчёт
+    плана тоже уходит в поток, вне `_cond`.
+    """
+
+    def __init__(self, registry: AccountRegistry, symbols: List[str],
+                 max_cycles: int = MAX_CONCURRENT_CYCLES, per_symbol: int = MAX_CYCLES_PER_SYMBOL,
+                 resume: Sequence[Tuple[dict, List[dict]]] = ()):
+        self.symbols = list(symbols)
+        self.per_symbol = per_symbol
+        self.slots = max(1, min(max_cycles, len(registry) // LEGS_PER_CYCLE))
+        self.registry = registry
+        self.resume = list(resume)      # (plan, opens) из runner.cycle_journal.recover_cycles
+        self._active = {s: 0 for s in self.symbols}
+        self._cond: Optional[asyncio.Condition] = None
+        self.planner = day_planner if PLANNER_ENABLED else None
+        self._replanning = False
+
+    async def _maybe_replan(self):
+        """Пересчёт плана (NumPy, до сотен мс) — в пуле потоков, один за раз; циклы тем временем идут по старому."""
+        now = time.time()
+        if self._replanning or not self.planner.replan_due(now):
+            return
+        self._replanning = True
+        try:
+            await asyncio.to_thread(self.planner.replan, now)
+        finally:
+            self._replanning = False
+
+    def _next_planned(self) -> Tuple[Optional[dict], Optional[float]]:
+        """Очередной цикл плана на паре ниже лимита, если пора; иначе — сколько ждать.
+
+        Циклы пар, упёршихся в `per_symbol`, откладываются до `_release` (notify), не задерживая остальные.
+        """
+        now = time.time()
+        # Ожидание — не дольше, чем до очередного пересчёта плана
+        replan_in = self.planner.next_replan_in(now)
+        busy = {s for s, n in self._active.items() if n >= self.per_symbol}
+        planned = self.planner.peek(busy)
+        if planned is None:
+            return None, replan_in
+        if planned["start"] > now:
+            return None, min(planned["start"] - now, replan_in)
+        chosen = self.registry.acquire_planned(planned["accounts"])
+        if chosen is None:
+            ready_in = self.registry.next_ready_in()
+            return None, replan_in if ready_in is None else min(ready_in, replan_in)
+        self.planner.pop(planned)
+        planned["accounts"] = chosen
+        return planned, None
+
+    async def _lease(self) -> Tuple[str, List[Account], Optional[dict]]:
+        while True:
+            if self.planner is not None:
+                await self._maybe_replan()
+            async with self._cond:
+                if self.planner is not None:
+                    planned, wait = self._next_planned()
+                    if planned is not None:
+                        self._active[planned["symbol"]] += 1
+                        return planned["symbol"], planned["accounts"], planned
+                else:
+                    free = [s for s in self.symbols if self._active[s] < self.per_symbol]
+                    chosen = self.registry.acquire(LEGS_PER_CYCLE) if free else None
+                    if chosen:
+                        symbol = random.choice(free)
+                        self._active[symbol] += 1
+                        return symbol, chosen, None
+                    # Аккаунты на паузе после ошибки возвращаются по таймеру, без notify
+                    wait = self.registry.next_ready_in()
+                try:
+                    await asyncio.wait_for(self._cond.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, symbol: str, chosen: List[Account], failed: List[Account]):
+        async with self._cond:
+            self.registry.release(chosen, failed)
+            self._active[symbol] -= 1
+            self._cond.notify_all()
+
+    async def _run_one(self, symbol: str, chosen: List[Account], planned: Optional[dict] = None) -> List[Account]:
+        """Один цикл; возвращает аккаунты с неудачной ногой."""
+        plan = await asyncio.to_thread(prepare_cycle, chosen, symbol, planned)
+        opening = asyncio.ensure_future(asyncio.to_thread(open_legs, plan))
+        try:
+            await asyncio.shield(opening)
+            hold_time = plan["hold_time"]
+            logger.info("[HOLD] %s: holding positions for %ss...", symbol, hold_time, extra={"cycle_id": plan["cycle_id"]})
+            await asyncio.sleep(hold_time)
+            CYCLE_PHASE_SECONDS.observe(hold_time, phase="hold", symbol=symbol)
+        finally:
+            # При отмене (Ctrl+C) дожидаемся открытия и закрываем всё, что успело открыться
+            opens = await opening
+            fills = await asyncio.to_thread(close_legs, plan, opens)
+        CYCLES_TOTAL.inc(symbol=symbol)
+        return failed_accounts(chosen, opens, fills)
+
+    async def _resume_one(self, plan: dict, opens: List[dict]):
+        """Цикл, восстановленный из журнала: досиживает удержание и закрывается в срок."""
+        symbol = plan["symbol"]
+        chosen = plan["accounts"]
+        failed = chosen
+        try:
+            delay = max(0.0, plan["close_at"] - time.time())
+            logger.info("[HOLD] %s: resumed cycle, closing in %.0fs", symbol, delay, extra={"cycle_id": plan["cycle_id"]})
+            await asyncio.sleep(delay)
+        finally:
+            try:
+                fills = await asyncio.to_thread(close_legs, plan, opens)
+                failed = failed_accounts(chosen, opens, fills)
+            finally:
+                await self._release(symbol, chosen, failed)
+
+    async def _worker(self, slot: int):
+        while True:
+            symbol, chosen, planned = await self._lease()
+            failed = []
+            try:
+                failed = await self._run_one(symbol, chosen, planned)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("[SCHEDULER] Slot %s cycle on %s failed: %s → %s", slot, symbol, type(e).__name__, e)
+            finally:
+                await self._release(symbol, chosen, failed)
+
+            if self.planner is not None:
+                continue    # следующий старт — по плану
+            pause = random_between_pause()
+            logger.info("[PAUSE] Slot %s: cycle complete. Next cycle in %ss", slot, pause)
+            await asyncio.sleep(pause)
+            CYCLE_PHASE_SECONDS.observe(pause, phase="pause", symbol=symbol)
+
+    async def run(self):
+        self._cond = asyncio.Condition()
+        # Стандартный executor (cpu + 4 потоков) ограничил бы число циклов в фазе открытия/закрытия
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.slots * 2 + 4))
+        logger.info("[SCHEDULER] %s concurrent cycles, up to %s per symbol", self.slots, self.per_symbol)
+        if self.planner is not None:
+            await asyncio.to_thread(self.planner.start, self.registry.accounts, self.symbols, self.slots)
+        for plan, _ in self.resume:
+            self._active[plan["symbol"]] = self._active.get(plan["symbol"], 0) + 1
+        workers = [asyncio.create_task(self._resume_one(plan, opens)) for plan, opens in self.resume]
+        workers += [asyncio.create_task(self._worker(i)) for i in range(1, self.slots + 1)]
+        try:
+            await asyncio.gather(*workers)
+        except asyncio.CancelledError:
+            # gather уже отменил циклы: ждём, пока они закроют открытые ноги — повторная отмена прервала бы закрытие
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        finally:
+            for w in workers:
+                w.cancel()
+
+def run_scheduler(registry: AccountRegistry, symbols: List[str], resume: Sequence[Tuple[dict, List[dict]]] = ()):
+    asyncio.run(CycleScheduler(registry, symbols, resume=resume).run())
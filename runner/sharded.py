@@ -0,0 +1,232 @@
+"""Шардированный режим: координатор и несколько процессов-воркеров.
+
+Координатор делит аккаунты на шарды, каждый воркер сам проверяет свои аккаунты
+и гоняет свой CycleScheduler со своими сессиями, лимитерами и WebSocket-потоками.
+Обратно по одной очереди приходят исполнения (координатор ведёт общий журнал
+статистики), метрики и состояние. Ctrl+C получает координатор: он выставляет
+stop-событие и ждёт, пока шарды закроют открытые позиции.
+"""
+import asyncio
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from typing import Dict, List
+
+from config.accounts import Account
+from config.settings import (
+    DEFAULT_LEVERAGE, USER_STREAM_ENABLED, MARK_PRICE_STREAM_ENABLED,
+    METRICS_ENABLED, METRICS_HOST, METRICS_PORT, SHARD_REPORT_INTERVAL_S, SHARD_SHUTDOWN_TIMEOUT_S
+)
+from runner.account_registry import AccountRegistry
+from runner.cycle_journal import cycle_journal, recover_cycles
+from runner.scheduler import CycleScheduler, LEGS_PER_CYCLE
+from utils.logger import logger, configure_logging
+from utils.metrics import CYCLES_TOTAL, render_metrics, merge_rendered, start_metrics_server, stop_metrics_server
+from utils.stats_journal import stats_journal
+
+def split_shards(accounts: List[Account], workers: int) -> List[List[Account]]:
+    """Аккаунты с общим основным прокси — в один шард: лимит веса на IP считается внутри процесса.
+
+    Аккаунты без прокси раскладываются по одному, их общий IP лимитирует каждый шард отдельно.
+    """
+    workers = max(1, min(workers, len(accounts) // LEGS_PER_CYCLE))
+    groups: Dict[str, List[Account]] = {}
+    for acct in accounts:
+        groups.setdefault(acct.proxy or acct.api_key, []).append(acct)
+
+    shards: List[List[Account]] = [[] for _ in range(workers)]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+
+    # Шард меньше чем на один цикл вливаем в самый маленький из остальных
+    small = [s for s in shards if len(s) < LEGS_PER_CYCLE]
+    shards = [s for s in shards if len(s) >= LEGS_PER_CYCLE]
+    for s in small:
+        if shards:
+            min(shards, key=len).extend(s)
+        elif s:
+            shards.append(s)
+    return shards
+
+# === Воркер (отдельный процесс) ===
+def _report(shard_id: int, registry: AccountRegistry, ready: List[Account], events):
+    from network.user_stream import stream_healthy
+    events.put(("health", shard_id, {
+        "accounts": len(ready),
+        **registry.stats(),
+        "streams": sum(1 for a in ready if stream_healthy(a)),
+        "cycles": int(CYCLES_TOTAL.total())
+    }))
+    events.put(("metrics", shard_id, render_metrics()))
+
+async def _run_until_stopped(scheduler: CycleScheduler, stop_event):
+    task = asyncio.create_task(scheduler.run())
+    while not task.done() and not stop_event.is_set():
+        await asyncio.wait({task}, timeout=0.5)
+    if not task.done():
+        # Отмена = штатная остановка планировщика: открытые ноги закрываются
+        task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+def shard_main(shard_id: int, accounts: List[Account], symbols: List[str], events, stop_event):
+    # Ctrl+C приходит всей группе процессов — останавливает только координатор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging(f"shard{shard_id}")
+    from network.proxy_pool import start_proxy_prober, stop_proxy_prober
+    from network.time_sync import start_clock_sync, stop_clock_sync
+    from network.user_stream import start_user_streams, stop_user_streams
+    from network.price_feed import start_mark_price_feed, stop_mark_price_feed
+    from runner.bootstrap import bootstrap_accounts
+    from trading.core import load_all_symbol_filters
+
+    stats_journal.forward(lambda rec: events.put(("fill", shard_id, rec)))
+    cycle_journal.start(f"shard{shard_id}")
+    registry = AccountRegistry([])
+    ready: List[Account] = []
+    try:
+        start_proxy_prober(accounts)
+        start_clock_sync()
+        load_all_symbol_filters(symbols)
+        rows = bootstrap_accounts(accounts, symbols, DEFAULT_LEVERAGE)
+        ready = [r["account"] for r in rows if r["ready"]]
+        events.put(("ready", shard_id, (len(ready), len(accounts))))
+        if len(ready) < LEGS_PER_CYCLE or stop_event.is_set():
+            return
+
+        if MARK_PRICE_STREAM_ENABLED:
+            start_mark_price_feed(symbols)
+        if USER_STREAM_ENABLED:
+            start_user_streams(ready)
+
+        registry = AccountRegistry(ready)
+        def report_loop():
+            while not stop_event.wait(SHARD_REPORT_INTERVAL_S):
+                _report(shard_id, registry, ready, events)
+        threading.Thread(target=report_loop, name="shard-report", daemon=True).start()
+
+        asyncio.run(_run_until_stopped(CycleScheduler(registry, symbols), stop_event))
+    except Exception as e:
+        logger.error("[SHARD %s] Failed: %s → %s", shard_id, type(e).__name__, e)
+        events.put(("error", shard_id, f"{type(e).__name__}: {e}"))
+    finally:
+        stop_user_streams()
+        stop_mark_price_feed()
+        stop_clock_sync()
+        stop_proxy_prober()
+        cycle_journal.stop()
+        _report(shard_id, registry, ready, events)
+        events.put(("exit", shard_id, None))
+
+# === Координатор ===
+class ShardCoordinator:
+    def __init__(self, accounts: List[Account], symbols: List[str], workers: int):
+        self.symbols = list(symbols)
+        self.shards = split_shards(accounts, workers)
+        self._ctx = mp.get_context("spawn")     # чистый интерпретатор без потоков родителя
+        self.events = self._ctx.Queue()
+        self.stop_event = self._ctx.Event()
+        self.processes: Dict[int, mp.Process] = {}
+        self.health: Dict[int, dict] = {}
+        self.metrics_text: Dict[str, str] = {}
+        self.exited = set()
+
+    def start(self):
+        for shard_id, shard in enumerate(self.shards):
+            p = self._ctx.Process(target=shard_main, name=f"shard-{shard_id}",
+                                  args=(shard_id, shard, self.symbols, self.events, self.stop_event))
+            p.start()
+            self.processes[shard_id] = p
+        logger.info("[SHARDS] Started %s workers: %s accounts", len(self.shards), ", ".join(str(len(s)) for s in self.shards))
+
+    def _handle(self, kind: str, shard_id: int, payload):
+        if kind == "fill":
+            stats_journal.append(payload)
+        elif kind == "metrics":
+            self.metrics_text[str(shard_id)] = payload
+        elif kind == "health":
+            self.health[shard_id] = payload
+        elif kind == "ready":
+            logger.info("[SHARDS] Shard %s: %s/%s accounts ready", shard_id, payload[0], payload[1])
+        elif kind == "error":
+            logger.error("[SHARDS] Shard %s failed: %s", shard_id, payload)
+        elif kind == "exit":
+            self.exited.add(shard_id)
+
+    def pump(self, timeout: float):
+        """Разбирает сообщения шардов; ждёт первое не дольше `timeout`."""
+        try:
+            msg = self.events.get(timeout=timeout) if timeout else self.events.get_nowait()
+            while True:
+                self._handle(*msg)
+                msg = self.events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def render_metrics(self) -> str:
+        texts = dict(self.metrics_text)
+        return merge_rendered(texts) if texts else render_metrics()
+
+    def summary(self) -> str:
+        totals: Dict[str, int] = {}
+        for h in self.health.values():
+            for k, v in h.items():
+                totals[k] = totals.get(k, 0) + v
+        alive = sum(1 for p in self.processes.values() if p.is_alive())
+        return f"alive {alive}/{len(self.processes)} | " + " ".join(f"{k}={v}" for k, v in totals.items())
+
+    def run(self):
+        reported_dead = set()
+        last_summary = time.time()
+        while True:
+            self.pump(1.0)
+            for shard_id, p in self.processes.items():
+                if not p.is_alive() and shard_id not in self.exited and shard_id not in reported_dead:
+                    reported_dead.add(shard_id)
+                    logger.error("[SHARDS] Shard %s died (exit code %s)", shard_id, p.exitcode)
+            if not any(p.is_alive() for p in self.processes.values()):
+                logger.warning("[SHARDS] All shards have exited")
+                return
+            if time.time() - last_summary >= SHARD_REPORT_INTERVAL_S:
+                logger.info("[SHARDS] %s", self.summary())
+                last_summary = time.time()
+
+    def stop(self):
+        self.stop_event.set()
+        deadline = time.time() + SHARD_SHUTDOWN_TIMEOUT_S
+        # Очередь нужно разбирать и во время ожидания: процесс не завершится, пока его сообщения не прочитаны
+        while any(p.is_alive() for p in self.processes.values()) and time.time() < deadline:
+            self.pump(0.5)
+        for shard_id, p in self.processes.items():
+            if p.is_alive():
+                logger.error("[SHARDS] Shard %s did not stop in %ss, terminating", shard_id, SHARD_SHUTDOWN_TIMEOUT_S)
+                p.terminate()
+        self.pump(0)
+        for p in self.processes.values():
+            p.join(timeout=5)
+        logger.info("[SHARDS] Stopped. %s", self.summary())
+
+def run_sharded(accounts: List[Account], symbols: List[str], workers: int):
+    from trading.core import load_all_symbol_filters
+    # Прогреваем кэш exchangeInfo: шарды прочитают его с диска, а не запросят каждый
+    load_all_symbol_filters(symbols)
+    # Незавершённые циклы всех процессов прошлого запуска закрывает координатор — до раздачи аккаунтов шардам
+    recover_cycles(accounts, resume=False)
+    cycle_journal.stop()
+
+    coordinator = ShardCoordinator(accounts, symbols, workers)
+    if METRICS_ENABLED:
+        start_metrics_server(METRICS_HOST, METRICS_PORT, render=coordinator.render_metrics)
+        print(f"[INIT] Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    stats_journal.start()
+    coordinator.start()
+    print("[INFO] Press Ctrl+C to stop.\n")
+    try:
+        coordinator.run()
+    except KeyboardInterrupt:
+        print("\n[STOP] Interrupted by user. Waiting for shards to close open positions...")
+    finally:
+        coordinator.stop()
+        stats_journal.stop()
+        stop_metrics_server()
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from config.accounts import Account
+from runner.account_registry import AccountRegistry
+from trading.ledger import margin_ledger
+
+def usdt(free: str) -> list:
+    return [{"asset": "USDT", "availableBalance": free}]
+
+def make_accounts(n: int) -> list:
+    return [Account(f"acct-{i}", f"registry-key-{i}", "secret") for i in range(n)]
+
+def test_parked_account_returns_after_ledger_resync():
+    accounts = make_accounts(3)
+    for acct in accounts:
+        margin_ledger.seed(acct, usdt("1000"), [])
+    registry = AccountRegistry(accounts)
+    low = accounts[0]
+    margin_ledger.seed(low, usdt("1"), [])
+
+    assert registry.acquire(3) is None
+    assert registry.stats()["parked"] == 1
+
+    # reconcile() перечитывает аккаунт через seed()
+    margin_ledger.seed(low, usdt("1000"), [])
+    assert registry.stats()["parked"] == 0
+    assert set(registry.acquire(3)) == set(accounts)
+
+def test_parked_account_returns_after_closing_fill():
+    accounts = make_accounts(3)
+    low = accounts[0]
+    margin_ledger.seed(low, usdt("1"), [{"symbol": "BTCUSDT", "leverage": "10", "positionAmt": "0.01",
+                                         "entryPrice": "60000", "markPrice": "60000"}])
+    for acct in accounts[1:]:
+        margin_ledger.seed(acct, usdt("1000"), [])
+    registry = AccountRegistry(accounts)
+    assert registry.acquire(3) is None
+
+    # Закрытие позиции освобождает 60 USDT маржи
+    margin_ledger.apply_fill(low, "BTCUSDT", "SELL", {"executedQty": "0.01", "avgPrice": "60000"})
+    assert low.balance == Decimal("61")
+    assert set(registry.acquire(3)) == set(accounts)
+
+def test_acquire_planned_substitutes_busy_accounts():
+    accounts = make_accounts(6)
+    registry = AccountRegistry(accounts)
+    first = registry.acquire_planned(accounts[:3])
+    assert first == accounts[:3]
+
+    second = registry.acquire_planned([accounts[0], accounts[3], accounts[4]])
+    assert second[1:] == accounts[3:5]
+    assert second[0] == accounts[5]
+    assert registry.acquire_planned([accounts[1], accounts[2], accounts[0]]) is None
+    assert registry.stats()["ready"] == 0
+
+    registry.release(first + second)
+    assert registry.stats()["ready"] == 6
+    for _ in range(1000):
+        chosen = registry.acquire_planned(accounts[:3])
+        assert chosen == accounts[:3]
+        registry.release(chosen)
+    # Записи, снятые не с вершины heap, не копятся
+    assert len(registry._ready) <= 2 * len(accounts) + 1
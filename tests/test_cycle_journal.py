@@ -0,0 +1,121 @@
+import json
+import time
+from decimal import Decimal
+
+import pytest
+
+import network.client
+import runner.cycle_runner
+import trading.core
+from config.accounts import Account
+from config.settings import CYCLE_RESUME_MIN_HOLD_S
+from runner.cycle_journal import cycle_journal, recover_cycles
+
+SYMBOL = "BTCUSDT"
+
+def make_accounts(n: int) -> list:
+    return [Account(f"rec-{i}", f"recover-key-{i}", "secret") for i in range(n)]
+
+def cycle(cycle_id: str, names: list, opens: dict, close_at: float = None) -> list:
+    """Записи незавершённого цикла; `opens` — имя → (side, qty) ног, дошедших до журнала."""
+    recs = [{"ev": "start", "cycle_id": cycle_id, "symbol": SYMBOL, "ts": time.time(), "hold_time": 60, "accounts": names}]
+    recs += [{"ev": "open", "cycle_id": cycle_id, "account": n, "side": side, "qty": qty, "order_id": 1}
+             for n, (side, qty) in opens.items()]
+    if close_at is not None:
+        recs.append({"ev": "hold", "cycle_id": cycle_id, "close_at": close_at})
+    return recs
+
+class Exchange:
+    """Позиции и ордера, которые видит recover_cycles; закрытия только записываются."""
+
+    def __init__(self, monkeypatch, positions: dict, orders: dict = None):
+        self.positions = positions
+        self.orders = orders or {}
+        self.closed = []
+        monkeypatch.setattr(network.client, "private_get", self.private_get)
+        monkeypatch.setattr(trading.core, "find_order", self.find_order)
+        monkeypatch.setattr(runner.cycle_runner, "close_legs", self.close_legs)
+
+    def private_get(self, path, acct, params=None):
+        if path == "/fapi/v2/balance":
+            return [{"asset": "USDT", "availableBalance": "1000"}]
+        amt = self.positions[acct.name]
+        if isinstance(amt, Exception):
+            raise amt
+        return [{"symbol": SYMBOL, "positionAmt": str(amt), "markPrice": "50000", "leverage": "10"}]
+
+    def find_order(self, acct, client_oid, symbol):
+        return self.orders.get((acct.name, client_oid))
+
+    def close_legs(self, plan, opens):
+        self.closed += [(plan["cycle_id"], o["name"], o["open_side"], o["qty"]) for o in opens]
+
+    def closed_qty(self, name: str) -> Decimal:
+        return sum((qty for _, n, _, qty in self.closed if n == name), Decimal("0"))
+
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cycle_journal, "directory", str(tmp_path))
+    yield tmp_path
+    cycle_journal.stop()
+
+def write_journal(directory, *cycles):
+    with open(directory / "cycles-old.jsonl", "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(rec) + "\n" for recs in cycles for rec in recs))
+
+def test_unjournaled_open_is_found_by_client_id(journal_dir, monkeypatch):
+    a, b, c = make_accounts(3)
+    write_journal(journal_dir, cycle("c1", [a.name, b.name, c.name], {a.name: ("BUY", "0.02"), b.name: ("SELL", "0.01")}))
+    # Третья нога исполнилась со второй попытки, но до журнала не дошла
+    ex = Exchange(monkeypatch, {a.name: "0.02", b.name: "-0.01", c.name: "-0.01"},
+                  {(c.name, trading.core.client_order_id("c1", "o", 3, 2)): {"side": "SELL", "executedQty": "0.01"}})
+    assert recover_cycles([a, b, c], process_tag="test") == []
+    assert sorted(ex.closed) == [("c1", a.name, "BUY", Decimal("0.02")), ("c1", b.name, "SELL", Decimal("0.01")),
+                                 ("c1", c.name, "SELL", Decimal("0.01"))]
+
+def test_cycles_sharing_a_position_close_no_more_than_it_holds(journal_dir, monkeypatch):
+    a, b = make_accounts(2)
+    write_journal(journal_dir,
+                  cycle("c1", [a.name, b.name], {a.name: ("BUY", "0.01"), b.name: ("SELL", "0.01")}),
+                  cycle("c2", [a.name, b.name], {a.name: ("BUY", "0.01"), b.name: ("SELL", "0.01")}))
+    # Часть длинной позиции a уже закрыта до падения
+    ex = Exchange(monkeypatch, {a.name: "0.015", b.name: "-0.02"})
+    recover_cycles([a, b], process_tag="test")
+    assert ex.closed_qty(a.name) == Decimal("0.015")
+    assert ex.closed_qty(b.name) == Decimal("0.02")
+
+def test_foreign_and_opposite_positions_are_left_alone(journal_dir, monkeypatch):
+    a, b, c = make_accounts(3)
+    write_journal(journal_dir, cycle("c1", [a.name, b.name, c.name],
+                                     {a.name: ("BUY", "0.01"), b.name: ("SELL", "0.01"), c.name: ("SELL", "0.01")}))
+    # a — позиция в обратную сторону, b — больше, чем открыл цикл, c — уже закрыта
+    ex = Exchange(monkeypatch, {a.name: "-0.05", b.name: "-0.05", c.name: "0"})
+    recover_cycles([a, b, c], process_tag="test")
+    assert ex.closed == [("c1", b.name, "SELL", Decimal("0.01"))]
+
+@pytest.mark.parametrize("left_s, resumed", [(CYCLE_RESUME_MIN_HOLD_S + 30, True), (CYCLE_RESUME_MIN_HOLD_S - 1, False)])
+def test_resume_or_close_by_remaining_hold(journal_dir, monkeypatch, left_s, resumed):
+    a, b = make_accounts(2)
+    write_journal(journal_dir, cycle("c1", [a.name, b.name], {a.name: ("BUY", "0.01"), b.name: ("SELL", "0.01")},
+                                     close_at=time.time() + left_s))
+    ex = Exchange(monkeypatch, {a.name: "0.01", b.name: "-0.01"})
+    result = recover_cycles([a, b], process_tag="test")
+    if resumed:
+        assert [(plan["cycle_id"], len(opens)) for plan, opens in result] == [("c1", 2)]
+        assert ex.closed == []
+    else:
+        assert result == []
+        assert len(ex.closed) == 2
+
+def test_failed_position_query_keeps_cycle_in_journal(journal_dir, monkeypatch):
+    a, b, c, d = make_accounts(4)
+    write_journal(journal_dir,
+                  cycle("c1", [a.name, b.name], {a.name: ("BUY", "0.01"), b.name: ("SELL", "0.01")}),
+                  cycle("c2", [c.name, d.name], {c.name: ("BUY", "0.01"), d.name: ("SELL", "0.01")}))
+    ex = Exchange(monkeypatch, {a.name: "0.01", b.name: ConnectionError("proxy down"), c.name: "0.01", d.name: "-0.01"})
+    recover_cycles([a, b, c, d], process_tag="test")
+    assert {cid for cid, *_ in ex.closed} == {"c2"}
+    with open(cycle_journal.path, "r", encoding="utf-8") as f:
+        kept = {json.loads(line)["cycle_id"] for line in f}
+    assert "c1" in kept
+    assert [p.name for p in journal_dir.iterdir() if p.suffix == ".jsonl"] == ["cycles-test.jsonl"]
@@ -0,0 +1,48 @@
+import time
+
+from trading.order_state import OrderStateTable
+
+def update(order_id: int, status: str, client_oid: str = None) -> dict:
+    return {"i": order_id, "s": "BTCUSDT", "c": client_oid or f"oid-{order_id}", "S": "BUY", "X": status,
+            "x": "TRADE" if status == "FILLED" else "NEW", "z": "0.01", "ap": "65000", "T": 0}
+
+def test_final_orders_expire_after_ttl():
+    table = OrderStateTable(ttl_s=0.05)
+    table.apply_update("key", update(1, "FILLED"))
+    table.apply_update("key", update(2, "NEW"))
+    time.sleep(0.1)
+    table.apply_update("key", update(3, "FILLED"))
+    assert table.get("key", 1) is None
+    assert table.get("key", client_oid="oid-1") is None
+    # Незавершённый ордер и только что исполненный остаются
+    assert table.get("key", 2)["status"] == "NEW"
+    assert table.get("key", 3)["status"] == "FILLED"
+    assert len(table) == 2
+
+def test_table_is_capped():
+    table = OrderStateTable(max_orders=100)
+    for i in range(1000):
+        table.apply_update("key", update(i, "NEW"))
+    assert len(table) == 100
+    assert table.get("key", 999) is not None
+    assert table.get("key", 0) is None
+
+def test_forget_drops_client_id_index():
+    table = OrderStateTable()
+    table.apply_update("key", update(7, "FILLED", "cycle-o0"))
+    assert table.wait_final("key", client_oid="cycle-o0", timeout_s=0)["orderId"] == 7
+    table.forget("key", 7)
+    assert table.get("key", client_oid="cycle-o0") is None
+    assert len(table) == 0
+
+def test_commission_counted_only_in_usdt():
+    table = OrderStateTable()
+    trade = dict(update(1, "PARTIALLY_FILLED"), x="TRADE", n="0.01", N="USDT")
+    table.apply_update("key", trade)
+    table.apply_update("key", dict(trade, X="FILLED", n="0.02"))
+    assert table.get("key", 1)["commission"] == "0.03"
+    # Хотя бы одна сделка с комиссией в другом активе — сумма в USDT неизвестна
+    table.apply_update("key", dict(trade, i=2, n="0.0001", N="BNB"))
+    table.apply_update("key", dict(trade, i=2, X="FILLED", n="0.01", N="USDT"))
+    assert table.get("key", 2)["commission"] is None
+    assert table.get("key", 2)["commissionAsset"] == "USDT"
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+import trading.planner as planner_module
+from config.accounts import Account
+from config.settings import BASE_NOTIONAL_USDT, DEFAULT_LEVERAGE, HOLD_TIME_RANGE, TOTAL_QTY_JITTER
+from trading.ledger import margin_ledger
+from trading.planner import DayPlanner, draw_triples, DAY_S
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+# Час после полуночи UTC: горизонт плана не зависит от времени запуска тестов
+NOW = 20000 * DAY_S + 3600.0
+
+def make_accounts(n: int) -> list:
+    return [Account(f"plan-{i}", f"planner-key-{i}", "secret") for i in range(n)]
+
+@pytest.fixture
+def planner(monkeypatch):
+    monkeypatch.setattr(planner_module.fill_store, "rows", lambda: 0)
+    p = DayPlanner()
+    p.start(make_accounts(30), SYMBOLS, slots=5, seed=7)
+    p.replan(NOW)
+    return p
+
+def test_draw_triples_distinct_and_weighted():
+    weights = np.array([0.0, 1.0, 2.0, 0.0, 3.0, 1.0, 5.0])
+    triples = draw_triples(np.random.default_rng(1), weights, 5000)
+    assert triples.shape == (5000, 3)
+    assert all(len(set(row)) == 3 for row in triples.tolist())
+    assert not np.isin(triples, [0, 3]).any()
+    counts = np.bincount(triples.ravel(), minlength=len(weights))
+    assert counts[6] > counts[4] > counts[1]
+    assert np.array_equal(triples, draw_triples(np.random.default_rng(1), weights, 5000))
+
+def test_planned_volume_matches_remaining(planner):
+    plan = planner._plan
+    assert len(plan["start"]) > 100
+    assert all(len(set(row)) == 3 for row in plan["accounts"].tolist())
+    assert np.all(np.diff(plan["start"]) >= 0)
+    planned = 2 * plan["notional"].sum()
+    assert planned == pytest.approx(planner.remaining().sum(), rel=float(TOTAL_QTY_JITTER))
+
+def test_margin_cap_limits_leg_notional(monkeypatch):
+    monkeypatch.setattr(planner_module.fill_store, "rows", lambda: 0)
+    accounts = make_accounts(6)
+    capped = accounts[0]
+    monkeypatch.setattr(margin_ledger, "max_notional", lambda acct, leverage: Decimal("40") if acct is capped else None)
+    p = DayPlanner()
+    p.start(accounts, SYMBOLS, slots=2, seed=3)
+    p.replan(NOW)
+    plan = p._plan
+    rows, legs = np.nonzero(plan["accounts"] == 0)
+    assert len(rows) > 0
+    leg_notional = plan["notional"][rows] * plan["shares"][rows, legs]
+    assert np.all(leg_notional <= 40 + 1e-9)
+    # Ограничение сработало: часть циклов меньше нижней границы разброса, нога — ровно на пределе
+    assert plan["notional"][rows].min() < float(BASE_NOTIONAL_USDT) * DEFAULT_LEVERAGE * (1 - float(TOTAL_QTY_JITTER))
+    assert np.isclose(leg_notional, 40).any()
+
+def test_drift_follows_settled_cycles(planner):
+    assert planner.drift(NOW) == 0.0
+    later = float(planner._plan["start"][9]) + HOLD_TIME_RANGE[1]
+    assert planner.drift(later) > 0
+    # Факт догнал план по уже закрытым циклам
+    planner.done[0] += float(planner._cum_volume[9])
+    assert planner.drift(later) == pytest.approx(0.0, abs=1e-12)
+
+def test_pop_after_replan_does_not_advance_new_plan(planner):
+    first = planner.peek()
+    planner.pop(first)
+    stale = planner.peek()
+    planner.replan(NOW + 60)
+    fresh = planner.peek()
+    planner.pop(stale)
+    assert planner.peek()["start"] == fresh["start"]
+    assert planner.peek()["generation"] == stale["generation"] + 1
+    planner.pop(fresh)
+    assert planner.peek()["index"] == 1
+
+def test_busy_symbol_is_deferred_not_blocking(planner):
+    head = planner.peek()
+    left = planner.stats()["planned_left"]
+    other = planner.peek(busy={head["symbol"]})
+    assert other["symbol"] != head["symbol"] and other["index"] > head["index"]
+    planner.pop(other)
+    assert planner.stats()["planned_left"] == left - 1
+    # Отложенный цикл остаётся первым в очереди
+    assert planner.peek()["index"] == head["index"]
+    assert planner.peek(busy=set(SYMBOLS)) is None
@@ -0,0 +1,23 @@
+import time
+
+import pytest
+
+from network.rate_limiter import RateLimiter, IpBanned
+
+def test_long_ban_raises_instead_of_sleeping():
+    limiter = RateLimiter()
+    limiter.on_response("direct", None, 418, {"Retry-After": "600"})
+    started = time.monotonic()
+    with pytest.raises(IpBanned) as e:
+        limiter.acquire("direct", None, "GET", "/fapi/v1/time")
+    assert time.monotonic() - started < 0.1
+    assert e.value.ip_key == "direct"
+    # Другие IP блокировка не задевает
+    limiter.acquire("http://proxy:1", None, "GET", "/fapi/v1/time")
+
+def test_short_ban_is_waited_out():
+    limiter = RateLimiter()
+    limiter.on_response("direct", None, 429, {"Retry-After": "0.2"})
+    started = time.monotonic()
+    limiter.acquire("direct", None, "GET", "/fapi/v1/time")
+    assert time.monotonic() - started >= 0.15
@@ -0,0 +1,24 @@
+from decimal import Decimal
+
+import utils.stats_journal as sj
+from utils.stats_journal import StatsJournal
+
+def fill(order_id: int) -> dict:
+    return {"orderId": order_id, "executedQty": "1", "avgPrice": "100", "updateTime": 1}
+
+def test_restart_after_stop_does_not_reapply_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr(sj, "read_stats_excel", lambda: {})
+    monkeypatch.setattr(sj, "export_stats_excel", lambda totals: None)
+    monkeypatch.setattr(sj.fill_store, "append", lambda recs: None)
+    path = str(tmp_path / "journal.jsonl")
+    journal = StatsJournal(path=path)
+    journal.record_fill("acc", "BTCUSDT", "BUY", fill(1), Decimal("100"))
+    journal.stop()
+    journal.record_fill("acc", "BTCUSDT", "BUY", fill(2), Decimal("100"))
+    journal.stop()
+    assert journal.snapshot()[("acc", "BTCUSDT")] == {"volume": 200.0, "long": 2, "short": 0}
+    # Свежий процесс читает тот же журнал без повторов
+    reloaded = StatsJournal(path=path)
+    reloaded.start()
+    reloaded.stop()
+    assert reloaded.snapshot()[("acc", "BTCUSDT")] == {"volume": 200.0, "long": 2, "short": 0}
@@ -0,0 +1,211 @@
+"""Бенчмарк горячих путей без сети: цикл по кассете REST и микробенчмарки.
+
+Кассета (network.cassette) записывается один раз с локального симулятора и дальше
+воспроизводится без задержек (CASSETTE_SPEED=0): время цикла — только CPU бота,
+результат не зависит от сети и симулятора. Микробенчмарки: adjust_qty, подпись
+запроса, stats_journal.record_fill, FillStore.append (нс на операцию, лучший из повторов).
+
+    python -m tools.bench_hotpaths --cycles 50 --json bench.json
+    python -m tools.bench_hotpaths --compare bench.json --max-regression 0.25   # CI: код 1 при регрессии
+    python -m tools.bench_hotpaths --profile
+"""
+import argparse
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from decimal import Decimal
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", default=os.path.join("cassettes", "bench.jsonl.gz"),
+                        help="файл кассеты; если его нет — записывается с симулятора")
+    parser.add_argument("--record", action="store_true", help="перезаписать кассету")
+    parser.add_argument("--cycles", type=int, default=30)
+    parser.add_argument("--accounts", type=int, default=6)
+    parser.add_argument("--symbols", default="BTCUSDT,ETHUSDT")
+    parser.add_argument("--seed", type=int, default=1, help="seed выбора аккаунтов и ног (одинаковый при записи и воспроизведении)")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов микробенчмарка")
+    parser.add_argument("--profile", action="store_true", help="cProfile воспроизведения циклов")
+    parser.add_argument("--json", default=None, help="сохранить результаты в JSON")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="допустимый рост времени (доля)")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+def best_ns(fn, number: int, repeat: int) -> float:
+    fn()    # прогрев кэшей
+    return min(timeit.Timer(fn).repeat(repeat=repeat, number=number)) / number * 1e9
+
+def micro_benchmarks(symbol: str, repeat: int) -> dict:
+    from trading.core import adjust_qty
+    from network.signer import Signer
+    from utils.stats_journal import StatsJournal
+    from utils.fill_store import FillStore
+
+    qty = Decimal("0.123456789")
+    signer = Signer("s" * 64)
+    params = {"symbol": symbol, "side": "BUY", "type": "MARKET", "quantity": "0.012",
+              "newClientOrderId": "0123456789ab-o0", "recvWindow": 5000, "timestamp": 1700000000000}
+    order = {"orderId": 123456, "executedQty": "0.012", "avgPrice": "65000.1", "updateTime": 1700000000000,
+             "status": "FILLED"}
+    journal = StatsJournal(path=os.path.join(tempfile.mkdtemp(prefix="bench-journal-"), "journal.jsonl"),
+                           export_interval=10 ** 9)
+    store = FillStore(tempfile.mkdtemp(prefix="bench-fills-"))
+    batch = [{"ts": 1700000000000 + i, "name": f"acct-{i % 7}", "symbol": symbol, "side": "BUY" if i % 2 else "SELL",
+              "qty": "0.012", "price": "65000.1", "mark": "65000", "fee": None, "cycle_id": "0123456789ab",
+              "order_id": i, "phase": "open"} for i in range(100)]
+
+    results = {
+        "adjust_qty_ns": best_ns(lambda: adjust_qty(qty, symbol), 100_000, repeat),
+        "signed_query_ns": best_ns(lambda: signer.signed_query(params), 50_000, repeat),
+        "record_fill_ns": best_ns(lambda: journal.record_fill("acct-1", symbol, "BUY", order, Decimal("65000"),
+                                                              "0123456789ab", "open"), 20_000, repeat),
+        "fill_store_append_ns": best_ns(lambda: store.append(batch), 200, repeat) / len(batch)
+    }
+    journal.stop()
+    return results
+
+def run_session(accounts, symbols, cycles: int, seed: int) -> list:
+    """bootstrap + `cycles` циклов подряд; [(wall, cpu)] на цикл, секунды."""
+    import config.settings as settings
+    from trading.core import load_all_symbol_filters
+    from runner.bootstrap import bootstrap_accounts
+    from runner.account_registry import AccountRegistry
+    from runner.cycle_runner import run_cycle
+
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_all_symbol_filters(symbols)
+        rows = bootstrap_accounts(accounts, symbols, settings.DEFAULT_LEVERAGE)
+    ready = [r["account"] for r in rows if r["ready"]]
+    if len(ready) < 3:
+        raise RuntimeError(f"Only {len(ready)} accounts ready after bootstrap")
+    registry = AccountRegistry(ready)
+    timings = []
+    for i in range(cycles):
+        w0, c0 = time.perf_counter(), time.process_time()
+        run_cycle(registry, symbols[i % len(symbols)])
+        timings.append((time.perf_counter() - w0, time.process_time() - c0))
+    return timings
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\n=== Compare with {baseline_path} (max regression {max_regression:.0%}) ===")
+    for name, base in baseline.items():
+        if name not in results or not isinstance(base, (int, float)) or not name.endswith(("_ns", "_cpu_ms")) or base <= 0:
+            continue
+        change = results[name] / base - 1
+        flag = "REGRESSION" if change > max_regression else "ok"
+        ok = ok and change <= max_regression
+        print(f"{name:<24} {base:>12.1f} → {results[name]:>12.1f} {change:>+8.1%}  {flag}")
+    return ok
+
+def main():
+    args = parse_args()
+    # Пути — относительно каталога запуска: дальше работаем во временном
+    cassette_path = os.path.abspath(args.cassette)
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    recording = args.record or not os.path.exists(cassette_path)
+    symbols = args.symbols.split(",")
+    sys.path.insert(0, REPO_ROOT)
+
+    sim = None
+    if recording:
+        # Симулятор — отдельным процессом: его random не сбивает seed бота
+        from tools.load_bench import free_port, start_sim_process
+        sim_args = argparse.Namespace(port=free_port(), latency_ms=1.0, fill_delay_ms=0.0, error_rate=0.0,
+                                      slow_rate=0.0, slow_ms=0.0, weight_limit=0)
+        sim = start_sim_process(sim_args)
+        os.environ["ASTER_BASE_URL"] = f"http://127.0.0.1:{sim_args.port}"
+    # Кэш биржи, журналы и история исполнений — во временный каталог
+    os.chdir(tempfile.mkdtemp(prefix="aster-hotpaths-"))
+
+    import config.settings as settings
+    settings.SYMBOLS = symbols
+    settings.HOLD_TIME_RANGE = (0, 0)
+    settings.BETWEEN_CYCLES_RANGE = (0, 0)
+    settings.USER_STREAM_ENABLED = False
+    settings.MARK_PRICE_STREAM_ENABLED = False
+    settings.STATS_EXPORT_INTERVAL_S = 10 ** 9
+    settings.IP_WEIGHT_LIMIT_1M = 10 ** 9
+    settings.ORDER_HEDGE_ENABLED = False
+
+    from utils.logger import logger
+    from tools.sim_exchange import secret_for
+    from config.accounts import Account
+    from network.cassette import cassette
+    from utils.stats_journal import stats_journal
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    accounts = [Account(f"bench-{i}", f"key-{i}", secret_for(f"key-{i}"), []) for i in range(args.accounts)]
+
+    try:
+        if recording:
+            cassette.configure("record", cassette_path)
+            t0 = time.time()
+            try:
+                run_session(accounts, symbols, args.cycles, args.seed)
+            finally:
+                cassette.close()
+                sim.terminate()
+            print(f"[BENCH] Recorded {cassette.stats['recorded']} requests, {args.cycles} cycles "
+                  f"in {time.time() - t0:.1f}s → {cassette_path}")
+
+        cassette.configure("replay", cassette_path, speed=0)
+        profiler = cProfile.Profile() if args.profile else None
+        if profiler:
+            profiler.enable()
+        timings = run_session(accounts, symbols, args.cycles, args.seed)
+        if profiler:
+            profiler.disable()
+        if cassette.stats["missed"]:
+            raise SystemExit(f"[BENCH] {cassette.stats['missed']} requests not found in the cassette "
+                             f"(more cycles than recorded or the code changed its requests): re-record with --record")
+    finally:
+        stats_journal.stop()
+
+    walls = [w * 1000 for w, _ in timings]
+    cpus = [c * 1000 for _, c in timings]
+    results = {
+        "cycles": len(timings),
+        "cycle_wall_ms": statistics.median(walls),
+        "cycle_cpu_ms": statistics.median(cpus),
+        "requests_replayed": cassette.stats["replayed"],
+        "requests_reused": cassette.stats["reused"]
+    }
+    print(f"[BENCH] Replay: {len(timings)} cycles, wall p50={results['cycle_wall_ms']:.2f}ms "
+          f"max={max(walls):.2f}ms, cpu p50={results['cycle_cpu_ms']:.2f}ms | "
+          f"replayed={cassette.stats['replayed']} reused={cassette.stats['reused']} unused={cassette.remaining()}")
+    if profiler:
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(25)
+        print(stream.getvalue())
+
+    results.update(micro_benchmarks(symbols[0], args.repeat))
+    for name in ("adjust_qty_ns", "signed_query_ns", "record_fill_ns", "fill_store_append_ns"):
+        print(f"[BENCH] {name:<22} {results[name]:>10.0f} ns/op")
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if baseline_path and not compare(results, baseline_path, args.max_regression):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
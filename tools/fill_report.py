@@ -0,0 +1,168 @@
+"""Отчёт по колоночной истории исполнений (utils.fill_store): объём, комиссии, PnL, проскальзывание.
+
+Группировки — по аккаунту, паре, дню (UTC) и циклу. Агрегаты хранятся в
+FILLS_DIR/report_state.npz вместе с числом учтённых строк: следующий запуск
+дочитывает только новые исполнения. Считается векторно, блоками по CHUNK_ROWS.
+
+PnL = денежный поток ног (продажи минус покупки) минус комиссии — реализованный
+результат для закрытых позиций; у группы с ненулевым NET QTY в нём стоимость позиции.
+Комиссия известна только для исполнений из user-data stream (колонка FEES%).
+
+    python -m tools.fill_report --by account day --top 20
+    python -m tools.fill_report --by cycle --sort pnl --csv reports
+"""
+import argparse
+import csv
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+import numpy as np
+
+from utils.fill_store import FillStore, cycle_label
+
+GROUPS = ("account", "symbol", "day", "cycle")
+VALUES = ("fills", "volume", "fees", "fees_known", "cashflow", "net_qty", "slippage")
+CHUNK_ROWS = 2_000_000
+DAY_MS = 86_400_000
+
+def chunk_values(cols: Dict[str, np.ndarray]) -> np.ndarray:
+    """Строки → матрица слагаемых (по столбцу на VALUES)."""
+    qty = np.asarray(cols["qty"])
+    price = np.asarray(cols["price"])
+    side = np.asarray(cols["side"], dtype=np.float64)
+    fee = np.asarray(cols["fee"])
+    notional = qty * price
+    known = ~np.isnan(fee)
+    return np.column_stack((
+        np.ones_like(qty),
+        notional,
+        np.where(known, fee, 0.0),
+        known.astype(np.float64),
+        -side * notional,
+        side * qty,
+        side * (price - np.asarray(cols["mark"])) * qty
+    ))
+
+def group_keys(group: str, cols: Dict[str, np.ndarray]) -> np.ndarray:
+    if group == "day":
+        return np.asarray(cols["ts"]) // DAY_MS
+    return np.asarray(cols[group]).astype(np.int64 if group != "cycle" else np.uint64)
+
+def reduce_by_key(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    uniq, inv = np.unique(keys, return_inverse=True)
+    sums = np.empty((len(uniq), values.shape[1]))
+    for j in range(values.shape[1]):
+        sums[:, j] = np.bincount(inv, weights=values[:, j], minlength=len(uniq))
+    return uniq, sums
+
+def load_state(path: str) -> Tuple[int, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    if not os.path.exists(path):
+        return 0, {}
+    with np.load(path) as z:
+        return int(z["rows"]), {g: (z[f"{g}_keys"], z[f"{g}_sums"]) for g in GROUPS if f"{g}_keys" in z}
+
+def save_state(path: str, rows: int, state: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+    arrays = {"rows": np.array(rows)}
+    for g, (keys, sums) in state.items():
+        arrays[f"{g}_keys"] = keys
+        arrays[f"{g}_sums"] = sums
+    tmp = f"{path}.tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+def update(store: FillStore, rebuild: bool = False) -> Tuple[int, int, Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """Дочитывает новые строки в агрегаты; возвращает (было строк, стало строк, агрегаты)."""
+    path = os.path.join(store.directory, "report_state.npz")
+    done, state = (0, {}) if rebuild else load_state(path)
+    total = store.rows()
+    if done > total or set(state) != set(GROUPS):
+        done, state = 0, {}     # история пересоздана или другой формат агрегатов
+    start = done
+    for lo in range(done, total, CHUNK_ROWS):
+        cols = store.read(lo, min(lo + CHUNK_ROWS, total))
+        values = chunk_values(cols)
+        for g in GROUPS:
+            keys, sums = reduce_by_key(group_keys(g, cols), values)
+            if g in state:
+                keys, sums = reduce_by_key(np.concatenate((state[g][0], keys)), np.vstack((state[g][1], sums)))
+            state[g] = (keys, sums)
+    if total > start or not os.path.exists(path):
+        os.makedirs(store.directory, exist_ok=True)
+        save_state(path, total, state)
+    return start, total, state
+
+def key_labels(group: str, keys: np.ndarray, names: Dict[str, list]) -> list:
+    if group in ("account", "symbol"):
+        table = names.get(group, [])
+        return [table[k] if 0 <= k < len(table) else f"#{k}" for k in keys.tolist()]
+    if group == "day":
+        return [datetime.fromtimestamp(int(k) * DAY_MS / 1000, tz=timezone.utc).strftime("%Y-%m-%d") for k in keys]
+    return [cycle_label(k) for k in keys.tolist()]
+
+def table_rows(group: str, keys: np.ndarray, sums: np.ndarray, names: Dict[str, list], sort: str, top: int) -> list:
+    col = {v: sums[:, i] for i, v in enumerate(VALUES)}
+    pnl = col["cashflow"] - col["fees"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slip_bps = np.where(col["volume"] > 0, col["slippage"] / col["volume"] * 1e4, 0.0)
+        fee_pct = np.where(col["fills"] > 0, col["fees_known"] / col["fills"] * 100, 0.0)
+    if group == "day" and sort == "volume":
+        order = np.argsort(keys)
+    else:
+        order = np.argsort({"volume": -col["volume"], "pnl": pnl, "fees": -col["fees"]}[sort], kind="stable")
+    if top:
+        order = order[:top] if not (group == "day" and sort == "volume") else order[-top:]
+    labels = key_labels(group, keys[order], names)
+    return [
+        (label, int(col["fills"][i]), col["volume"][i], col["fees"][i], fee_pct[i], pnl[i], slip_bps[i], col["net_qty"][i])
+        for label, i in zip(labels, order.tolist())
+    ]
+
+HEADER = ("KEY", "FILLS", "VOLUME", "FEES", "FEES%", "PNL", "SLIP BPS", "NET QTY")
+
+def print_table(group: str, rows: list, count: int):
+    print(f"\n=== By {group} ({count} total, showing {len(rows)}) ===")
+    print(f"{HEADER[0]:<22} {HEADER[1]:>9} {HEADER[2]:>16} {HEADER[3]:>12} {HEADER[4]:>6} {HEADER[5]:>12} "
+          f"{HEADER[6]:>9} {HEADER[7]:>12}")
+    for label, fills, volume, fees, fee_pct, pnl, slip, net in rows:
+        print(f"{label:<22} {fills:>9} {volume:>16.2f} {fees:>12.4f} {fee_pct:>5.0f}% {pnl:>12.4f} "
+              f"{slip:>9.2f} {net:>12.6g}")
+
+def write_csv(directory: str, group: str, rows: list):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"fills_by_{group}.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerows(rows)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dir", default=None, help="каталог истории (по умолчанию FILLS_DIR)")
+    ap.add_argument("--by", nargs="+", choices=GROUPS, default=["account", "symbol", "day"])
+    ap.add_argument("--sort", choices=("volume", "pnl", "fees"), default="volume")
+    ap.add_argument("--top", type=int, default=20, help="строк в таблице (0 — все)")
+    ap.add_argument("--rebuild", action="store_true", help="пересчитать агрегаты с нуля")
+    ap.add_argument("--csv", default=None, help="каталог для CSV (все строки группы)")
+    args = ap.parse_args()
+
+    store = FillStore(args.dir) if args.dir else FillStore()
+    started = time.perf_counter()
+    before, total, state = update(store, rebuild=args.rebuild)
+    names = store.load_names()
+    print(f"[REPORT] {total} fills ({total - before} new) aggregated in {time.perf_counter() - started:.2f}s")
+    if not total:
+        return
+
+    for group in args.by:
+        keys, sums = state[group]
+        print_table(group, table_rows(group, keys, sums, names, args.sort, args.top), len(keys))
+        if args.csv:
+            write_csv(args.csv, group, table_rows(group, keys, sums, names, args.sort, 0))
+    totals = state["symbol"][1].sum(axis=0)
+    t = dict(zip(VALUES, totals))
+    print(f"\n[TOTAL] fills={int(t['fills'])} volume={t['volume']:.2f} fees={t['fees']:.4f} "
+          f"pnl={t['cashflow'] - t['fees']:.4f} cycles={int((state['cycle'][0] != 0).sum())}")
+
+if __name__ == "__main__":
+    main()
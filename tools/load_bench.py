@@ -0,0 +1,216 @@
+"""Нагрузочный бенчмарк: планировщик циклов против локального симулятора биржи.
+
+Поднимает tools.sim_exchange отдельным процессом (CPU бота меряется отдельно),
+создаёт N фиктивных аккаунтов и гоняет CycleScheduler заданное время.
+Отчёт: циклы/час, задержка ордера p50/p99, time-to-neutral, CPU и память.
+
+    python -m tools.load_bench --accounts 1000 --duration 120 --max-cycles 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_sim_process(args) -> subprocess.Popen:
+    cmd = [
+        sys.executable, "-m", "tools.sim_exchange",
+        "--port", str(args.port),
+        "--latency-ms", str(args.latency_ms),
+        "--fill-delay-ms", str(args.fill_delay_ms),
+        "--error-rate", str(args.error_rate),
+        "--slow-rate", str(args.slow_rate),
+        "--slow-ms", str(args.slow_ms),
+        "--weight-limit", str(args.weight_limit)
+    ]
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/fapi/v1/ping", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Simulator did not start")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of scheduling")
+    parser.add_argument("--max-cycles", type=int, default=50, help="concurrent cycles")
+    parser.add_argument("--per-symbol", type=int, default=50)
+    parser.add_argument("--symbols", default="BTCUSDT,ETHUSDT")
+    parser.add_argument("--hold", default="1,3", help="hold range, seconds")
+    parser.add_argument("--pause", default="0,1", help="pause range, seconds")
+    parser.add_argument("--no-streams", action="store_true", help="poll REST instead of WebSocket streams")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--fill-delay-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of simulator requests delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--hedge", action="store_true",
+                        help="hedged order requests: two proxies per account, both pointing at the simulator "
+                             "(implies --no-streams: the simulator does not tunnel WebSocket through a proxy)")
+    parser.add_argument("--weight-limit", type=int, default=0,
+                        help="simulator weight limit per minute; also used as the client budget (0 = unlimited)")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    args.port = args.port or free_port()
+    args.no_streams = args.no_streams or args.hedge
+    sim = start_sim_process(args)
+
+    os.environ["ASTER_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["ASTER_WS_BASE_URL"] = f"ws://127.0.0.1:{args.port}"
+    sys.path.insert(0, REPO_ROOT)
+    # Кэш, журнал статистики и stats.xlsx — во временный каталог
+    os.chdir(tempfile.mkdtemp(prefix="aster-bench-"))
+
+    import config.settings as settings
+    symbols = args.symbols.split(",")
+    settings.SYMBOLS = symbols
+    settings.HOLD_TIME_RANGE = tuple(int(x) for x in args.hold.split(","))
+    settings.BETWEEN_CYCLES_RANGE = tuple(int(x) for x in args.pause.split(","))
+    settings.USER_STREAM_ENABLED = not args.no_streams
+    settings.MARK_PRICE_STREAM_ENABLED = not args.no_streams
+    settings.STATS_EXPORT_INTERVAL_S = 10 ** 9
+    # Все фиктивные аккаунты ходят без прокси, т.е. с одного IP: бюджет клиента — как у симулятора
+    settings.IP_WEIGHT_LIMIT_1M = args.weight_limit or 10 ** 9
+    settings.ORDER_HEDGE_ENABLED = args.hedge
+
+    from utils.logger import logger
+    from tools.sim_exchange import secret_for
+    from config.accounts import Account
+    from runner.account_registry import AccountRegistry
+    from trading.core import load_all_symbol_filters
+    from runner.bootstrap import bootstrap_accounts
+    from network.user_stream import start_user_streams, stop_user_streams
+    from network.price_feed import start_mark_price_feed, stop_mark_price_feed
+    from utils.stats_journal import stats_journal
+    import runner.cycle_runner as cycle_runner
+    import runner.scheduler as scheduler
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+
+    order_latencies: List[float] = []
+    skews = {"open": [], "close": []}
+    cycles = [0]
+    lock = threading.Lock()
+
+    place = cycle_runner.submit_order
+    def timed_place(*a, **kw):
+        t0 = time.perf_counter()
+        try:
+            return place(*a, **kw)
+        finally:
+            with lock:
+                order_latencies.append((time.perf_counter() - t0) * 1000)
+    cycle_runner.submit_order = timed_place
+
+    report = cycle_runner.report_skew
+    def record_skew(symbol, phase, skew_ms, filled, total):
+        if skew_ms is not None:
+            with lock:
+                skews[phase].append(skew_ms)
+        report(symbol, phase, skew_ms, filled, total)
+    cycle_runner.report_skew = record_skew
+
+    close = scheduler.close_legs
+    def counted_close(plan, opens):
+        result = close(plan, opens)
+        with lock:
+            cycles[0] += 1
+        return result
+    scheduler.close_legs = counted_close
+
+    # Для --hedge: два «прокси» на аккаунт — сам симулятор, он принимает запросы в прокси-форме
+    proxies = [f"http://p{n}:x@127.0.0.1:{args.port}" for n in (1, 2)] if args.hedge else []
+    accounts = [Account(f"sim-{i}", f"key-{i}", secret_for(f"key-{i}"), proxies) for i in range(args.accounts)]
+
+    try:
+        t0 = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_all_symbol_filters(symbols)
+            rows = bootstrap_accounts(accounts, symbols, settings.DEFAULT_LEVERAGE)
+        ready = [r["account"] for r in rows if r["ready"]]
+        print(f"[BENCH] Bootstrap: {len(ready)}/{len(accounts)} ready in {time.time() - t0:.1f}s")
+
+        stats_journal.start()
+        if not args.no_streams:
+            start_mark_price_feed(symbols)
+            start_user_streams(ready)
+            time.sleep(2)
+
+        sched = scheduler.CycleScheduler(AccountRegistry(ready), symbols, max_cycles=args.max_cycles, per_symbol=args.per_symbol)
+        usage0 = resource.getrusage(resource.RUSAGE_SELF)
+        t0 = time.time()
+
+        async def bounded():
+            try:
+                await asyncio.wait_for(sched.run(), timeout=args.duration)
+            except asyncio.TimeoutError:
+                pass
+        asyncio.run(bounded())
+
+        wall = time.time() - t0
+        usage1 = resource.getrusage(resource.RUSAGE_SELF)
+        # Все циклы закрыты: любая оставшаяся позиция — лишний ордер (например, дубль хеджа)
+        from network.client import private_get
+        def exposure(acct):
+            return sum(abs(Decimal(p["positionAmt"])) > 0 for p in private_get("/fapi/v2/positionRisk", acct))
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            leftover = sum(pool.map(exposure, ready))
+    finally:
+        stop_user_streams()
+        stop_mark_price_feed()
+        stats_journal.stop()
+        sim.terminate()
+
+    cpu = (usage1.ru_utime - usage0.ru_utime) + (usage1.ru_stime - usage0.ru_stime)
+    print(f"[BENCH] accounts={len(ready)} slots={sched.slots} wall={wall:.1f}s streams={'off' if args.no_streams else 'on'}")
+    print(f"[BENCH] cycles={cycles[0]} cycles/hour={cycles[0] / wall * 3600:.0f}")
+    print(f"[BENCH] orders={len(order_latencies)} latency p50={percentile(order_latencies, 50):.1f}ms "
+          f"p99={percentile(order_latencies, 99):.1f}ms max={max(order_latencies, default=float('nan')):.1f}ms")
+    if args.hedge:
+        from utils.metrics import ORDER_HEDGES
+        print(f"[BENCH] hedges found={ORDER_HEDGES.value(result='found'):.0f} sent={ORDER_HEDGES.value(result='sent'):.0f} "
+              f"won by hedge={ORDER_HEDGES.value(result='hedge'):.0f} by primary={ORDER_HEDGES.value(result='primary'):.0f}")
+    print(f"[BENCH] positions left open after all cycles: {leftover}")
+    for phase in ("open", "close"):
+        print(f"[BENCH] time-to-neutral {phase}: p50={percentile(skews[phase], 50):.0f}ms "
+              f"p99={percentile(skews[phase], 99):.0f}ms n={len(skews[phase])}")
+    print(f"[BENCH] cpu={cpu:.1f}s ({cpu / wall * 100:.0f}% of one core) maxrss={usage1.ru_maxrss / 1024:.0f}MB")
+
+if __name__ == "__main__":
+    main()
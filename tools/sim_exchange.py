@@ -0,0 +1,530 @@
+"""Локальный симулятор биржи для нагрузочных тестов и отладки без реальной сети.
+
+Обслуживает REST-эндпоинты, которые использует бот (exchangeInfo, premiumIndex,
+order, leverage, time, balance, positionRisk, listenKey), а также WebSocket
+user-data stream (/ws/<listenKey>) и mark price (/stream?streams=...).
+Задержка, время исполнения, доля ошибок и лимит веса настраиваются.
+
+Подпись проверяется по соглашению: api_secret = "secret-" + api_key.
+
+    python -m tools.sim_exchange --port 8800 --latency-ms 30 --fill-delay-ms 200
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+@dataclass
+class SimConfig:
+    latency_ms: float = 20.0            # базовая задержка ответа
+    jitter_ms: float = 10.0             # случайная добавка к задержке
+    fill_delay_ms: float = 100.0        # через сколько MARKET-ордер исполняется
+    error_rate: float = 0.0             # доля запросов, отвечающих 503 / -1001
+    slow_rate: float = 0.0              # доля запросов с задержкой slow_ms (хвост задержек)
+    slow_ms: float = 2000.0
+    weight_limit_1m: int = 0            # лимит веса в минуту на IP, 0 — без лимита
+    ban_retry_after_s: int = 2          # Retry-After для 429
+    balance_usdt: Decimal = Decimal("1000")
+    fee_rate: Decimal = Decimal("0.0004")
+    recv_window_check: bool = True
+    prices: Dict[str, Decimal] = field(default_factory=lambda: {
+        "BTCUSDT": Decimal("60000"),
+        "ETHUSDT": Decimal("3000"),
+        "DOGEUSDT": Decimal("0.2")
+    })
+
+SYMBOL_SPECS = {
+    "BTCUSDT": ("0.001", "0.001", "1000", 3, "0.1"),
+    "ETHUSDT": ("0.001", "0.001", "10000", 3, "0.01"),
+    "DOGEUSDT": ("1", "1", "10000000", 0, "0.00001"),
+}
+
+def secret_for(api_key: str) -> str:
+    return f"secret-{api_key}"
+
+class ApiError(Exception):
+    def __init__(self, status: int, code: int, msg: str):
+        super().__init__(msg)
+        self.status = status
+        self.code = code
+        self.msg = msg
+
+# === WebSocket (минимальный RFC 6455: текстовые кадры, ping/pong, close) ===
+class WSConnection:
+    def __init__(self, sock: socket.socket, rfile):
+        self.sock = sock
+        self.rfile = rfile
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+    @staticmethod
+    def _frame(opcode: int, payload: bytes) -> bytes:
+        n = len(payload)
+        if n < 126:
+            header = struct.pack("!BB", 0x80 | opcode, n)
+        elif n < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+        return header + payload
+
+    def send_json(self, data: dict):
+        self._send(0x1, json.dumps(data).encode())
+
+    def _send(self, opcode: int, payload: bytes):
+        if self.closed:
+            return
+        try:
+            with self._send_lock:
+                self.sock.sendall(self._frame(opcode, payload))
+        except OSError:
+            self.closed = True
+
+    def _read_frame(self) -> Tuple[int, bytes]:
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            raise ConnectionError("eof")
+        opcode = head[0] & 0x0F
+        n = head[1] & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", self.rfile.read(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else b""
+        data = self.rfile.read(n)
+        if mask:
+            data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+        return opcode, data
+
+    def serve(self):
+        """Читает кадры клиента до закрытия; отвечает на ping."""
+        try:
+            while not self.closed:
+                opcode, data = self._read_frame()
+                if opcode == 0x9:
+                    self._send(0xA, data)
+                elif opcode == 0x8:
+                    self._send(0x8, data[:2])
+                    break
+        except (ConnectionError, OSError, struct.error):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+# === Состояние биржи ===
+class SimExchange:
+    def __init__(self, config: SimConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.prices = dict(config.prices)
+        self._order_ids = itertools.count(1)
+        self.orders: Dict[Tuple[str, int], dict] = {}
+        self.client_ids: Dict[Tuple[str, str], int] = {}
+        self.positions: Dict[Tuple[str, str], Decimal] = {}
+        self.leverage: Dict[Tuple[str, str], int] = {}
+        self.wallet: Dict[str, Decimal] = {}
+        self.listen_keys: Dict[str, str] = {}
+        self.user_conns: Dict[str, List[WSConnection]] = {}
+        self.mark_subs: List[Tuple[WSConnection, set]] = []
+        self.weight: Dict[str, Tuple[int, int]] = {}
+        self.banned_until: Dict[str, float] = {}
+        self.stats = {"requests": 0, "orders": 0, "errors": 0, "rate_limited": 0}
+        self._stop_event = threading.Event()
+        threading.Thread(target=self._price_loop, name="sim-prices", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    # --- цены ---
+    def _price_loop(self):
+        while not self._stop_event.wait(1.0):
+            now = int(time.time() * 1000)
+            with self.lock:
+                for s, p in self.prices.items():
+                    self.prices[s] = (p * Decimal(str(1 + random.gauss(0, 0.0005)))).quantize(Decimal(SYMBOL_SPECS[s][4]))
+                prices = dict(self.prices)
+                subs = list(self.mark_subs)
+            for conn, symbols in subs:
+                for s in symbols:
+                    if s in prices:
+                        conn.send_json({
+                            "stream": f"{s.lower()}@markPrice@1s",
+                            "data": {"e": "markPriceUpdate", "E": now, "s": s, "p": str(prices[s])}
+                        })
+
+    # --- лимит веса ---
+    def charge(self, ip: str, weight: int) -> int:
+        minute = int(time.time() // 60)
+        with self.lock:
+            if self.banned_until.get(ip, 0) > time.time():
+                self.stats["rate_limited"] += 1
+                raise ApiError(429, -1003, "Too many requests; IP banned")
+            start, used = self.weight.get(ip, (minute, 0))
+            used = used + weight if start == minute else weight
+            self.weight[ip] = (minute, used)
+            limit = self.config.weight_limit_1m
+            if limit and used > limit:
+                self.banned_until[ip] = time.time() + self.config.ban_retry_after_s
+                self.stats["rate_limited"] += 1
+                raise ApiError(429, -1003, "Too many requests")
+            return used
+
+    # --- подпись ---
+    def authenticate(self, headers, raw_query: str, signed: bool) -> str:
+        api_key = headers.get("X-MBX-APIKEY")
+        if not api_key:
+            raise ApiError(401, -2015, "Invalid API-key, IP, or permissions for action.")
+        if not signed:
+            return api_key
+        payload, _, signature = raw_query.rpartition("&signature=")
+        expected = hmac.new(secret_for(api_key).encode(), payload.encode(), hashlib.sha256).hexdigest()
+        if not signature or not hmac.compare_digest(signature, expected):
+            raise ApiError(400, -1022, "Signature for this request is not valid.")
+        params = dict(parse_qsl(payload))
+        ts = int(params.get("timestamp", 0))
+        recv_window = int(params.get("recvWindow", 5000))
+        now = int(time.time() * 1000)
+        if self.config.recv_window_check and not (ts - 1000 <= now <= ts + recv_window):
+            raise ApiError(400, -1021, "Timestamp for this request is outside of the recvWindow.")
+        return api_key
+
+    # --- ордера ---
+    def new_order(self, api_key: str, p: dict) -> dict:
+        symbol = p["symbol"]
+        if symbol not in self.prices:
+            raise ApiError(400, -1121, "Invalid symbol.")
+        side = p["side"]
+        qty = Decimal(p["quantity"])
+        reduce_only = p.get("reduceOnly") == "true"
+        client_oid = p.get("newClientOrderId") or f"sim-{random.getrandbits(48):x}"
+        with self.lock:
+            # Как у биржи: id занят, только пока ордер с ним открыт — после исполнения его можно повторить
+            previous = self.client_ids.get((api_key, client_oid))
+            if previous is not None and self.orders[(api_key, previous)]["status"] in ("NEW", "PARTIALLY_FILLED"):
+                raise ApiError(400, -4116, "ClientOrderId is duplicated.")
+            pos = self.positions.get((api_key, symbol), Decimal("0"))
+            signed_qty = qty if side == "BUY" else -qty
+            if reduce_only and (pos == 0 or (pos > 0) == (signed_qty > 0) or abs(signed_qty) > abs(pos)):
+                raise ApiError(400, -2022, "ReduceOnly Order is rejected.")
+            if not reduce_only:
+                lev = self.leverage.get((api_key, symbol), 20)
+                if qty * self.prices[symbol] / lev > self._available(api_key):
+                    raise ApiError(400, -2019, "Margin is insufficient.")
+            order_id = next(self._order_ids)
+            now = int(time.time() * 1000)
+            order = {
+                "orderId": order_id,
+                "symbol": symbol,
+                "status": "NEW",
+                "clientOrderId": client_oid,
+                "price": "0",
+                "avgPrice": "0.00000",
+                "origQty": str(qty),
+                "executedQty": "0",
+                "cumQuote": "0",
+                "type": "MARKET",
+                "reduceOnly": reduce_only,
+                "side": side,
+                "time": now,
+                "updateTime": now
+            }
+            self.orders[(api_key, order_id)] = order
+            self.client_ids[(api_key, client_oid)] = order_id
+            self.stats["orders"] += 1
+        timer = threading.Timer(self.config.fill_delay_ms / 1000, self._fill, args=(api_key, order_id))
+        timer.daemon = True
+        timer.start()
+        return dict(order)
+
+    def _available(self, api_key: str) -> Decimal:
+        wallet = self.wallet.setdefault(api_key, self.config.balance_usdt)
+        used = sum(
+            abs(amt) * self.prices[s] / self.leverage.get((k, s), 20)
+            for (k, s), amt in self.positions.items() if k == api_key
+        )
+        return wallet - used
+
+    def _fill(self, api_key: str, order_id: int):
+        with self.lock:
+            order = self.orders[(api_key, order_id)]
+            symbol = order["symbol"]
+            price = self.prices[symbol]
+            qty = Decimal(order["origQty"])
+            fee = (qty * price * self.config.fee_rate).quantize(Decimal("0.00000001"))
+            key = (api_key, symbol)
+            pos = self.positions.get(key, Decimal("0"))
+            self.positions[key] = pos + (qty if order["side"] == "BUY" else -qty)
+            self.wallet[api_key] = self.wallet.setdefault(api_key, self.config.balance_usdt) - fee
+            now = int(time.time() * 1000)
+            order.update({
+                "status": "FILLED",
+                "avgPrice": str(price),
+                "executedQty": str(qty),
+                "cumQuote": str(qty * price),
+                "updateTime": now
+            })
+            conns = list(self.user_conns.get(api_key, []))
+        event = {
+            "e": "ORDER_TRADE_UPDATE",
+            "E": now,
+            "T": now,
+            "o": {
+                "s": symbol, "c": order["clientOrderId"], "S": order["side"], "o": "MARKET",
+                "q": order["origQty"], "p": "0", "ap": str(price), "x": "TRADE", "X": "FILLED",
+                "i": order_id, "l": str(qty), "z": str(qty), "L": str(price), "n": str(fee), "N": "USDT",
+                "T": now, "R": order["reduceOnly"], "rp": "0"
+            }
+        }
+        for conn in conns:
+            conn.send_json(event)
+
+    def get_order(self, api_key: str, p: dict) -> dict:
+        with self.lock:
+            order_id = int(p["orderId"]) if p.get("orderId") else self.client_ids.get((api_key, p.get("origClientOrderId")))
+            order = self.orders.get((api_key, order_id)) if order_id else None
+            if not order:
+                raise ApiError(400, -2013, "Order does not exist.")
+            return dict(order)
+
+    def position_risk(self, api_key: str) -> list:
+        with self.lock:
+            return [{
+                "symbol": s,
+                "positionAmt": str(self.positions.get((api_key, s), Decimal("0"))),
+                "markPrice": str(self.prices[s]),
+                "leverage": str(self.leverage.get((api_key, s), 20))
+            } for s in self.prices]
+
+    def balance(self, api_key: str) -> list:
+        with self.lock:
+            wallet = self.wallet.setdefault(api_key, self.config.balance_usdt)
+            return [{"asset": "USDT", "balance": str(wallet), "availableBalance": str(self._available(api_key))}]
+
+    def exchange_info(self) -> dict:
+        symbols = []
+        for s in self.prices:
+            step, min_qty, max_qty, precision, tick = SYMBOL_SPECS[s]
+            symbols.append({
+                "symbol": s,
+                "quantityPrecision": precision,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": tick},
+                    {"filterType": "LOT_SIZE", "stepSize": step, "minQty": min_qty, "maxQty": max_qty},
+                    {"filterType": "MARKET_LOT_SIZE", "stepSize": step, "minQty": min_qty, "maxQty": max_qty}
+                ]
+            })
+        return {"serverTime": int(time.time() * 1000), "symbols": symbols}
+
+ROUTES_WEIGHT = {"/fapi/v2/balance": 5, "/fapi/v2/positionRisk": 5, "/fapi/v1/exchangeInfo": 1}
+
+def make_handler(ex: SimExchange):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body, headers: Optional[dict] = None):
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, str(v))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _handle(self):
+            parts = urlsplit(self.path)
+            path = parts.path
+            if self.headers.get("Upgrade", "").lower() == "websocket":
+                return self._websocket(path, parts.query)
+
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode() if length else ""
+            raw_query = body if self.command == "POST" and body else parts.query
+            params = dict(parse_qsl(raw_query))
+            cfg = ex.config
+            delay = cfg.latency_ms + random.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+            # Медленный запрос задерживается до обработки или после неё (ордер уже принят, ответ опаздывает)
+            slow_after = 0.0
+            if cfg.slow_rate and random.random() < cfg.slow_rate:
+                if random.random() < 0.5:
+                    delay += cfg.slow_ms
+                else:
+                    slow_after = cfg.slow_ms
+            time.sleep(max(0.0, delay) / 1000)
+
+            ip = self.client_address[0]
+            headers = {}
+            with ex.lock:
+                ex.stats["requests"] += 1
+            try:
+                used = ex.charge(ip, ROUTES_WEIGHT.get(path, 1))
+                headers["X-MBX-USED-WEIGHT-1M"] = used
+                if cfg.error_rate and random.random() < cfg.error_rate:
+                    with ex.lock:
+                        ex.stats["errors"] += 1
+                    raise ApiError(503, -1001, "Internal error; unable to process your request. Please try again.")
+                result = self._dispatch(path, raw_query, params)
+                time.sleep(slow_after / 1000)
+                self._reply(200, result, headers)
+            except ApiError as e:
+                if e.status == 429:
+                    headers["Retry-After"] = cfg.ban_retry_after_s
+                self._reply(e.status, {"code": e.code, "msg": e.msg}, headers)
+
+        def _dispatch(self, path: str, raw_query: str, p: dict):
+            cmd = self.command
+            if path == "/fapi/v1/ping":
+                return {}
+            if path == "/fapi/v1/time":
+                return {"serverTime": int(time.time() * 1000)}
+            if path == "/fapi/v1/exchangeInfo":
+                return ex.exchange_info()
+            if path == "/fapi/v1/premiumIndex":
+                with ex.lock:
+                    price = ex.prices.get(p.get("symbol"))
+                if price is None:
+                    raise ApiError(400, -1121, "Invalid symbol.")
+                return {"symbol": p["symbol"], "markPrice": str(price), "time": int(time.time() * 1000)}
+            if path == "/fapi/v1/listenKey":
+                api_key = ex.authenticate(self.headers, raw_query, signed=False)
+                with ex.lock:
+                    listen_key = next((k for k, v in ex.listen_keys.items() if v == api_key), None)
+                    if cmd == "DELETE":
+                        ex.listen_keys.pop(listen_key, None)
+                        return {}
+                    if listen_key is None:
+                        listen_key = base64.urlsafe_b64encode(random.randbytes(24)).decode()
+                        ex.listen_keys[listen_key] = api_key
+                return {"listenKey": listen_key}
+
+            api_key = ex.authenticate(self.headers, raw_query, signed=True)
+            if path == "/fapi/v1/order" and cmd == "POST":
+                return ex.new_order(api_key, p)
+            if path == "/fapi/v1/order" and cmd == "GET":
+                return ex.get_order(api_key, p)
+            if path == "/fapi/v1/leverage":
+                with ex.lock:
+                    ex.leverage[(api_key, p["symbol"])] = int(p["leverage"])
+                return {"symbol": p["symbol"], "leverage": int(p["leverage"]), "maxNotionalValue": "1000000"}
+            if path == "/fapi/v2/balance":
+                return ex.balance(api_key)
+            if path == "/fapi/v2/positionRisk":
+                return ex.position_risk(api_key)
+            raise ApiError(404, -1000, f"Unknown endpoint {cmd} {path}")
+
+        def _websocket(self, path: str, query: str):
+            key = self.headers.get("Sec-WebSocket-Key", "")
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.wfile.flush()
+            self.close_connection = True
+
+            conn = WSConnection(self.connection, self.rfile)
+            if path.startswith("/ws/"):
+                with ex.lock:
+                    api_key = ex.listen_keys.get(path[len("/ws/"):])
+                    if api_key is None:
+                        conn.close()
+                        return
+                    ex.user_conns.setdefault(api_key, []).append(conn)
+                try:
+                    conn.serve()
+                finally:
+                    with ex.lock:
+                        ex.user_conns[api_key].remove(conn)
+            elif path == "/stream":
+                streams = dict(parse_qsl(query)).get("streams", "")
+                symbols = {s.split("@")[0].upper() for s in streams.split("/") if s}
+                entry = (conn, symbols)
+                with ex.lock:
+                    ex.mark_subs.append(entry)
+                try:
+                    conn.serve()
+                finally:
+                    with ex.lock:
+                        ex.mark_subs.remove(entry)
+            else:
+                conn.close()
+
+        do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    return Handler
+
+class SimServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+def start_sim(config: SimConfig, host: str = "127.0.0.1", port: int = 0) -> Tuple[SimServer, SimExchange]:
+    ex = SimExchange(config)
+    server = SimServer((host, port), make_handler(ex))
+    threading.Thread(target=server.serve_forever, name="sim-http", daemon=True).start()
+    return server, ex
+
+def parse_args(argv=None) -> Tuple[argparse.Namespace, SimConfig]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--fill-delay-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--weight-limit", type=int, default=0, help="weight per minute per IP, 0 = unlimited")
+    parser.add_argument("--retry-after", type=int, default=2)
+    parser.add_argument("--balance", default="1000")
+    args = parser.parse_args(argv)
+    config = SimConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        fill_delay_ms=args.fill_delay_ms,
+        error_rate=args.error_rate,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        weight_limit_1m=args.weight_limit,
+        ban_retry_after_s=args.retry_after,
+        balance_usdt=Decimal(args.balance)
+    )
+    return args, config
+
+def main():
+    args, config = parse_args()
+    server, ex = start_sim(config, args.host, args.port)
+    print(f"[SIM] Listening on http://{args.host}:{server.server_address[1]} (ws on the same port)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"[SIM] {ex.stats}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,186 @@
-from decimal import Decimal, ROUND_DOWN, getcontext
+from decimal import Decimal, localcontext
+import json
+import os
 import time
 import random
-from typing import List, Dict, Optional
-import requests
+from typing import List, Dict, Optional, Sequence
 
+from config.accounts import Account
 from config.settings import (
     BASE_NOTIONAL_USDT, TOTAL_QTY_JITTER,
     HOLD_TIME_RANGE, BETWEEN_CYCLES_RANGE,
-    DEFAULT_LEVERAGE
+    DEFAULT_LEVERAGE, EXCHANGE_INFO_CACHE_FILE, EXCHANGE_INFO_TTL_S, ORDER_HEDGE_ENABLED
 )
-from network.client import public_get, private_post, private_get
-from utils.formatting import format_float,format_float2
+from network.client import public_get, private_post, private_get, hedged_post, ApiError, DUPLICATE_ORDER_CODE, UNKNOWN_ORDER_CODE
+from network.user_stream import stream_healthy
+from network.price_feed import cached_mark_price, remember_mark_price
+from trading.order_state import order_states, FINAL_STATUSES
+from trading.quantizer import SymbolQuantizer
+from utils.formatting import format_float
 from utils.time_utils import now_ms
+from utils.metrics import FILL_WAIT_SECONDS
+from utils.logger import logger
 
 # === Фильтры по символам ===
 symbol_filters: Dict[str, Dict[str, Decimal]] = {}
+symbol_quantizers: Dict[str, SymbolQuantizer] = {}
 
-def load_symbol_filters(symbol: str):
-    try:
-        info = public_get("/fapi/v1/exchangeInfo", params={"symbol": symbol})
-        
-        symbols = info.get("symbols", [])
-        s = next((x for x in symbols if x.get("symbol") == symbol), None)
-        if not s:
-            print(f"[ERROR] Symbol {symbol} not found in exchangeInfo response.")
-            return
-
-        
-        filters = s.get("filters", [])
-        quantity_precision = int(s.get("quantityPrecision", 2))  # ← вот он
-
-        market_lot = next((f for f in filters if f.get("filterType") == "MARKET_LOT_SIZE"), None)
-        lot = next((f for f in filters if f.get("filterType") == "LOT_SIZE"), None)
-        qty_filter = market_lot or lot
-
-        price_filter = next((f for f in filters if f.get("filterType") == "PRICE_FILTER"), None)
-        tick_size = Decimal(str(price_filter["tickSize"])) if price_filter else Decimal("0.0001")
-
-        if qty_filter:
-            step_size = Decimal(str(qty_filter["stepSize"]))
-            min_qty = Decimal(str(qty_filter["minQty"]))
-            max_qty = Decimal(str(qty_filter["maxQty"]))
-
-            symbol_filters[symbol] = {
-                "LOT_STEP": step_size,
-                "MIN_QTY": min_qty,
-                "MAX_QTY": max_qty,
-                "TICK_SIZE": tick_size,
-                "QTY_PRECISION": quantity_precision
-            }
+def parse_symbol_filters(s: dict) -> Optional[Dict[str, Decimal]]:
+    filters = s.get("filters", [])
+    quantity_precision = int(s.get("quantityPrecision", 2))
 
-            print(f"[FILTERS] {symbol}: step={step_size}, tick={tick_size}, precision={quantity_precision}, min={min_qty}, max={max_qty}")
-        else:
-            print(f"[FILTERS] {symbol}: No valid LOT_SIZE or MARKET_LOT_SIZE found")
-    except Exception as e:
-        print(f"[load_symbol_filters] Warning for {symbol}: {type(e).__name__} → {e}")
+    market_lot = next((f for f in filters if f.get("filterType") == "MARKET_LOT_SIZE"), None)
+    lot = next((f for f in filters if f.get("filterType") == "LOT_SIZE"), None)
+    qty_filter = market_lot or lot
+    if not qty_filter:
+        return None
 
-def get_mark_price(symbol: str) -> Decimal:
-    url = f"https://fapi.asterdex.com/fapi/v1/premiumIndex"
-    resp = requests.get(url, params={"symbol": symbol}, timeout=5)
-    data = resp.json()
-    return Decimal(data["markPrice"])
+    price_filter = next((f for f in filters if f.get("filterType") == "PRICE_FILTER"), None)
+    tick_size = Decimal(str(price_filter["tickSize"])) if price_filter else Decimal("0.0001")
 
-def adjust_qty(q: Decimal, symbol: str) -> Decimal:
-    f = symbol_filters.get(symbol)
-    if not f:
-        raise RuntimeError(f"No filters loaded for symbol {symbol}")
-    LOT_STEP = f["LOT_STEP"]
-    MIN_QTY = f["MIN_QTY"]
-    MAX_QTY = f["MAX_QTY"]
-    QTY_PRECISION = f.get("QTY_PRECISION")
+    return {
+        "LOT_STEP": Decimal(str(qty_filter["stepSize"])),
+        "MIN_QTY": Decimal(str(qty_filter["minQty"])),
+        "MAX_QTY": Decimal(str(qty_filter["maxQty"])),
+        "TICK_SIZE": tick_size,
+        "QTY_PRECISION": quantity_precision
+    }
 
-    if q <= 0:
-        return Decimal("0")
+def _read_exchange_info_cache(symbols: List[str], max_age: Optional[float]) -> Optional[Dict[str, dict]]:
+    try:
+        with open(EXCHANGE_INFO_CACHE_FILE, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if max_age is not None and time.time() - cached.get("fetched_at", 0) > max_age:
+        return None
+    entries = cached.get("symbols", {})
+    if any(sym not in entries for sym in symbols):
+        return None
+    return entries
 
+def _write_exchange_info_cache(entries: Dict[str, dict]):
+    os.makedirs(os.path.dirname(EXCHANGE_INFO_CACHE_FILE) or ".", exist_ok=True)
+    tmp = f"{EXCHANGE_INFO_CACHE_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fetched_at": time.time(), "symbols": entries}, f)
+    os.replace(tmp, EXCHANGE_INFO_CACHE_FILE)
 
-    adj = (q // LOT_STEP) * LOT_STEP
+def load_all_symbol_filters(symbols: List[str]):
+    """Один запрос exchangeInfo на все символы; при свежем кэше на диске — без сети."""
+    entries = _read_exchange_info_cache(symbols, EXCHANGE_INFO_TTL_S)
+    if entries is None:
+        try:
+            info = public_get("/fapi/v1/exchangeInfo")
+            entries = {
+                x["symbol"]: {"quantityPrecision": x.get("quantityPrecision"), "filters": x.get("filters", [])}
+                for x in info.get("symbols", []) if x.get("symbol")
+            }
+            _write_exchange_info_cache(entries)
+        except Exception as e:
+            print(f"[load_symbol_filters] Warning: {type(e).__name__} → {e}")
+            # Биржа недоступна — лучше устаревшие фильтры, чем никаких
+            entries = _read_exchange_info_cache(symbols, None) or {}
+            if entries:
+                print("[FILTERS] Using stale exchangeInfo cache")
 
-    if adj < MIN_QTY:
-        adj = MIN_QTY
-    if adj > MAX_QTY:
-        adj = MAX_QTY
+    for symbol in symbols:
+        s = entries.get(symbol)
+        if not s:
+            print(f"[ERROR] Symbol {symbol} not found in exchangeInfo response.")
+            continue
+        f = parse_symbol_filters(s)
+        if not f:
+            print(f"[FILTERS] {symbol}: No valid LOT_SIZE or MARKET_LOT_SIZE found")
+            continue
+        symbol_filters[symbol] = f
+        symbol_quantizers[symbol] = SymbolQuantizer.from_filters(symbol, f)
+        print(f"[FILTERS] {symbol}: step={f['LOT_STEP']}, tick={f['TICK_SIZE']}, precision={f['QTY_PRECISION']}, "
+              f"min={f['MIN_QTY']}, max={f['MAX_QTY']}")
 
-    precision_format = Decimal(f"1e-{QTY_PRECISION}")
-    adj = adj.quantize(precision_format, rounding=ROUND_DOWN)
+def load_symbol_filters(symbol: str):
+    load_all_symbol_filters([symbol])
 
-    return adj
+def get_mark_price(symbol: str) -> Decimal:
+    price = cached_mark_price(symbol)
+    if price is not None:
+        return price
+    # Fallback: поток не подключён или цена устарела
+    try:
+        data = public_get("/fapi/v1/premiumIndex", params={"symbol": symbol})
+        price = Decimal(str(data["markPrice"]))
+    except Exception as e:
+        raise RuntimeError(f"Mark price unavailable for {symbol}: {type(e).__name__} → {e}")
+    remember_mark_price(symbol, price)
+    return price
+
+def get_quantizer(symbol: str) -> SymbolQuantizer:
+    q = symbol_quantizers.get(symbol)
+    if q is None:
+        raise RuntimeError(f"No filters loaded for symbol {symbol}")
+    return q
+
+def adjust_qty(q: Decimal, symbol: str) -> Decimal:
+    return get_quantizer(symbol).adjust(q)
 
 
 # === Ордеры ===
-def place_market_order(account: Dict[str, str], side: str, quantity: Decimal, reduce_only: bool=False, symbol: str = "ETHUSDT") -> dict:
-    adj_qty = adjust_qty(quantity, symbol)
-    
-    f = symbol_filters[symbol]
-   
-    print(format_float2(adj_qty, f["QTY_PRECISION"]))
-    if adj_qty < f["MIN_QTY"]:
-        raise ValueError(f"Adjusted qty {adj_qty} < MIN_QTY {f['MIN_QTY']}")
+def client_order_id(cycle_id: str, phase: str, leg: int, attempt: int = 1) -> str:
+    """Детерминированный newClientOrderId ноги. Биржа отклонит повтор id, только пока ордер
+    открыт; исполненный ордер находит по нему submit_order(lookup=True)."""
+    oid = f"{cycle_id}-{phase}{leg}"
+    return oid if attempt == 1 else f"{oid}-{attempt}"
+
+def place_market_order(account: Account, side: str, quantity: Decimal, reduce_only: bool=False, symbol: str = "ETHUSDT",
+                       client_oid: Optional[str] = None) -> dict:
+    quantizer = get_quantizer(symbol)
+    adj_qty = quantizer.adjust(quantity)
+    if adj_qty < quantizer.min_qty:
+        raise ValueError(f"Adjusted qty {adj_qty} < MIN_QTY {quantizer.min_qty}")
     params = {
         "symbol": symbol,
         "side": side,
         "type": "MARKET",
-        "quantity": format_float2(adj_qty, f["QTY_PRECISION"]),
+        "quantity": quantizer.format(adj_qty),
         "recvWindow": 10000
     }
     if reduce_only:
         params["reduceOnly"] = "true"
+    if client_oid:
+        params["newClientOrderId"] = client_oid
+        # Хеджировать можно только идемпотентный запрос и только через другой прокси
+        if ORDER_HEDGE_ENABLED and len(account.proxies) > 1:
+            return hedged_post("/fapi/v1/order", account, params)
     return private_post("/fapi/v1/order", account, params)
 
-def set_leverage(account: Dict[str, str], symbol: str, leverage: int):
+def find_order(account: Account, client_oid: str, symbol: str) -> Optional[dict]:
+    """Ордер по origClientOrderId; None — биржа его не получала."""
+    try:
+        return get_order_status(account, client_oid=client_oid, symbol=symbol)
+    except ApiError as e:
+        if e.code == UNKNOWN_ORDER_CODE:
+            return None
+        raise
+
+def submit_order(account: Account, side: str, quantity: Decimal, client_oid: str, reduce_only: bool = False,
+                 symbol: str = "ETHUSDT", lookup: bool = False) -> dict:
+    """Идемпотентная отправка: с `lookup` (прошлая попытка с этим id могла дойти до биржи)
+    сначала ищет ордер по client id; на отказ-дубликат — тоже возвращает найденный ордер."""
+    if lookup:
+        existing = find_order(account, client_oid, symbol)
+        if existing:
+            return existing
+    try:
+        return place_market_order(account, side, quantity, reduce_only, symbol, client_oid)
+    except ApiError as e:
+        if e.code != DUPLICATE_ORDER_CODE:
+            raise
+        existing = find_order(account, client_oid, symbol)
+        if existing is None:
+            raise
+        return existing
+
+def set_leverage(account: Account, symbol: str, leverage: int):
     try:
         params = {
             "symbol": symbol,
@@ -116,12 +188,12 @@ def set_leverage(account: Dict[str, str], symbol: str, leverage: int):
             "recvWindow": 10000
         }
         resp = private_post("/fapi/v1/leverage", account, params)
-        print(f"[LEVERAGE] {account.get('name', '???')} | {symbol} → set to {leverage}")
+        print(f"[LEVERAGE] {account.name} | {symbol} → set to {leverage}")
         return resp
     except Exception as e:
-        print(f"[LEVERAGE] Failed for {account.get('name', '???')} | {symbol}: {e}")
+        print(f"[LEVERAGE] Failed for {account.name} | {symbol}: {e}")
 
-def get_order_status(account: Dict[str, str], order_id: Optional[int] = None, client_oid: Optional[str] = None, symbol: str = "ETHUSDT") -> dict:
+def get_order_status(account: Account, order_id: Optional[int] = None, client_oid: Optional[str] = None, symbol: str = "ETHUSDT") -> dict:
     params = {"symbol": symbol}
     if order_id:
         params["orderId"] = order_id
@@ -129,36 +201,71 @@ def get_order_status(account: Dict[str, str], order_id: Optional[int] = None, cl
         params["origClientOrderId"] = client_oid
     return private_get("/fapi/v1/order", account, params)
 
-def wait_for_fill(account: Dict[str, str], order_id: Optional[int] = None, client_oid: Optional[str] = None,
+def wait_for_fill(account: Account, order_id: Optional[int] = None, client_oid: Optional[str] = None,
                   timeout_s: float = 10, symbol: str = "ETHUSDT") -> dict:
     start = time.time()
+    try:
+        return _wait_for_fill(account, order_id, client_oid, timeout_s, symbol, start)
+    finally:
+        FILL_WAIT_SECONDS.observe(time.time() - start, source="stream" if stream_healthy(account) else "rest")
+
+def _wait_for_fill(account: Account, order_id: Optional[int], client_oid: Optional[str],
+                   timeout_s: float, symbol: str, start: float) -> dict:
     last = {}
-    while time.time() - start < timeout_s:
+    pushed = False
+    while (remaining := timeout_s - (time.time() - start)) > 0:
+        if stream_healthy(account):
+            # Push: ждём ORDER_TRADE_UPDATE из user-data stream, здоровье потока проверяем раз в секунду
+            pushed = True
+            state = order_states.wait_final(account.api_key, order_id, client_oid, timeout_s=min(1.0, remaining))
+            if state:
+                last = state
+                if last.get("status") in FINAL_STATUSES:
+                    order_states.forget(account.api_key, last["orderId"])
+                    return last
+            continue
+        # Fallback: REST-опрос, пока поток недоступен
         try:
             last = get_order_status(account, order_id, client_oid, symbol=symbol)
             if last.get("status", "").upper() == "FILLED":
+                order_states.forget(account.api_key, last["orderId"])
                 return last
         except Exception as e:
-            print(f"[wait_for_fill] warning: {e}")
-        time.sleep(1)
+            logger.warning("[wait_for_fill] status poll failed: %s", e)
+        time.sleep(min(1.0, remaining))
+    if pushed:
+        # Событие могло потеряться при переподключении — последняя сверка по REST
+        try:
+            last = get_order_status(account, order_id, client_oid, symbol=symbol)
+            if last.get("status") in FINAL_STATUSES:
+                order_states.forget(account.api_key, last["orderId"])
+        except Exception as e:
+            logger.warning("[wait_for_fill] final status check failed: %s", e)
     return last
 
 # === Стратегия ===
-def choose_total_qty(mark_price: Decimal, leverage: int = DEFAULT_LEVERAGE) -> Decimal:
+def choose_total_qty(mark_price: Decimal, leverage: int = DEFAULT_LEVERAGE,
+                     max_notional: Optional[Decimal] = None) -> Decimal:
+    """`max_notional` — предел объёма цикла по марже аккаунтов (см. fit_legs)."""
     factor = Decimal(str(random.uniform(float(1 - TOTAL_QTY_JITTER), float(1 + TOTAL_QTY_JITTER))))
     if BASE_NOTIONAL_USDT:
         raw_qty = (BASE_NOTIONAL_USDT * leverage) / mark_price
     else:
         raw_qty = Decimal("0")
-    return raw_qty * factor
+    qty = raw_qty * factor
+    if max_notional is not None and qty * mark_price > max_notional:
+        qty = max_notional / mark_price
+    return qty
 
 def sample_legs() -> List[Dict[str, Decimal]]:
-    getcontext().prec = 10
+    # Локальный контекст: глобальная точность Decimal не должна меняться
+    with localcontext() as ctx:
+        ctx.prec = 10
 
-    buy_raw = [Decimal(str(random.uniform(0.1, 1.0))) for _ in range(2)]
-    buy_total = sum(buy_raw)
+        buy_raw = [Decimal(str(random.uniform(0.1, 1.0))) for _ in range(2)]
+        buy_total = sum(buy_raw)
 
-    buy_shares = [r / buy_total * Decimal("0.5") for r in buy_raw]
+        buy_shares = [r / buy_total * Decimal("0.5") for r in buy_raw]
 
 
     return [
@@ -167,6 +274,24 @@ def sample_legs() -> List[Dict[str, Decimal]]:
         {"side": "SELL", "share": Decimal("0.5")},
     ]
 
+def legs_notional_limit(legs: List[Dict[str, Decimal]], budgets: Sequence[Optional[Decimal]]) -> Optional[Decimal]:
+    """Наибольший объём цикла, при котором каждая нога помещается в `budgets[i]` (None — без предела)."""
+    caps = [b / leg["share"] for b, leg in zip(budgets, legs) if b is not None]
+    return min(caps) if caps else None
+
+def fit_legs(legs: List[Dict[str, Decimal]], budgets: Sequence[Optional[Decimal]],
+             notional: Decimal) -> List[Dict[str, Decimal]]:
+    """Ноги по аккаунтам под их свободную маржу. Случайный порядок сохраняется, если
+    в него помещается `notional`; иначе крупные доли — аккаунтам с большим запасом."""
+    limit = legs_notional_limit(legs, budgets)
+    if limit is None or limit >= notional:
+        return legs
+    by_budget = sorted(range(len(budgets)), key=lambda i: budgets[i] if budgets[i] is not None else Decimal("Infinity"))
+    fitted = [None] * len(legs)
+    for i, leg in zip(by_budget, sorted(legs, key=lambda x: x["share"])):
+        fitted[i] = leg
+    return fitted if legs_notional_limit(fitted, budgets) > limit else legs
+
 def random_hold_time() -> int:
     return random.randint(*HOLD_TIME_RANGE)
 
@@ -175,7 +300,8 @@ def random_between_pause() -> int:
 
 # === Экспортируемые функции ===
 __all__ = [
-    "load_symbol_filters", "adjust_qty", "place_market_order", "get_order_status", "wait_for_fill",
-    "choose_total_qty", "sample_legs", "random_hold_time", "random_between_pause", "get_mark_price",
-    "symbol_filters", "set_leverage"
+    "load_symbol_filters", "load_all_symbol_filters", "get_quantizer", "adjust_qty", "place_market_order", "get_order_status", "wait_for_fill",
+    "client_order_id", "find_order", "submit_order",
+    "choose_total_qty", "sample_legs", "fit_legs", "legs_notional_limit", "random_hold_time", "random_between_pause", "get_mark_price",
+    "symbol_filters", "symbol_quantizers", "set_leverage"
 ]
\ No newline at end of file
@@ -0,0 +1,176 @@
+import threading
+import weakref
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from config.accounts import Account
+from config.settings import (
+    MARGIN_LEDGER_ENABLED, MARGIN_LEDGER_BUFFER, MIN_AVAILABLE_BALANCE_USDT, BASE_NOTIONAL_USDT, TOTAL_QTY_JITTER
+)
+from network.client import private_get
+from utils.logger import logger
+
+ZERO = Decimal("0")
+
+def min_free_margin() -> Decimal:
+    """Меньше — аккаунт не обеспечит крупную ногу цикла (половина объёма при максимальном разбросе)."""
+    if not MARGIN_LEDGER_ENABLED:
+        return MIN_AVAILABLE_BALANCE_USDT
+    return max(MIN_AVAILABLE_BALANCE_USDT, BASE_NOTIONAL_USDT * (1 + TOTAL_QTY_JITTER) / 2 * (1 + MARGIN_LEDGER_BUFFER))
+
+class MarginLedger:
+    """Локальный учёт аккаунтов для проверок до отправки ордера: свободная маржа,
+    маржа и позиции по парам, плечо.
+
+    Заполняется при запуске (runner.bootstrap) из /fapi/v2/balance и positionRisk,
+    дальше меняется по исполнениям ног. Свободный остаток пишется в `acct.balance` и
+    передаётся подписчикам (`subscribe`) — так AccountRegistry откладывает аккаунты
+    и возвращает их в очередь. Отказ биржи по марже или reduceOnly
+    означает, что учёт разошёлся с биржей: `reconcile` перечитывает аккаунт по REST.
+    Аккаунт, которого в учёте нет, проверки пропускают.
+    """
+
+    def __init__(self):
+        self._books: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[weakref.WeakMethod] = []
+
+    def subscribe(self, callback: Callable[[Account, Decimal], None]):
+        """callback(acct, free) на каждое изменение свободной маржи; метод объекта, ссылка слабая."""
+        with self._lock:
+            self._listeners.append(weakref.WeakMethod(callback))
+
+    def _publish(self, acct: Account, free: Decimal):
+        # Вне self._lock: подписчик берёт свои блокировки
+        acct.balance = free
+        with self._lock:
+            self._listeners = [ref for ref in self._listeners if ref() is not None]
+            callbacks = [ref() for ref in self._listeners]
+        for callback in callbacks:
+            if callback is not None:
+                callback(acct, free)
+
+    def seed(self, acct: Account, balances: List[dict], positions: List[dict]):
+        """Ответы /fapi/v2/balance и /fapi/v2/positionRisk аккаунта."""
+        if not MARGIN_LEDGER_ENABLED:
+            return
+        usdt = next((b for b in balances if b.get("asset") == "USDT"), {})
+        book = {"free": Decimal(str(usdt.get("availableBalance", "0"))), "positions": {}, "entry": {},
+                "margin": {}, "leverage": {}}
+        for p in positions:
+            symbol = p["symbol"]
+            leverage = int(p.get("leverage") or 0)
+            book["leverage"][symbol] = leverage
+            amt = Decimal(str(p.get("positionAmt", "0")))
+            if amt == 0:
+                continue
+            mark = Decimal(str(p.get("markPrice") or "0"))
+            entry = Decimal(str(p.get("entryPrice") or "0")) or mark
+            book["positions"][symbol] = amt
+            book["entry"][symbol] = entry
+            book["margin"][symbol] = abs(amt) * mark / leverage if leverage else ZERO
+        with self._lock:
+            self._books[acct.api_key] = book
+        self._publish(acct, book["free"])
+
+    def set_leverage(self, acct: Account, symbol: str, leverage: int):
+        with self._lock:
+            book = self._books.get(acct.api_key)
+            if book is not None:
+                book["leverage"][symbol] = leverage
+
+    def reconcile(self, acct: Account):
+        """Перечитать аккаунт с биржи (после отказа, который учёт не предвидел)."""
+        if acct.api_key not in self._books:
+            return
+        try:
+            self.seed(acct, private_get("/fapi/v2/balance", acct), private_get("/fapi/v2/positionRisk", acct))
+            logger.info("[LEDGER] %s: re-synced, free margin %.2f USDT", acct.name, acct.balance)
+        except Exception as e:
+            logger.warning("[LEDGER] %s: re-sync failed: %s → %s", acct.name, type(e).__name__, e)
+
+    def free(self, acct: Account) -> Optional[Decimal]:
+        with self._lock:
+            book = self._books.get(acct.api_key)
+            return book["free"] if book is not None else None
+
+    def position(self, acct: Account, symbol: str) -> Optional[Decimal]:
+        with self._lock:
+            book = self._books.get(acct.api_key)
+            return book["positions"].get(symbol, ZERO) if book is not None else None
+
+    def max_notional(self, acct: Account, leverage: int) -> Optional[Decimal]:
+        """Наибольший notional новой позиции, который аккаунт обеспечит маржой; None — аккаунт не учитывается."""
+        free = self.free(acct)
+        if free is None:
+            return None
+        return max(ZERO, free) * leverage / (1 + MARGIN_LEDGER_BUFFER)
+
+    def check_open(self, acct: Account, symbol: str, qty: Decimal, price: Decimal, leverage: int) -> Optional[str]:
+        """Причина, по которой биржа отклонит открытие; None — можно отправлять."""
+        with self._lock:
+            book = self._books.get(acct.api_key)
+            if book is None:
+                return None
+            current = book["leverage"].get(symbol)
+            if current and current != leverage:
+                return f"leverage {current}x on the account, cycle planned for {leverage}x"
+            required = qty * price / leverage * (1 + MARGIN_LEDGER_BUFFER)
+            if required > book["free"]:
+                return f"margin {required:.2f} USDT > free {book['free']:.2f} USDT"
+        return None
+
+    def check_reduce(self, acct: Account, symbol: str, side: str, qty: Decimal) -> Optional[str]:
+        """Причина отказа reduceOnly-ордера: позиции нет, она в ту же сторону или меньше qty."""
+        pos = self.position(acct, symbol)
+        if pos is None:
+            return None
+        if pos == 0 or (pos > 0) == (side == "BUY"):
+            return f"no {'short' if side == 'BUY' else 'long'} position to reduce (position {pos})"
+        if qty > abs(pos):
+            return f"qty {qty} > position {abs(pos)}"
+        return None
+
+    def apply_fill(self, acct: Account, symbol: str, side: str, order: dict):
+        """Исполнение ордера (executedQty, avgPrice, commission — если пришла из user-data stream в USDT)."""
+        qty = Decimal(str(order.get("executedQty") or "0"))
+        price = Decimal(str(order.get("avgPrice") or "0"))
+        if not qty or not price:
+            return
+        with self._lock:
+            book = self._books.get(acct.api_key)
+            if book is None:
+                return
+            leverage = book["leverage"].get(symbol) or 1
+            pos = book["positions"].get(symbol, ZERO)
+            margin = book["margin"].get(symbol, ZERO)
+            delta = qty if side == "BUY" else -qty
+            opened = qty
+            if pos and (pos > 0) != (delta > 0):
+                # Сокращение: освобождается доля маржи, разница с ценой входа — в реализованный PnL
+                closed = min(qty, abs(pos))
+                released = margin * closed / abs(pos)
+                pnl = (price - book["entry"][symbol]) * closed * (1 if pos > 0 else -1)
+                margin -= released
+                book["free"] += released + pnl
+                opened = qty - closed
+            if opened:
+                held = abs(pos) if pos and (pos > 0) == (delta > 0) else ZERO
+                book["entry"][symbol] = (book["entry"].get(symbol, price) * held + price * opened) / (held + opened)
+                added = opened * price / leverage
+                margin += added
+                book["free"] -= added
+            if order.get("commission") is not None:
+                book["free"] -= Decimal(str(order["commission"]))
+            pos += delta
+            if pos == 0:
+                book["positions"].pop(symbol, None)
+                book["margin"].pop(symbol, None)
+                book["entry"].pop(symbol, None)
+            else:
+                book["positions"][symbol] = pos
+                book["margin"][symbol] = margin
+            free = book["free"]
+        self._publish(acct, free)
+
+margin_ledger = MarginLedger()
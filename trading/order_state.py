@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from config.settings import ORDER_STATE_TTL_S, ORDER_STATE_MAX
+
+FINAL_STATUSES = {"FILLED", "CANCELED", "EXPIRED", "REJECTED"}
+
+class OrderStateTable:
+    """Состояние ордеров из user-data stream, в формате ответа GET /fapi/v1/order.
+
+    Ключ — (api_key, orderId); дополнительно индекс по clientOrderId. Потоки
+    ног ждут финального статуса через `wait_final`. События приходят и по ордерам,
+    которых никто не ждёт (исполнен в ответе POST, найден REST-опросом): ордер с
+    финальным статусом удаляется через `ttl_s`, таблица не больше `max_orders`.
+    """
+
+    def __init__(self, ttl_s: float = ORDER_STATE_TTL_S, max_orders: int = ORDER_STATE_MAX):
+        self.ttl_s = ttl_s
+        self.max_orders = max_orders
+        self._orders: "OrderedDict[Tuple[str, int], dict]" = OrderedDict()
+        self._by_client_id: Dict[Tuple[str, str], int] = {}
+        # Ключ → время финального статуса, в порядке завершения
+        self._finished: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    def apply_update(self, api_key: str, o: dict):
+        """Применяет поле `o` события ORDER_TRADE_UPDATE."""
+        order_id = int(o["i"])
+        key = (api_key, order_id)
+        now = time.time()
+        with self._cond:
+            self._evict(now)
+            state = self._orders.get(key)
+            if state is None:
+                while len(self._orders) >= self.max_orders:
+                    self._drop(next(iter(self._orders)))
+                state = {"orderId": order_id, "commission": "0", "realizedPnl": "0"}
+                self._orders[key] = state
+            state.update({
+                "symbol": o.get("s"),
+                "clientOrderId": o.get("c"),
+                "side": o.get("S"),
+                "status": o.get("X"),
+                "executedQty": o.get("z"),
+                "avgPrice": o.get("ap"),
+                "reduceOnly": o.get("R"),
+                "updateTime": o.get("T")
+            })
+            if o.get("x") == "TRADE":
+                if state["commission"] is not None and o.get("N") == "USDT":
+                    state["commission"] = str(Decimal(state["commission"]) + Decimal(str(o.get("n") or "0")))
+                else:
+                    # Комиссия в другом активе (скидка при оплате BNB и т.п.): в USDT неизвестна, как в ответе REST
+                    state["commission"] = None
+                state["commissionAsset"] = o.get("N")
+                state["realizedPnl"] = str(Decimal(state["realizedPnl"]) + Decimal(str(o.get("rp") or "0")))
+            if state["clientOrderId"]:
+                self._by_client_id[(api_key, state["clientOrderId"])] = order_id
+            if state["status"] in FINAL_STATUSES:
+                self._finished[key] = now
+                self._finished.move_to_end(key)
+            self._cond.notify_all()
+
+    def _evict(self, now: float):
+        while self._finished:
+            key, finished_at = next(iter(self._finished.items()))
+            if finished_at >= now - self.ttl_s:
+                break
+            self._drop(key)
+
+    def _drop(self, key: Tuple[str, int]):
+        self._finished.pop(key, None)
+        state = self._orders.pop(key, None)
+        if state and state.get("clientOrderId"):
+            self._by_client_id.pop((key[0], state["clientOrderId"]), None)
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._orders)
+
+    def get(self, api_key: str, order_id: Optional[int] = None, client_oid: Optional[str] = None) -> Optional[dict]:
+        with self._cond:
+            return self._lookup(api_key, order_id, client_oid)
+
+    def _lookup(self, api_key: str, order_id: Optional[int], client_oid: Optional[str]) -> Optional[dict]:
+        if order_id is None and client_oid:
+            order_id = self._by_client_id.get((api_key, client_oid))
+        if order_id is None:
+            return None
+        state = self._orders.get((api_key, int(order_id)))
+        return dict(state) if state else None
+
+    def wait_final(self, api_key: str, order_id: Optional[int] = None, client_oid: Optional[str] = None,
+                   timeout_s: float = 10) -> Optional[dict]:
+        """Ждёт финального статуса ордера. Возвращает последнее известное состояние или None."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: (self._lookup(api_key, order_id, client_oid) or {}).get("status") in FINAL_STATUSES,
+                timeout=timeout_s
+            )
+            return self._lookup(api_key, order_id, client_oid)
+
+    def forget(self, api_key: str, order_id: int):
+        with self._cond:
+            self._drop((api_key, int(order_id)))
+
+order_states = OrderStateTable()
@@ -0,0 +1,228 @@
+"""Дневной план циклов к цели объёма: размер, доли ног, удержание, пара, время старта
+и тройка аккаунтов для каждого цикла до конца суток (UTC) — одним векторным проходом NumPy.
+
+Цель аккаунта — DAILY_VOLUME_TARGET_USDT в сутки, но не больше объёма, комиссия с
+которого укладывается в DAILY_FEE_BUDGET_USDT. Сделанное за день при запуске берётся
+из истории исполнений (utils.fill_store), дальше — из исполнений ног. Аккаунты
+выбираются с весом по недобранному объёму; объём цикла ограничен свободной маржей
+(trading.ledger). CycleScheduler берёт циклы по времени старта; несыгранная часть
+плана пересчитывается раз в PLANNER_REPLAN_INTERVAL_S и раньше — если факт разошёлся
+с планом больше чем на PLANNER_REPLAN_DRIFT.
+"""
+import threading
+import time
+from decimal import Decimal
+from typing import Collection, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config.accounts import Account
+from config.settings import (
+    BASE_NOTIONAL_USDT, TOTAL_QTY_JITTER, DEFAULT_LEVERAGE, HOLD_TIME_RANGE, BETWEEN_CYCLES_RANGE,
+    DAILY_VOLUME_TARGET_USDT, DAILY_FEE_BUDGET_USDT, TAKER_FEE_RATE, PLANNER_REPLAN_INTERVAL_S, PLANNER_REPLAN_DRIFT
+)
+from trading.ledger import margin_ledger, min_free_margin
+from utils.fill_store import fill_store
+from utils.logger import logger
+
+DAY_S = 86400
+LEGS = 3
+# Элементов матрицы весов (циклы × аккаунты) за один проход выбора троек
+CHUNK_CELLS = 4_000_000
+
+def draw_triples(rng: np.random.Generator, weights: np.ndarray, n: int) -> np.ndarray:
+    """n троек разных аккаунтов, вероятность попадания ∝ весу (Gumbel top-k); порядок внутри тройки случайный."""
+    with np.errstate(divide="ignore"):
+        log_w = np.log(weights)
+    rows = max(1, CHUNK_CELLS // len(weights))
+    out = np.empty((n, LEGS), dtype=np.int64)
+    for lo in range(0, n, rows):
+        m = min(rows, n - lo)
+        keys = log_w + rng.gumbel(size=(m, len(weights)))
+        top = np.argpartition(-keys, LEGS - 1, axis=1)[:, :LEGS]
+        out[lo:lo + m] = rng.permuted(top, axis=1)
+    return out
+
+class DayPlanner:
+    def __init__(self):
+        self.accounts: List[Account] = []
+        self.symbols: List[str] = []
+        self.slots = 1
+        self.day: Optional[int] = None
+        self.done = np.zeros(0)         # объём аккаунтов за день, USDT
+        self.fees = np.zeros(0)         # комиссии аккаунтов за день, USDT
+        self._index: Dict[str, int] = {}
+        self._rng = np.random.default_rng()
+        self._lock = threading.Lock()
+        self._plan: Optional[Dict[str, np.ndarray]] = None
+        self._generation = 0            # номер плана: pop() после пересчёта не сдвигает новый план
+        self._cursor = 0
+        self._planned_at = 0.0
+        self._base_done = 0.0
+        self._cum_volume = np.zeros(0)
+
+    def start(self, accounts: Sequence[Account], symbols: Sequence[str], slots: int, seed: Optional[int] = None):
+        self.accounts = list(accounts)
+        self.symbols = list(symbols)
+        self.slots = slots
+        self._index = {a.name: i for i, a in enumerate(self.accounts)}
+        self._rng = np.random.default_rng(seed)
+        self.replan(time.time())
+
+    # === Факт ===
+    def _load_day(self, day_start: int):
+        """Объём и комиссии аккаунтов с начала суток — из колоночной истории исполнений."""
+        self.day = day_start
+        self.done = np.zeros(len(self.accounts))
+        self.fees = np.zeros(len(self.accounts))
+        total = fill_store.rows()
+        if not total:
+            return
+        # История дописывается по времени: начало суток — бинарным поиском по ts
+        first = int(np.searchsorted(fill_store.read()["ts"], day_start * 1000))
+        if first >= total:
+            return
+        cols = fill_store.read(first, total)
+        names = fill_store.load_names().get("account", [])
+        lookup = np.array([self._index.get(n, -1) for n in names] or [-1], dtype=np.int64)
+        acc = lookup[np.asarray(cols["account"])]
+        mine = acc >= 0
+        volume = np.asarray(cols["qty"]) * np.asarray(cols["price"])
+        fee = np.asarray(cols["fee"])
+        fee = np.where(np.isnan(fee), volume * float(TAKER_FEE_RATE), fee)
+        self.done = np.bincount(acc[mine], weights=volume[mine], minlength=len(self.accounts))
+        self.fees = np.bincount(acc[mine], weights=fee[mine], minlength=len(self.accounts))
+
+    def record_fill(self, name: str, order: dict):
+        """Исполнение ноги: executedQty × avgPrice в объём, commission (или оценка по TAKER_FEE_RATE) — в комиссии."""
+        i = self._index.get(name)
+        if i is None:
+            return
+        volume = float(order.get("executedQty") or 0) * float(order.get("avgPrice") or 0)
+        fee = order.get("commission")
+        with self._lock:
+            if self.day != int(time.time()) // DAY_S * DAY_S:
+                return      # новые сутки: учтёт пересчёт плана
+            self.done[i] += volume
+            self.fees[i] += float(fee) if fee is not None else volume * float(TAKER_FEE_RATE)
+
+    # === План ===
+    def remaining(self) -> np.ndarray:
+        """Недобранный за сутки объём аккаунтов с учётом бюджета комиссий."""
+        rate = float(TAKER_FEE_RATE)
+        fee_left = np.maximum(float(DAILY_FEE_BUDGET_USDT) - self.fees, 0.0)
+        return np.maximum(np.minimum(float(DAILY_VOLUME_TARGET_USDT) - self.done, fee_left / rate), 0.0)
+
+    def replan(self, now: float):
+        """Несыгранная часть плана заменяется новой — от `now` до конца суток."""
+        day_start = int(now) // DAY_S * DAY_S
+        with self._lock:
+            if day_start != self.day:
+                self._load_day(day_start)
+            remaining = self.remaining()
+            done_total = float(self.done.sum())
+
+        leverage = DEFAULT_LEVERAGE
+        free = np.array([float(f) if (f := margin_ledger.free(a)) is not None else np.inf for a in self.accounts])
+        budget = np.array([float(b) if (b := margin_ledger.max_notional(a, leverage)) is not None else np.inf
+                           for a in self.accounts])
+        eligible = free >= float(min_free_margin())
+        weights = np.where(eligible, remaining, 0.0)
+        mean_notional = float(BASE_NOTIONAL_USDT) * leverage
+        cycle_s = sum(HOLD_TIME_RANGE) / 2 + sum(BETWEEN_CYCLES_RANGE) / 2
+        horizon = day_start + DAY_S - now
+
+        # Объём цикла по всем аккаунтам — открытие и закрытие всех ног, т.е. 2 × notional
+        needed = int(np.ceil(weights.sum() / (2 * mean_notional)))
+        capacity = int(self.slots * horizon / max(cycle_s, 1.0))
+        n = min(needed, capacity) if np.count_nonzero(weights) >= LEGS else 0
+
+        rng = self._rng
+        starts = np.sort(rng.uniform(now, max(now + 1.0, day_start + DAY_S - HOLD_TIME_RANGE[1]), n))
+        jitter = float(TOTAL_QTY_JITTER)
+        notional = mean_notional * rng.uniform(1 - jitter, 1 + jitter, n)
+        buy = rng.uniform(0.1, 1.0, (n, 2))
+        shares = np.column_stack((buy / buy.sum(axis=1, keepdims=True) * 0.5, np.full(n, 0.5)))
+        holds = rng.integers(HOLD_TIME_RANGE[0], HOLD_TIME_RANGE[1] + 1, n)
+        symbols = rng.integers(0, len(self.symbols), n)
+        triples = draw_triples(rng, weights, n) if n else np.empty((0, LEGS), dtype=np.int64)
+        # Нога не больше, чем обеспечит маржа её аккаунта
+        notional = np.minimum(notional, (budget[triples] / shares).min(axis=1, initial=np.inf))
+
+        with self._lock:
+            self._plan = {"start": starts, "notional": notional, "shares": shares, "hold": holds,
+                          "symbol": symbols, "accounts": triples, "taken": np.zeros(n, dtype=bool)}
+            self._generation += 1
+            self._cursor = 0
+            self._planned_at = now
+            self._base_done = done_total
+            self._cum_volume = np.cumsum(2 * notional)
+        short = needed - n
+        logger.info("[PLANNER] %s cycles until 00:00 UTC, %.0f USDT volume for %s/%s accounts "
+                    "(done today %.0f USDT)%s", n, float(self._cum_volume[-1]) if n else 0.0,
+                    int(np.count_nonzero(weights)), len(self.accounts), done_total,
+                    f", {short} cycles over capacity" if short > 0 else "")
+
+    def drift(self, now: float) -> float:
+        """Расхождение факта с планом: доля от объёма плана (по циклам, которые уже должны были закрыться)."""
+        with self._lock:
+            if self._plan is None or not len(self._cum_volume):
+                return 0.0
+            settled = int(np.searchsorted(self._plan["start"], now - HOLD_TIME_RANGE[1], side="right"))
+            expected = self._base_done + (float(self._cum_volume[settled - 1]) if settled else 0.0)
+            return abs(expected - float(self.done.sum())) / float(self._cum_volume[-1])
+
+    def replan_due(self, now: float) -> bool:
+        due = now - self._planned_at >= PLANNER_REPLAN_INTERVAL_S
+        return due or int(now) // DAY_S * DAY_S != self.day or self.drift(now) > PLANNER_REPLAN_DRIFT
+
+    def next_replan_in(self, now: float) -> float:
+        """Сколько ждать, если план исчерпан: до пересчёта или до начала следующих суток."""
+        next_day = (int(now) // DAY_S + 1) * DAY_S
+        return max(0.0, min(self._planned_at + PLANNER_REPLAN_INTERVAL_S, next_day) - now)
+
+    # === Очередь ===
+    def peek(self, busy: Collection[str] = ()) -> Optional[dict]:
+        """Ближайший по времени старта несыгранный цикл плана не на парах из `busy`:
+        циклы упёршихся в лимит пар откладываются, не задерживая остальные."""
+        with self._lock:
+            plan, i, generation = self._plan, self._cursor, self._generation
+            if plan is None or i >= len(plan["start"]):
+                return None
+            if busy and self.symbols[plan["symbol"][i]] in busy:
+                blocked = np.isin(plan["symbol"][i:], [self.symbols.index(s) for s in busy])
+                free = np.flatnonzero(~(plan["taken"][i:] | blocked))
+                if not len(free):
+                    return None
+                i += int(free[0])
+        return {
+            "generation": generation,
+            "index": i,
+            "start": float(plan["start"][i]),
+            "symbol": self.symbols[plan["symbol"][i]],
+            "notional": Decimal(str(round(float(plan["notional"][i]), 8))),
+            "legs": [
+                {"side": side, "share": Decimal(str(round(float(share), 10)))}
+                for side, share in zip(("BUY", "BUY", "SELL"), plan["shares"][i])
+            ],
+            "hold_time": int(plan["hold"][i]),
+            "accounts": [self.accounts[j] for j in plan["accounts"][i]]
+        }
+
+    def pop(self, planned: dict):
+        """Цикл из peek() сыгран; если план за это время пересчитан, новый план не трогается."""
+        with self._lock:
+            if planned["generation"] != self._generation:
+                return
+            taken = self._plan["taken"]
+            taken[planned["index"]] = True
+            # Курсор — на первый несыгранный: отложенные циклы пар остаются перед ним
+            while self._cursor < len(taken) and taken[self._cursor]:
+                self._cursor += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            left = int(np.count_nonzero(~self._plan["taken"])) if self._plan is not None else 0
+            return {"planned_left": left, "done_usdt": float(self.done.sum()), "remaining_usdt": float(self.remaining().sum())}
+
+day_planner = DayPlanner()
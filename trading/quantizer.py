@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_DOWN
+
+@dataclass(frozen=True, slots=True)
+class SymbolQuantizer:
+    """Предрассчитанные шаг, точность и шаблон форматирования количества для символа."""
+    symbol: str
+    step: Decimal
+    min_qty: Decimal
+    max_qty: Decimal
+    tick: Decimal
+    precision: int
+    quantum: Decimal
+    fmt: str
+
+    @classmethod
+    def from_filters(cls, symbol: str, f: dict) -> "SymbolQuantizer":
+        precision = int(f["QTY_PRECISION"])
+        return cls(
+            symbol=symbol,
+            step=f["LOT_STEP"],
+            min_qty=f["MIN_QTY"],
+            max_qty=f["MAX_QTY"],
+            tick=f["TICK_SIZE"],
+            precision=precision,
+            quantum=Decimal(1).scaleb(-precision),
+            fmt=f".{precision}f"
+        )
+
+    def adjust(self, q: Decimal) -> Decimal:
+        if q <= 0:
+            return Decimal("0")
+        adj = (q // self.step) * self.step
+        if adj < self.min_qty:
+            adj = self.min_qty
+        if adj > self.max_qty:
+            adj = self.max_qty
+        return adj.quantize(self.quantum, rounding=ROUND_DOWN)
+
+    def format(self, q: Decimal) -> str:
+        return format(q.quantize(self.quantum, rounding=ROUND_DOWN), self.fmt)
@@ -0,0 +1,129 @@
+"""Колоночная история исполнений: по бинарному файлу на колонку в FILLS_DIR.
+
+Строка — одно исполнение ноги. Имена аккаунтов и пар хранятся кодами (словарь
+в names.json), cycle_id — 48-битным числом из его hex. Файлы только дописываются;
+после аварийного завершения колонки обрезаются до общей длины. Чтение — через
+np.memmap, с любой строки: отчёт (tools.fill_report) дочитывает только новое.
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config.settings import FILLS_DIR
+
+COLUMNS = {
+    "ts": np.dtype("<i8"),          # время исполнения (updateTime), мс
+    "account": np.dtype("<i4"),     # код имени аккаунта
+    "symbol": np.dtype("<i4"),      # код пары
+    "cycle": np.dtype("<u8"),       # cycle_id как число (0 — вне цикла)
+    "order_id": np.dtype("<i8"),
+    "side": np.dtype("i1"),         # +1 BUY, -1 SELL
+    "phase": np.dtype("i1"),        # 0 открытие, 1 закрытие
+    "qty": np.dtype("<f8"),         # executedQty
+    "price": np.dtype("<f8"),       # avgPrice
+    "mark": np.dtype("<f8"),        # mark price на момент решения (для проскальзывания)
+    "fee": np.dtype("<f8"),         # комиссия в USDT; NaN — неизвестна (исполнение пришло по REST)
+}
+PHASES = ("open", "close")
+
+def cycle_code(cycle_id: Optional[str]) -> int:
+    return int(cycle_id, 16) if cycle_id else 0
+
+def cycle_label(code: int) -> str:
+    return f"{int(code):012x}" if code else "-"
+
+class FillStore:
+    def __init__(self, directory: str = FILLS_DIR):
+        self.directory = directory
+        self.names: Dict[str, List[str]] = {"account": [], "symbol": []}
+        self._codes: Dict[str, Dict[str, int]] = {"account": {}, "symbol": {}}
+        self._lock = threading.Lock()
+        self._opened = False
+
+    def _path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def _read_names(self) -> Dict[str, List[str]]:
+        path = os.path.join(self.directory, "names.json")
+        if not os.path.exists(path):
+            return {"account": [], "symbol": []}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open(self):
+        """Подготовка к записи (только в процессе, который пишет историю)."""
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.names = self._read_names()
+        self._codes = {k: {n: i for i, n in enumerate(v)} for k, v in self.names.items()}
+        # Колонки, дописанные до падения не полностью, обрезаем до общей длины
+        rows = self.rows()
+        for column, dtype in COLUMNS.items():
+            path = self._path(column)
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            elif os.path.getsize(path) != rows * dtype.itemsize:
+                os.truncate(path, rows * dtype.itemsize)
+        self._opened = True
+
+    def rows(self) -> int:
+        sizes = [os.path.getsize(self._path(c)) // d.itemsize if os.path.exists(self._path(c)) else 0
+                 for c, d in COLUMNS.items()]
+        return min(sizes)
+
+    def _code(self, kind: str, name: str) -> int:
+        code = self._codes[kind].get(name)
+        if code is None:
+            code = self._codes[kind][name] = len(self.names[kind])
+            self.names[kind].append(name)
+        return code
+
+    def append(self, records: List[dict]):
+        """Записи исполнений из stats_journal (поля `ts`, `name`, `symbol`, `side`, `qty`, `price`, ...)."""
+        if not records:
+            return
+        with self._lock:
+            self._open()
+            known = {k: len(v) for k, v in self.names.items()}
+            data = {
+                "ts": [r["ts"] for r in records],
+                "account": [self._code("account", r["name"]) for r in records],
+                "symbol": [self._code("symbol", r["symbol"]) for r in records],
+                "cycle": [cycle_code(r.get("cycle_id")) for r in records],
+                "order_id": [r.get("order_id") or 0 for r in records],
+                "side": [1 if r["side"] == "BUY" else -1 for r in records],
+                "phase": [PHASES.index(r.get("phase", "open")) for r in records],
+                "qty": [float(r["qty"]) for r in records],
+                "price": [float(r["price"]) for r in records],
+                "mark": [float(r.get("mark") or r["price"]) for r in records],
+                "fee": [float(r["fee"]) if r.get("fee") is not None else np.nan for r in records],
+            }
+            # Словарь — раньше колонок: коды в файлах всегда расшифровываются
+            if any(len(v) != known[k] for k, v in self.names.items()):
+                tmp = os.path.join(self.directory, "names.json.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.names, f, ensure_ascii=False)
+                os.replace(tmp, os.path.join(self.directory, "names.json"))
+            for column, dtype in COLUMNS.items():
+                with open(self._path(column), "ab") as f:
+                    np.asarray(data[column], dtype=dtype).tofile(f)
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Колонки строк [start, stop) без копирования (memmap). Можно из другого процесса, пока бот пишет."""
+        rows = self.rows()
+        stop = rows if stop is None else min(stop, rows)
+        if start >= stop:
+            return {c: np.empty(0, dtype=d) for c, d in COLUMNS.items()}
+        return {
+            c: np.memmap(self._path(c), dtype=d, mode="r", offset=start * d.itemsize, shape=(stop - start,))
+            for c, d in COLUMNS.items()
+        }
+
+    def load_names(self) -> Dict[str, List[str]]:
+        return self._read_names()
+
+fill_store = FillStore()
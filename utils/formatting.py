@@ -1,11 +1,16 @@
 from decimal import Decimal, ROUND_DOWN
+from functools import lru_cache
 
 def floor_to_step(q: Decimal, step: Decimal) -> Decimal:
     steps = (q / step).to_integral_value(rounding=ROUND_DOWN)
     return steps * step
 
+@lru_cache(maxsize=None)
+def _quantum(precision: int) -> Decimal:
+    return Decimal(1).scaleb(-precision)
+
 def format_float2(x: Decimal, precision: int) -> str:
-    quantized = x.quantize(Decimal(f"1e-{precision}"), rounding=ROUND_DOWN)
+    quantized = x.quantize(_quantum(precision), rounding=ROUND_DOWN)
     return format(quantized, f".{precision}f")
 
 def format_float(x: Decimal) -> str:
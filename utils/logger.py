@@ -1,6 +1,20 @@
 from colorama import init, Fore, Style
+import atexit
+import contextlib
+import contextvars
+import json
 import logging
+import os
+import queue
+import threading
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from config.settings import (
+    LOG_LEVEL, LOG_DIR, LOG_FILE_MAX_BYTES, LOG_FILE_BACKUPS, LOG_CONSOLE_ENABLED, LOG_CONSOLE_MAX_PER_S
+)
 
 init(autoreset=True)
 
@@ -32,9 +46,127 @@ class ColorFormatter(logging.Formatter):
 
         return f"{prefix} {record.getMessage()}"
 
+# === Контекст записи: cycle_id, account, order_id ===
+CONTEXT_FIELDS = ("cycle_id", "account", "order_id", "symbol")
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Поля добавляются ко всем записям этого потока внутри блока (в JSON-лог)."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Переносит контекст в запись. Работает в вызывающем потоке — до очереди."""
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, process_tag: str):
+        super().__init__()
+        self.process_tag = process_tag
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+            "process": self.process_tag
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _LazyQueueHandler(QueueHandler):
+    # Стандартный prepare() форматирует сообщение в вызывающем потоке; здесь запись
+    # кладётся как есть, и %-подстановку делает поток-слушатель
+    def prepare(self, record):
+        return record
+
+class ConsoleRateLimit(logging.Filter):
+    """Не больше `per_second` строк INFO/SUCCESS в секунду на консоль; WARNING и выше — всегда.
+
+    Файл получает всё; о пропущенных строках консоль узнаёт одной сводкой.
+    """
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        self.tokens = per_second
+        self.updated = time.monotonic()
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.per_second, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+        if self.tokens < 1:
+            self.dropped += 1
+            return False
+        self.tokens -= 1
+        if self.dropped:
+            record.msg = f"{record.msg} [+{self.dropped} console lines skipped, see {LOG_DIR}/]"
+            self.dropped = 0
+        return True
 
 logger = logging.getLogger("AsterDex")
-handler = logging.StreamHandler()
-handler.setFormatter(ColorFormatter())
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+def configure_logging(process_tag: str = "bot", console: bool = LOG_CONSOLE_ENABLED):
+    """Записи → очередь → фоновый слушатель: JSON-строки в LOG_DIR/<process_tag>.jsonl
+    (с ротацией) и, по желанию, цветная консоль с ограничением частоты.
+
+    Шард-процесс вызывает заново со своим тегом — у каждого процесса свой файл.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+
+        handlers = []
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = RotatingFileHandler(os.path.join(LOG_DIR, f"{process_tag}.jsonl"), maxBytes=LOG_FILE_MAX_BYTES,
+                                           backupCount=LOG_FILE_BACKUPS, encoding="utf-8", delay=True)
+        file_handler.setFormatter(JsonFormatter(process_tag))
+        handlers.append(file_handler)
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(ColorFormatter())
+            console_handler.addFilter(ConsoleRateLimit(LOG_CONSOLE_MAX_PER_S))
+            handlers.append(console_handler)
+
+        log_queue: "queue.Queue" = queue.Queue()
+        queue_handler = _LazyQueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        logger.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+def stop_logging():
+    """Дописывает очередь и останавливает слушателя (вызывается и при выходе)."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+configure_logging()
+atexit.register(stop_logging)
@@ -0,0 +1,216 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Границы гистограмм задержек, сек
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels_text(self.labels, k)} {v}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # ключ → [счётчики по корзинам (+Inf последним), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def quantile(self, q: float, min_count: int = 1, **labels) -> Optional[float]:
+        """Верхняя граница корзины, в которую попадает квантиль q (оценка).
+
+        Считается по всем сериям с заданными метками (не указанные — любые);
+        None — замеров меньше `min_count`.
+        """
+        match = [(self.labels.index(n), str(v)) for n, v in labels.items()]
+        with self._lock:
+            entries = [e for k, e in self._values.items() if all(k[i] == v for i, v in match)]
+            counts = [sum(c) for c in zip(*(e[0] for e in entries))]
+            total = sum(e[2] for e in entries)
+        if not total or total < min_count:
+            return None
+        rank = q * total
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            running += count
+            if running >= rank:
+                return bound
+        return float("inf")
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {count}")
+        return lines
+
+_registry: List[_Metric] = []
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+def render_metrics() -> str:
+    return "\n".join(line for m in _registry for line in m.render()) + "\n"
+
+def _with_label(line: str, label: str, value: str) -> str:
+    # Имя метрики заканчивается на "{" или пробел; в значениях меток пробелы бывают
+    end = min(i for i in (line.find("{"), line.find(" ")) if i >= 0)
+    if line[end] == "{":
+        return f'{line[:end + 1]}{label}="{_escape(value)}",{line[end + 1:]}'
+    return f'{line[:end]}{{{label}="{_escape(value)}"}}{line[end:]}'
+
+def merge_rendered(texts: Dict[str, str], label: str = "shard") -> str:
+    """Объединяет вывод render_metrics() нескольких процессов: HELP/TYPE у семейства
+    один раз, к каждой строке добавляется метка `label` с именем источника."""
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+    for source, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("#"):
+                family = line.split(" ", 3)[2]
+                headers.setdefault(family, [])
+                samples.setdefault(family, [])
+                if line not in headers[family]:
+                    headers[family].append(line)
+            elif line and family is not None:
+                samples[family].append(_with_label(line, label, source))
+    return "\n".join(line for family in headers for line in headers[family] + samples[family]) + "\n"
+
+# === Метрики бота ===
+REQUEST_SECONDS = _register(Histogram(
+    "aster_request_seconds", "REST request latency", ("endpoint", "account", "proxy")))
+REQUEST_ERRORS = _register(Counter(
+    "aster_request_errors_total", "Failed REST requests by error code", ("endpoint", "code")))
+ORDER_RETRIES = _register(Counter(
+    "aster_order_retries_total", "Failed open/close attempts in the cycle runner", ("phase", "code")))
+FILL_WAIT_SECONDS = _register(Histogram(
+    "aster_fill_wait_seconds", "Time spent in wait_for_fill", ("source",)))
+CYCLE_PHASE_SECONDS = _register(Histogram(
+    "aster_cycle_phase_seconds", "Cycle phase duration", ("phase", "symbol"), buckets=PHASE_BUCKETS))
+TIME_TO_NEUTRAL_SECONDS = _register(Histogram(
+    "aster_time_to_neutral_seconds", "Gap between first and last leg fill", ("phase", "symbol")))
+CYCLES_TOTAL = _register(Counter(
+    "aster_cycles_total", "Completed cycles", ("symbol",)))
+OPEN_NOTIONAL = _register(Gauge(
+    "aster_open_notional_usdt", "Notional of currently open legs", ("symbol", "side")))
+PROXY_HEALTHY = _register(Gauge(
+    "aster_proxy_healthy", "1 if the proxy is in rotation, 0 if ejected", ("proxy",)))
+PROXY_RTT_SECONDS = _register(Gauge(
+    "aster_proxy_rtt_seconds", "Smoothed proxy round-trip time", ("proxy",)))
+PROXY_FAILOVERS = _register(Counter(
+    "aster_proxy_failovers_total", "Requests re-sent through another proxy after a network error", ("proxy",)))
+ORDER_HEDGES = _register(Counter(
+    "aster_order_hedges_total", "Hedged order requests: found by client id after the first one expired, sent, and which copy answered first", ("result",)))
+PRETRADE_REJECTS = _register(Counter(
+    "aster_pretrade_rejects_total", "Orders not sent because the margin ledger predicted a rejection", ("phase",)))
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+
+def start_metrics_server(host: str, port: int, render: Callable[[], str] = render_metrics):
+    """`render` — источник текста /metrics (координатор шардов отдаёт объединённый вывод)."""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+        _server.daemon_threads = True
+        _server.render = render
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+
+def stop_metrics_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server = None
@@ -0,0 +1,159 @@
+import json
+import os
+import queue
+import threading
+import time
+from decimal import Decimal
+from typing import Callable, Dict, Optional, Tuple
+
+from config.settings import STATS_EXPORT_INTERVAL_S
+from utils.stats_excel import read_stats_excel, export_stats_excel
+from utils.fill_store import fill_store
+from utils.logger import logger
+
+JOURNAL_FILE = "stats_journal.jsonl"
+
+class StatsJournal:
+    """Append-only журнал исполнений + итоги по (name, symbol) в памяти.
+
+    `record_fill` не трогает диск: запись в журнал, колоночную историю
+    (utils.fill_store) и периодическую выгрузку stats.xlsx делает фоновый поток.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE, export_interval: float = STATS_EXPORT_INTERVAL_S):
+        self.path = path
+        self.export_interval = export_interval
+        self.totals: Dict[Tuple[str, str], dict] = {}
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loaded = False
+        self._dirty = False
+        self._forward: Optional[Callable[[dict], None]] = None
+
+    def _apply(self, rec: dict):
+        t = self.totals.setdefault((rec["name"], rec["symbol"]), {"volume": 0.0, "long": 0, "short": 0})
+        if rec.get("seed"):
+            t["volume"] += rec["volume"]
+            t["long"] += rec["long"]
+            t["short"] += rec["short"]
+            return
+        t["volume"] += rec["volume"]
+        if rec["side"] == "BUY":
+            t["long"] += 1
+        elif rec["side"] == "SELL":
+            t["short"] += 1
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue  # недописанная строка после аварийного завершения
+            return
+        # Первый запуск с журналом: переносим накопленное в stats.xlsx
+        seeds = [dict(name=k[0], symbol=k[1], seed=True, **v) for k, v in read_stats_excel().items()]
+        for rec in seeds:
+            self._apply(rec)
+            self._queue.put(rec)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            # После stop() итоги уже в памяти: повторная загрузка удвоила бы журнал
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+            self._thread = threading.Thread(target=self._writer, name="stats-journal", daemon=True)
+            self._thread.start()
+
+    def forward(self, callback: Callable[[dict], None]):
+        """Шард-воркер: записи уходят координатору, журнал на диске ведёт только он."""
+        self._forward = callback
+
+    def record_fill(self, name: str, symbol: str, side: str, order: dict, mark_price: Decimal,
+                    cycle_id: Optional[str] = None, phase: str = "open"):
+        """Исполнение по финальному состоянию ордера: объём — по цене исполнения, не по mark."""
+        qty = Decimal(str(order.get("executedQty") or "0"))
+        price = Decimal(str(order.get("avgPrice") or "0")) or mark_price
+        fee = order.get("commission")   # только из user-data stream и только в USDT; иначе None → NaN
+        rec = {
+            "ts": int(order.get("updateTime") or time.time() * 1000),
+            "name": name,
+            "symbol": symbol,
+            "side": side,
+            "qty": str(qty),
+            "price": str(price),
+            "volume": float(qty * price),
+            "mark": str(mark_price),
+            "fee": str(fee) if fee is not None else None,
+            "cycle_id": cycle_id,
+            "order_id": order.get("orderId"),
+            "phase": phase
+        }
+        if self._forward is not None:
+            self._forward(rec)
+            return
+        self.append(rec)
+
+    def append(self, rec: dict):
+        """Готовая запись исполнения (в т.ч. присланная шардом)."""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._apply(rec)
+            self._dirty = True
+        self._queue.put(rec)
+
+    def snapshot(self) -> Dict[Tuple[str, str], dict]:
+        with self._lock:
+            return {k: dict(v) for k, v in self.totals.items()}
+
+    def export(self):
+        with self._lock:
+            self._dirty = False
+        try:
+            export_stats_excel(self.snapshot())
+        except Exception as e:
+            logger.warning("[STATS] Export to Excel failed: %s → %s", type(e).__name__, e)
+
+    def _writer(self):
+        last_export = time.time()
+        running = True
+        with open(self.path, "a", encoding="utf-8") as f:
+            while running:
+                try:
+                    batch = [self._queue.get(timeout=1.0)]
+                except queue.Empty:
+                    batch = []
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    running = False
+                    batch = [rec for rec in batch if rec is not None]
+                if batch:
+                    f.write("".join(json.dumps(rec) + "\n" for rec in batch))
+                    f.flush()
+                    try:
+                        fill_store.append([rec for rec in batch if not rec.get("seed")])
+                    except Exception as e:
+                        logger.warning("[STATS] Fill history append failed: %s → %s", type(e).__name__, e)
+                if self._dirty and time.time() - last_export >= self.export_interval:
+                    self.export()
+                    last_export = time.time()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.export()
+
+stats_journal = StatsJournal()
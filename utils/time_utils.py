@@ -1,4 +1,17 @@
 import time
 
+# Поправка локальных часов к серверному времени биржи, мс (см. network/time_sync.py)
+_server_offset_ms = 0
+
 def now_ms() -> int:
-    return int(time.time() * 1000)
\ No newline at end of file
+    return int(time.time() * 1000)
+
+def set_server_offset(offset_ms: int):
+    global _server_offset_ms
+    _server_offset_ms = offset_ms
+
+def server_offset_ms() -> int:
+    return _server_offset_ms
+
+def server_now_ms() -> int:
+    return int(time.time() * 1000) + _server_offset_ms